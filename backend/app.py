@@ -1,46 +1,165 @@
-from fastapi import FastAPI
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pathlib import Path
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from .config import WARMUP_ON_STARTUP, SERVER_TIMING, MEDIA_CACHE_MAX_AGE, REQUEST_DEADLINE, MEDIA_REQUEST_DEADLINE, TTS_VOICE
 from .models import (
-    SearchRequest,
+    SearchBatchRequest,
+    SearchBatchResult,
     RecommendationRequest,
     RecommendationResult,
     RecommendationItem,
     TTSRequest,
     ImageRequest,
+    JobStatus,
 )
-from .db import search
-from .rag import run_recommendation_pipeline_multi
-from .tools import tts_save, generate_book_image
+from .db import search, search_batch
+from .embeddings import cache_stats as embedding_cache_stats
+from .rag import arun_recommendation_pipeline_multi, astream_recommendations
+from .streaming import sse_event
+from .tools import (
+    atts_save, atts_stream, agenerate_book_image, arecommendation_audio, cover_title, tts_key,
+)
+from .media_store import store as media_store
+from .response_cache import cache as response_cache
+from .jobs import queue as job_queue, QueueFull
+from .upstream import Overloaded, UpstreamTimeout
+from . import metrics, resources, upstream
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the Chroma collection and OpenAI client once, shared by all requests
+    resources.startup(warm=WARMUP_ON_STARTUP)
+    await job_queue.start()
+    try:
+        yield
+    finally:
+        await job_queue.stop()
+        await resources.ashutdown()
 
 
-app = FastAPI(title="Smart Librarian – RAG + Tool")
+app = FastAPI(title="Smart Librarian – RAG + Tool", lifespan=lifespan)
+
+# Routes that may render covers/narrations in the request: their upstream calls get
+# MEDIA_REQUEST_DEADLINE, so IMAGE_TIMEOUT and SPEECH_TIMEOUT stay reachable
+# (/recommend bounds its own pipeline with REQUEST_DEADLINE)
+_MEDIA_ROUTES = {"/image", "/tts", "/tts/stream", "/recommend"}
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], allow_credentials=True,
     allow_methods=["*"], allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    # Request latency per route, plus the stage breakdown as a Server-Timing header;
+    # the upstream calls made for the request share one deadline (see upstream.py)
+    timings = metrics.begin_request()
+    t0 = time.perf_counter()
+    seconds = MEDIA_REQUEST_DEADLINE if request.url.path in _MEDIA_ROUTES else REQUEST_DEADLINE
+    with upstream.deadline(seconds):
+        response = await call_next(request)
+    elapsed = time.perf_counter() - t0
+    route = request.scope.get("route")
+    metrics.HTTP_SECONDS.observe(elapsed, method=request.method,
+                                 route=getattr(route, "path", "unmatched"), status=response.status_code)
+    if SERVER_TIMING and timings:
+        response.headers["Server-Timing"] = metrics.server_timing(timings, elapsed)
+    return response
+
+
+@app.exception_handler(QueueFull)
+async def queue_full_handler(request: Request, exc: QueueFull):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "5"})
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    # An upstream's queue is full or the wait for a slot ran out: fail fast
+    return JSONResponse(status_code=503, content={"detail": str(exc), "upstream": exc.upstream},
+                        headers={"Retry-After": str(int(exc.retry_after))})
+
+
+@app.exception_handler(UpstreamTimeout)
+async def upstream_timeout_handler(request: Request, exc: UpstreamTimeout):
+    return JSONResponse(status_code=504, content={"detail": str(exc), "upstream": exc.upstream})
+
 
 @app.get("/health")
-def health():
+async def health():  # on the event loop: answers even when every worker thread is busy
     return {"ok": True}
 
 
+@app.get("/metrics")
+async def metrics_ep():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {
+        "embeddings": embedding_cache_stats(),
+        "responses": response_cache.stats(),
+        "media": media_store.stats(),
+        "jobs": job_queue.stats(),
+        "upstreams": upstream.stats(),
+    }
+
+
 @app.get("/rag/search")
-def rag_search(query: str, top_k: int = 4):
-    hits = search(query, top_k=top_k)
+def rag_search(query: str, top_k: int = Query(4, ge=1), include_themes: Optional[List[str]] = Query(None),
+               exclude_themes: Optional[List[str]] = Query(None)):
+    hits = search(query, top_k=top_k, include_themes=include_themes, exclude_themes=exclude_themes)
     return {"hits": hits}
 
 
+@app.post("/rag/search/batch", response_model=SearchBatchResult)
+def rag_search_batch(req: SearchBatchRequest):
+    # One embeddings pass + one backend call per distinct theme filter
+    groups: Dict[tuple, List[int]] = {}
+    for i, q in enumerate(req.queries):
+        key = (tuple(q.include_themes or ()), tuple(q.exclude_themes or ()))
+        groups.setdefault(key, []).append(i)
+    results: List[list] = [[] for _ in req.queries]
+    for (include, exclude), idx in groups.items():
+        hits = search_batch([req.queries[i].query for i in idx], [req.queries[i].top_k for i in idx],
+                            include_themes=list(include), exclude_themes=list(exclude))
+        for i, h in zip(idx, hits):
+            results[i] = h
+    return {"results": [{"query": q.query, "hits": h} for q, h in zip(req.queries, results)]}
+
+
+def _media_factories(req: RecommendationRequest, title: str, rationale: str, detailed: str):
+    """
+    (kind, factory) pairs for the media requested for one recommendation; covers of
+    catalog titles pre-rendered by backend.prerender are served from the media store
+    """
+    factories = []
+    if req.generate_image:
+        factories.append(("image", lambda: agenerate_book_image(cover_title(title), "")))
+    if req.tts:
+        factories.append(("audio", lambda: arecommendation_audio(title, rationale, detailed)))
+    return factories
+
+
 @app.post("/recommend", response_model=RecommendationResult)
-def recommend(req: RecommendationRequest):
-    recs = run_recommendation_pipeline_multi(
-        query=req.query,
-        top_k=req.top_k,
-        num_recs=req.num_recommendations,
-        language_filter=req.language_filter,
-    )
+async def recommend(req: RecommendationRequest):
+    with upstream.deadline(REQUEST_DEADLINE):  # the media below may take up to MEDIA_REQUEST_DEADLINE
+        recs = await arun_recommendation_pipeline_multi(
+            query=req.query,
+            top_k=req.top_k,
+            num_recs=req.num_recommendations,
+            language_filter=req.language_filter,
+            mode=req.mode,
+            include_themes=req.include_themes,
+            exclude_themes=req.exclude_themes,
+            context_tokens=req.context_tokens,
+            latency_budget_ms=req.latency_budget_ms,
+        )
 
     # Inadequate language warning
     if recs is None:
@@ -62,38 +181,154 @@ def recommend(req: RecommendationRequest):
         ])
 
     items = []
+    jobs = []  # (item, kind, factory) – all media for all items run concurrently
     for (title, rationale, detailed) in recs:
-        image_path = None
-        audio_path = None
-        if req.generate_image:
-            out_img = Path("generated") / f"{title.replace(' ', '_').lower()}_cover.png"
-            generate_book_image(title, "", out_img)
-            image_path = str(out_img)
-        if req.tts:
-            out_audio = Path("generated") / f"{title.replace(' ', '_').lower()}_rec.wav"
-            tts_text = f"Recomandarea mea: {title}. Pe scurt: {rationale}. Rezumat: {detailed}"
-            tts_save(tts_text, out_audio)
-            audio_path = str(out_audio)
-        items.append(RecommendationItem(
+        item = RecommendationItem(
             title=title,
             rationale=rationale,
             detailed_summary=detailed,
-            image_path=image_path,
-            audio_path=audio_path
-        ))
+        )
+        for kind, factory in _media_factories(req, title, rationale, detailed):
+            jobs.append((item, kind, factory))
+        items.append(item)
+
+    if req.defer_media or recs.degraded:
+        # Answer now; the worker pool renders the media and clients poll /jobs
+        # (always for degraded answers: they exist to stay within the latency budget)
+        for item, kind, factory in jobs:
+            job = job_queue.submit(kind, factory)
+            setattr(item, f"{kind}_job_id", job.id)
+    else:
+        paths = await asyncio.gather(*(factory() for _, _, factory in jobs))
+        for (item, kind, _), path in zip(jobs, paths):
+            setattr(item, f"{kind}_path", str(path))
+            setattr(item, f"{kind}_url", media_store.url_for(path.name))
+
+    return RecommendationResult(items=items, degraded=recs.degraded)
 
-    return RecommendationResult(items=items)
+
+@app.post("/recommend/stream")
+async def recommend_stream(req: RecommendationRequest):
+    """
+    Server-Sent Events version of /recommend: emits `hits`, `selected`, `item` and
+    `done` events as the pipeline progresses (`blocked` for inadequate language,
+    `error` when an upstream is overloaded or too slow; `done` has degraded=true
+    when items were built from retrieval alone).
+    Media is always deferred: `item` events carry image_job_id / audio_job_id.
+    """
+    async def events():
+        try:
+            async for event, data in astream_recommendations(
+                query=req.query,
+                top_k=req.top_k,
+                num_recs=req.num_recommendations,
+                language_filter=req.language_filter,
+                mode=req.mode,
+                include_themes=req.include_themes,
+                exclude_themes=req.exclude_themes,
+                context_tokens=req.context_tokens,
+                latency_budget_ms=req.latency_budget_ms,
+            ):
+                if event == "item":
+                    for kind, factory in _media_factories(req, data["title"], data["rationale"], data["detailed_summary"]):
+                        data[f"{kind}_job_id"] = job_queue.submit(kind, factory).id
+                if event == "done":
+                    data = {"count": len(data["items"]), "degraded": data.get("degraded", False)}
+                yield sse_event(event, data)
+        except (Overloaded, UpstreamTimeout) as exc:  # headers are already sent: report it in-stream
+            yield sse_event("error", {"detail": str(exc), "upstream": exc.upstream})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+def _split_ids(ids: str) -> List[str]:
+    return [i for i in ids.split(",") if i]
+
+
+@app.get("/jobs", response_model=List[JobStatus])
+async def jobs_status(ids: str):
+    """Batch poll: status of every known job in the comma-separated `ids`"""
+    return [job.public() for job in (job_queue.get(i) for i in _split_ids(ids)) if job]
+
+
+@app.get("/jobs/events")
+async def jobs_events(ids: str, timeout: float = 120.0):
+    """Server-Sent Events stream with one `job` event per job as it finishes"""
+    async def events():
+        async for job in job_queue.completions(_split_ids(ids), timeout=timeout):
+            yield sse_event("job", job.public())
+        yield sse_event("end", {})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+async def job_status(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+    return job.public()
 
 
 @app.post("/tts")
-def tts_ep(req: TTSRequest):
-    out = Path("generated") / req.filename
-    tts_save(req.text, out)
-    return {"audio_path": str(out)}
+async def tts_ep(req: TTSRequest):
+    out = await atts_save(req.text, voice=req.voice or TTS_VOICE)
+    return {"audio_path": str(out), "audio_url": media_store.url_for(out.name)}
+
+
+@app.post("/tts/stream")
+async def tts_stream_ep(req: TTSRequest, request: Request):
+    """
+    Audio of `text` streamed to the client while it is being synthesized (and stored).
+    A narration already in the store is served like GET /media/{key};
+    either way Content-Location holds the file's /media URL for later plays.
+    """
+    voice = req.voice or TTS_VOICE
+    key = tts_key(req.text, voice)
+    if media_store.lookup(key) is not None:
+        response = media_ep(key, request)
+        response.headers["Content-Location"] = media_store.url_for(key)
+        return response
+
+    chunks = atts_stream(req.text, voice)
+    # Pull the first chunk here so a busy upstream is still answered with 503
+    first = await anext(chunks, b"")
+
+    async def body():
+        try:
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    return StreamingResponse(body(), media_type="audio/mpeg",
+                             headers={"Content-Location": media_store.url_for(key), "Cache-Control": "no-store"})
 
 
 @app.post("/image")
-def image_ep(req: ImageRequest):
-    out = Path("generated") / req.filename
-    generate_book_image(req.title, req.themes or "", out)
-    return {"image_path": str(out)}
+async def image_ep(req: ImageRequest):
+    out = await agenerate_book_image(req.title, req.themes or "")
+    return {"image_path": str(out), "image_url": media_store.url_for(out.name)}
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return "*" in tags or etag in tags
+
+
+@app.api_route("/media/{key}", methods=["GET", "HEAD"])
+def media_ep(key: str, request: Request):
+    """
+    A stored cover or narration, sent in chunks; supports Range (audio seeking) and
+    If-Range, and answers If-None-Match with 304 for its strong ETag
+    """
+    entry = media_store.entry(key)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Unknown media key")
+    headers = {"ETag": entry.etag, "Cache-Control": f"public, max-age={MEDIA_CACHE_MAX_AGE}"}
+    if _etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(entry.path, stat_result=entry.stat, headers=headers)
@@ -0,0 +1,158 @@
+"""
+In-memory book catalog shared by the vector sync, the tool and the fallbacks.
+
+Loads data/book_summaries.json and data/full_summaries.json once, keeps one compact
+record per book and builds O(1) indexes by id, by casefolded title, by
+diacritic-folded title and a theme -> book-id posting index. The files are re-read when they change (checked at most
+every CATALOG_RELOAD_INTERVAL seconds).
+"""
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+from .config import DATA_FILE, FULL_SUMMARIES_FILE, CATALOG_RELOAD_INTERVAL
+from .textnorm import fold, normalize_key
+
+
+class BookRecord:
+    """One catalog entry; `id` is None for titles that only have a full summary"""
+    __slots__ = ("id", "title", "summary", "themes", "full_summary")
+
+    def __init__(self, id: Optional[str], title: str, summary: str = "",
+                 themes: Tuple[str, ...] = (), full_summary: Optional[str] = None):
+        self.id = id
+        self.title = title
+        self.summary = summary
+        self.themes = themes
+        self.full_summary = full_summary
+
+    def as_dict(self) -> Dict[str, Any]:
+        """The book in the data-file shape ({id, title, summary, themes})"""
+        return {"id": self.id, "title": self.title, "summary": self.summary, "themes": list(self.themes)}
+
+
+class Catalog:
+    def __init__(self, books: List[Dict[str, Any]], full_summaries: Dict[str, str]):
+        self.books: List[BookRecord] = []
+        self.by_id: Dict[str, BookRecord] = {}
+        self._by_title: Dict[str, BookRecord] = {}
+        self._by_folded: Dict[str, BookRecord] = {}
+        self._by_theme: Dict[str, Set[str]] = {}  # normalized theme -> book ids
+        full_by_title = {t.casefold(): s for t, s in full_summaries.items()}
+        full_by_folded = {fold(t): s for t, s in full_summaries.items()}
+
+        for b in books:
+            title = b["title"]
+            full = full_by_title.get(title.casefold(), full_by_folded.get(fold(title)))
+            rec = BookRecord(b["id"], title, b.get("summary", ""), tuple(b.get("themes", [])), full)
+            self.books.append(rec)
+            self.by_id[rec.id] = rec
+            self._index_title(rec)
+            for theme in rec.themes:
+                self._by_theme.setdefault(normalize_key(theme), set()).add(rec.id)
+        # Titles that exist only in the full-summary source still answer the tool
+        for title, full in full_summaries.items():
+            if self.find_title(title) is None:
+                self._index_title(BookRecord(None, title, full_summary=full))
+
+    def _index_title(self, rec: BookRecord) -> None:
+        self._by_title.setdefault(rec.title.casefold(), rec)
+        self._by_folded.setdefault(fold(rec.title), rec)
+
+    def find_title(self, title: str) -> Optional[BookRecord]:
+        """Exact title lookup: case-insensitive first, then diacritic-insensitive"""
+        title = title.strip()
+        return self._by_title.get(title.casefold()) or self._by_folded.get(fold(title))
+
+    def themes(self) -> List[str]:
+        """Every normalized theme in the catalog"""
+        return sorted(self._by_theme)
+
+    def ids_for_themes(self, include: Optional[Iterable[str]] = None,
+                       exclude: Optional[Iterable[str]] = None) -> Optional[FrozenSet[str]]:
+        """
+        Book ids passing a theme filter, from the posting index
+        Args:
+            include: Keep books with at least one of these themes (None/empty: all books)
+            exclude: Drop books with any of these themes
+        Returns:
+            The allowed ids, or None when no filter is given
+        """
+        include = [normalize_key(t) for t in include or () if t.strip()]
+        exclude = [normalize_key(t) for t in exclude or () if t.strip()]
+        if not include and not exclude:
+            return None
+        if include:
+            allowed = set().union(*(self._by_theme.get(t, set()) for t in include))
+        else:
+            allowed = set(self.by_id)
+        for t in exclude:
+            allowed -= self._by_theme.get(t, set())
+        return frozenset(allowed)
+
+    def titles(self) -> List[str]:
+        """Every indexed title (catalog books and full-summary-only titles)"""
+        return [rec.title for rec in self._by_title.values()]
+
+    def as_dicts(self) -> List[Dict[str, Any]]:
+        return [rec.as_dict() for rec in self.books]
+
+    def __len__(self) -> int:
+        return len(self.books)
+
+
+def _read_json(path: Path, default):
+    if not path.exists():
+        return default
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _signature() -> Tuple[Tuple[float, int], ...]:
+    sig = []
+    for path in (Path(DATA_FILE), Path(FULL_SUMMARIES_FILE)):
+        try:
+            st = path.stat()
+            sig.append((st.st_mtime, st.st_size))
+        except FileNotFoundError:
+            sig.append((0.0, 0))
+    return tuple(sig)
+
+
+def load_catalog() -> Catalog:
+    """Read both data files and build a fresh Catalog"""
+    if not Path(DATA_FILE).exists():
+        raise FileNotFoundError(f"Missing data file: {DATA_FILE}")
+    return Catalog(_read_json(Path(DATA_FILE), []), _read_json(Path(FULL_SUMMARIES_FILE), {}))
+
+
+_lock = threading.Lock()
+_catalog: Optional[Catalog] = None
+_loaded_signature = None
+_checked_at = 0.0
+_listeners: List[Callable[[Catalog], None]] = []
+
+
+def on_reload(callback: Callable[[Catalog], None]) -> None:
+    """Register a callback run with the new Catalog after a hot reload"""
+    _listeners.append(callback)
+
+
+def get_catalog() -> Catalog:
+    """Return the shared catalog, reloading it if a data file changed"""
+    global _catalog, _loaded_signature, _checked_at
+    now = time.monotonic()
+    if _catalog is not None and now - _checked_at < CATALOG_RELOAD_INTERVAL:
+        return _catalog
+    with _lock:
+        _checked_at = now
+        sig = _signature()
+        if _catalog is not None and sig == _loaded_signature:
+            return _catalog
+        reloaded = _catalog is not None
+        _catalog, _loaded_signature = load_catalog(), sig
+        catalog = _catalog
+    if reloaded:
+        for callback in _listeners:
+            callback(catalog)
+    return catalog
@@ -4,21 +4,123 @@ from dotenv import load_dotenv
 
 load_dotenv(override=True)
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("Missing OPENAI_API_KEY in .env")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")  # checked by validate() at startup, not at import
 
 # Models
 EMBED_MODEL = "text-embedding-3-small"
 CHAT_MODEL = "gpt-4o-mini"
 IMAGE_MODEL = "gpt-image-1"
+TTS_VOICE = os.getenv("TTS_VOICE", "alloy")  # narration voice of /recommend, /tts and /tts/stream unless a request sets one
 
-# Data & Chroma
-DATA_FILE = Path(__file__).resolve().parents[1] / "data" / "book_summaries.json"
-CHROMA_DIR = str(Path(__file__).resolve().parents[1] / "chroma_db")
+# Data & vector index
+DATA_FILE = Path(os.getenv("DATA_FILE", str(Path(__file__).resolve().parents[1] / "data" / "book_summaries.json")))
+FULL_SUMMARIES_FILE = Path(os.getenv("FULL_SUMMARIES_FILE", str(Path(__file__).resolve().parents[1] / "data" / "full_summaries.json")))
+CATALOG_RELOAD_INTERVAL = float(os.getenv("CATALOG_RELOAD_INTERVAL", "5"))  # seconds between data-file checks
+CHROMA_DIR = os.getenv("CHROMA_DIR", str(Path(__file__).resolve().parents[1] / "chroma_db"))
 COLLECTION_NAME = "book_summaries"
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")  # "chroma" or "numpy" (memory-mapped matrix)
+NUMPY_INDEX_DIR = os.getenv("NUMPY_INDEX_DIR", str(Path(__file__).resolve().parents[1] / "vector_index"))
+NUMPY_INDEX_DTYPE = os.getenv("NUMPY_INDEX_DTYPE", "float16")  # float16 halves RAM/disk, float32 skips upcasting per query
+SYNC_ON_STARTUP = os.getenv("SYNC_ON_STARTUP", "1") == "1"  # diff the catalog file against the collection
+SYNC_BATCH_SIZE = int(os.getenv("SYNC_BATCH_SIZE", "256"))  # documents per embeddings request
+
+# Multi-process serving (uvicorn --workers N, see snapshot.py): one process syncs the index under a
+# file lock and publishes a read-only memory-mapped snapshot that every worker serves from
+SHARED_INDEX = os.getenv("SHARED_INDEX", "0") == "1"
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", str(Path(__file__).resolve().parents[1] / "index_snapshot"))
+SNAPSHOT_CHECK_INTERVAL = float(os.getenv("SNAPSHOT_CHECK_INTERVAL", "2"))  # seconds between checks for a newer snapshot
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "2"))  # generations left on disk for workers still switching
+
+# Query-embedding cache (in-memory LRU + optional SQLite file that survives restarts)
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "1024"))
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH") or None  # e.g. cache/embeddings.sqlite
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))  # query texts per embeddings request
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"  # BM25 + exact-title fast path fused with vector search
+HYBRID_POOL = int(os.getenv("HYBRID_POOL", "20"))  # candidates taken from each ranking before fusion
+RRF_K = int(os.getenv("RRF_K", "60"))  # reciprocal rank fusion damping constant
+SEARCH_BATCH_MAX = int(os.getenv("SEARCH_BATCH_MAX", "1000"))  # queries accepted by /rag/search/batch
+
+# RAG context packing (see context.py)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))  # tokens for the candidates block; 0 = no limit
+CONTEXT_MIN_SCORE = float(os.getenv("CONTEXT_MIN_SCORE", "0"))  # hits below this cosine similarity are left out
+CONTEXT_MIN_DOC_TOKENS = int(os.getenv("CONTEXT_MIN_DOC_TOKENS", "24"))  # shortest trimmed document worth sending
+
+# Recommendation response cache (exact normalized key, then query-embedding similarity)
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))  # seconds
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.92"))  # cosine; 0 disables the semantic tier
+
+# Generated media (content-addressed covers/audio, LRU-evicted above the budget)
+MEDIA_DIR = os.getenv("MEDIA_DIR", "generated")
+MEDIA_MAX_BYTES = int(os.getenv("MEDIA_MAX_BYTES", str(2 * 1024 ** 3)))
+MEDIA_BASE_URL = os.getenv("MEDIA_BASE_URL", "")  # prefix of the /media/{key} URLs (e.g. a CDN); empty = relative
+MEDIA_CACHE_MAX_AGE = int(os.getenv("MEDIA_CACHE_MAX_AGE", "86400"))  # seconds clients/CDNs may reuse a file without revalidating
+MEDIA_CHUNK_SIZE = int(os.getenv("MEDIA_CHUNK_SIZE", str(64 * 1024)))  # bytes per chunk when streaming TTS audio through
+PRERENDER_MANIFEST = os.getenv("PRERENDER_MANIFEST", str(Path(MEDIA_DIR) / "prerender_manifest.jsonl"))  # see prerender.py
+PRERENDER_CONCURRENCY = int(os.getenv("PRERENDER_CONCURRENCY", "4"))  # catalog items rendered at once by the CLI
+
+# Upstream admission control: calls in flight per OpenAI API and process (see upstream.py)
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "16"))
+CHAT_CONCURRENCY = int(os.getenv("CHAT_CONCURRENCY", "32"))
+IMAGE_CONCURRENCY = int(os.getenv("IMAGE_CONCURRENCY", "8"))
+SPEECH_CONCURRENCY = int(os.getenv("SPEECH_CONCURRENCY", "8"))
+UPSTREAM_QUEUE_SIZE = int(os.getenv("UPSTREAM_QUEUE_SIZE", "64"))  # callers waiting per upstream before answering 503
+UPSTREAM_QUEUE_TIMEOUT = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "10"))  # seconds a caller may wait for a slot
+
+# Upstream call policy: timeouts, retries and hedged requests (see upstream.py)
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "60"))  # seconds all upstream calls of one API request may take; 0 = none
+MEDIA_REQUEST_DEADLINE = float(os.getenv("MEDIA_REQUEST_DEADLINE", "300"))  # the same for requests rendering media (/image, /tts, /recommend); 0 = none
+EMBED_TIMEOUT = float(os.getenv("EMBED_TIMEOUT", "15"))  # longest single attempt, in seconds, per API
+CHAT_TIMEOUT = float(os.getenv("CHAT_TIMEOUT", "30"))
+IMAGE_TIMEOUT = float(os.getenv("IMAGE_TIMEOUT", "120"))
+SPEECH_TIMEOUT = float(os.getenv("SPEECH_TIMEOUT", "60"))
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "2"))  # retries per call after timeouts, 429s, 5xx and connection errors
+RETRY_BACKOFF = float(os.getenv("RETRY_BACKOFF", "0.2"))  # seconds before the first retry (doubled per retry, jittered)
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.1"))  # retries + hedges allowed per call, across all APIs
+RETRY_BUDGET_MAX = float(os.getenv("RETRY_BUDGET_MAX", "20"))  # retries/hedges that may be spent in a burst
+HEDGE_UPSTREAMS = [u for u in os.getenv("HEDGE_UPSTREAMS", "embeddings").split(",") if u]  # e.g. "embeddings,chat"
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", "0.95"))  # a duplicate is sent once a call outlives this latency quantile
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.05"))  # never hedge sooner than this (seconds)
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))  # latencies observed before hedging starts
+
+# Degraded mode (see rag.degraded_recommendations): recommendations built from retrieval alone
+LATENCY_BUDGET_MS = int(os.getenv("LATENCY_BUDGET_MS", "0"))  # default budget of /recommend requests that set none; 0 = none
+DEGRADE_ON_UPSTREAM_ERRORS = os.getenv("DEGRADE_ON_UPSTREAM_ERRORS", "1") == "1"  # also when chat is overloaded, rate limited or down
 
 # Backend settings
 DEFAULT_TOP_K = 4
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))  # background media workers
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "256"))  # pending media jobs before /recommend answers 503
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "900"))  # how long finished jobs stay queryable
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"  # pre-load the vector index at startup
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1") == "1"  # per-stage Server-Timing header on responses
 BAD_WORDS = {"prost", "idiot", "jignire", "urât", "hateword", "urat", "stupid"}  
-#MAX_TOKENS = 4096  # model context length
\ No newline at end of file
+
+# Moderation lexicon (compiled together with BAD_WORDS, re-read when the file changes)
+MODERATION_LEXICON = os.getenv("MODERATION_LEXICON", str(Path(__file__).resolve().parents[1] / "data" / "moderation_lexicon.txt"))
+MODERATION_RELOAD_INTERVAL = float(os.getenv("MODERATION_RELOAD_INTERVAL", "5"))  # seconds between lexicon checks
+#MAX_TOKENS = 4096  # model context length
+
+
+def validate() -> None:
+    """Check the settings once at startup; raises ValueError listing every problem"""
+    problems = []
+    if not OPENAI_API_KEY:
+        problems.append("Missing OPENAI_API_KEY in .env")
+    if VECTOR_BACKEND not in ("chroma", "numpy"):
+        problems.append(f"Unknown VECTOR_BACKEND: {VECTOR_BACKEND!r} (expected 'chroma' or 'numpy')")
+    if NUMPY_INDEX_DTYPE not in ("float16", "float32"):
+        problems.append(f"Unsupported NUMPY_INDEX_DTYPE: {NUMPY_INDEX_DTYPE!r} (expected 'float16' or 'float32')")
+    if SHARED_INDEX and VECTOR_BACKEND == "numpy" and Path(SNAPSHOT_DIR).resolve() == Path(NUMPY_INDEX_DIR).resolve():
+        problems.append("SNAPSHOT_DIR must differ from NUMPY_INDEX_DIR (the snapshot is published from that index)")
+    unknown = [u for u in HEDGE_UPSTREAMS if u not in ("embeddings", "chat", "image", "speech")]
+    if unknown:
+        problems.append(f"Unknown HEDGE_UPSTREAMS entries: {', '.join(unknown)} (expected embeddings, chat, image, speech)")
+    if not 0 < HEDGE_QUANTILE < 1:
+        problems.append(f"HEDGE_QUANTILE must be between 0 and 1, got {HEDGE_QUANTILE}")
+    if MEDIA_REQUEST_DEADLINE and MEDIA_REQUEST_DEADLINE < max(IMAGE_TIMEOUT, SPEECH_TIMEOUT):
+        problems.append(f"MEDIA_REQUEST_DEADLINE ({MEDIA_REQUEST_DEADLINE}s) must be at least IMAGE_TIMEOUT and SPEECH_TIMEOUT")
+    if not DATA_FILE.exists():
+        problems.append(f"Catalog file not found: {DATA_FILE}")
+    if problems:
+        raise ValueError("; ".join(problems))
\ No newline at end of file
@@ -0,0 +1,142 @@
+"""
+Token-budgeted packing of retrieval hits into the RAG context block of a prompt.
+
+  - tokens are counted locally (tiktoken with the chat model's encoding, or ~4
+    characters per token when the encoding is unavailable, e.g. offline)
+  - the block header carries the title, so the document's own "Title: ..." line is dropped
+  - hits scoring below a minimum cosine similarity are left out (lexical-only hits
+    have no score and are kept)
+  - blocks are added in rank order while they fit the budget; the first one that
+    does not is trimmed to the remaining room and the rest are dropped, after
+    reserving room for `min_hits` blocks so the model still has a choice
+"""
+import logging
+import math
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+from .config import CHAT_MODEL, CONTEXT_MIN_DOC_TOKENS
+
+logger = logging.getLogger(__name__)
+
+Hit = Dict[str, Any]
+
+_SEPARATOR = "\n\n"
+_ELLIPSIS = "…"
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(CHAT_MODEL)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as exc:  # not installed, or the BPE file cannot be downloaded
+        logger.warning("tiktoken unavailable (%s); estimating ~4 characters per token", exc)
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in `text` for the chat model"""
+    enc = _encoding()
+    if enc is None:
+        return math.ceil(len(text) / 4)
+    return len(enc.encode(text))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """`text` cut to at most `max_tokens` tokens (at a word boundary when estimating)"""
+    if max_tokens <= 0:
+        return ""
+    enc = _encoding()
+    if enc is None:
+        limit = max_tokens * 4
+        if len(text) <= limit:
+            return text
+        cut = text[:limit]
+        space = cut.rfind(" ")
+        return cut[:space] if space > limit // 2 else cut
+    tokens = enc.encode(text)
+    return text if len(tokens) <= max_tokens else enc.decode(tokens[:max_tokens])
+
+
+def hit_body(hit: Hit) -> str:
+    """The hit's document without its "Title: ..." line (the block header has the title)"""
+    lines = hit["document"].split("\n")
+    if lines and lines[0].startswith("Title:"):
+        lines = lines[1:]
+    return "\n".join(lines)
+
+
+@dataclass
+class PackedContext:
+    text: str                                       # the context block for the prompt
+    hits: List[Hit] = field(default_factory=list)   # hits that made it in, in rank order
+    tokens: int = 0
+    trimmed: int = 0                                # blocks cut short to fit
+    dropped: int = 0                                # hits left out (score or budget)
+
+    @property
+    def titles(self) -> List[str]:
+        return [h["metadata"]["title"] for h in self.hits]
+
+
+def pack_context(
+    hits: List[Hit],
+    budget: Optional[int] = None,
+    min_score: Optional[float] = None,
+    min_hits: int = 1,
+    body: Callable[[Hit], str] = hit_body,
+) -> PackedContext:
+    """
+    Packs retrieval hits into a numbered context block within a token budget
+    Args:
+        hits: Retrieval results, best first ('metadata.title', 'document', optional 'score')
+        budget: Maximum tokens for the whole block (None or 0: no limit)
+        min_score: Hits with a cosine score below this are dropped (the best hit is always kept)
+        min_hits: Blocks to send in any case (room is reserved for them, trimming earlier ones)
+        body: Text of a hit's block below its "[#i] title" header
+    Returns:
+        A PackedContext with the block text and the hits it covers
+    """
+    kept = [h for h in hits if min_score is None or h.get("score") is None or h["score"] >= min_score]
+    if hits and not kept:
+        kept = hits[:1]
+    dropped = len(hits) - len(kept)
+
+    blocks: List[str] = []
+    packed: List[Hit] = []
+    used = trimmed = 0
+    sep_tokens = count_tokens(_SEPARATOR)
+    needed = max(1, min(min_hits, len(kept)))  # blocks sent even if trimming has to overshoot
+    for h in kept:
+        header = f"[#{len(blocks) + 1}] {h['metadata']['title']}\n"
+        header_tokens = count_tokens(header)
+        text = body(h)
+        sep = sep_tokens if blocks else 0
+        # Room held back for the blocks still owed to min_hits after this one
+        owed = max(0, needed - len(blocks) - 1)
+        reserve = owed * (CONTEXT_MIN_DOC_TOKENS + header_tokens + sep_tokens)
+        cost = sep + count_tokens(header + text)
+        if not budget or used + cost + reserve <= budget:
+            blocks.append(header + text)
+            packed.append(h)
+            used += cost
+            continue
+
+        # Over budget: trim this block to the room left
+        room = budget - used - sep - header_tokens - reserve
+        if room < CONTEXT_MIN_DOC_TOKENS and len(blocks) >= needed:
+            break
+        cut = truncate_tokens(text, max(room, CONTEXT_MIN_DOC_TOKENS)).rstrip() + _ELLIPSIS
+        blocks.append(header + cut)
+        packed.append(h)
+        used += sep + count_tokens(header + cut)
+        trimmed += 1
+        if not owed:
+            break
+
+    dropped += len(kept) - len(packed)
+    return PackedContext(_SEPARATOR.join(blocks), packed, used, trimmed, dropped)
@@ -1,55 +1,125 @@
-import json
-import chromadb
-from typing import List, Dict, Any
-from chromadb.utils import embedding_functions
-from pathlib import Path
-from .config import OPENAI_API_KEY, EMBED_MODEL, CHROMA_DIR, COLLECTION_NAME, DATA_FILE
-
-
-def _load_books() -> List[Dict[str, Any]]:
-    """Load books data from the JSON file ; returns a list of dicts"""
-    if not DATA_FILE.exists():
-        raise FileNotFoundError(f"Missing data file: {DATA_FILE}")
-    return json.loads(Path(DATA_FILE).read_text(encoding="utf-8"))
-
-
-def _seed_if_empty(collection):
-    """Seed the collection with book data if it’s empty"""
-    if collection.count() > 0:
-        return
-    books = _load_books()
-    ids, docs, metas = [], [], []
-    for b in books:
-        themes_str = ", ".join(b.get("themes", []))
-        ids.append(b["id"])
-        docs.append(f"Title: {b['title']}\nSummary: {b['summary']}\nThemes: {themes_str}")
-        metas.append({"title": b["title"], "themes": themes_str})
-    collection.add(ids=ids, documents=docs, metadatas=metas)
-
-
-def get_collection():
-    """Return a ChromaDB collection, seeding it if empty"""
-    openai_ef = embedding_functions.OpenAIEmbeddingFunction(
-        api_key=OPENAI_API_KEY, model_name=EMBED_MODEL
-    )
-    client = chromadb.PersistentClient(path=CHROMA_DIR)
-    col = client.get_or_create_collection(
-        name=COLLECTION_NAME,
-        embedding_function=openai_ef,
-    )
-    _seed_if_empty(col)
-    return col
-
-
-def search(query: str, top_k: int = 4):
-    """Search the collection and return top matches as dicts"""
-    col = get_collection()
-    res = col.query(query_texts=[query], n_results=top_k)
-    hits = []
-    for i in range(len(res.get("ids", [[]])[0])):
-        hits.append({
-            "id": res["ids"][0][i],
-            "document": res["documents"][0][i],
-            "metadata": res["metadatas"][0][i],
-        })
-    return hits
+import logging
+import threading
+from typing import List, Optional
+from .config import (
+    OPENAI_API_KEY, EMBED_MODEL, CHROMA_DIR, COLLECTION_NAME, SYNC_ON_STARTUP,
+    VECTOR_BACKEND, NUMPY_INDEX_DIR, NUMPY_INDEX_DTYPE, HYBRID_SEARCH, HYBRID_POOL, RRF_K, SHARED_INDEX,
+)
+from .catalog import get_catalog
+from .embeddings import embed_texts
+from .lexical import get_index as get_lexical_index
+from .metrics import INDEX_GENERATION, span
+from .snapshot import attach as attach_snapshot
+from .sync import SyncReport, notify, sync_catalog
+from .vector_store import VectorBackend, ChromaBackend, NumpyBackend
+
+
+logger = logging.getLogger(__name__)
+
+# Opened once per process and shared by every search (see get_backend / close_backend)
+_lock = threading.Lock()
+_backend = None
+
+
+def open_backend() -> VectorBackend:
+    """Open the vector backend selected by VECTOR_BACKEND (no syncing)"""
+    if VECTOR_BACKEND == "numpy":
+        return NumpyBackend(NUMPY_INDEX_DIR, dtype=NUMPY_INDEX_DTYPE)
+    if VECTOR_BACKEND == "chroma":
+        return ChromaBackend.open(CHROMA_DIR, COLLECTION_NAME, api_key=OPENAI_API_KEY, embed_model=EMBED_MODEL)
+    raise ValueError(f"Unknown VECTOR_BACKEND: {VECTOR_BACKEND!r} (expected 'chroma' or 'numpy')")
+
+
+def _snapshot_switched(generation: int) -> None:
+    # Another process published new rows: drop what was derived from the old ones
+    logger.info("index snapshot: now serving generation %d", generation)
+    INDEX_GENERATION.set(generation)
+    notify(SyncReport())
+
+
+def get_backend() -> VectorBackend:
+    """
+    Return the shared vector backend, opening it on first use.
+    The catalog is synced on open (always when the index is empty).
+    With SHARED_INDEX this is the read-only snapshot shared by all worker processes
+    """
+    global _backend
+    if _backend is None:
+        with _lock:
+            if _backend is None and SHARED_INDEX:
+                _backend = attach_snapshot(on_switch=_snapshot_switched)
+                INDEX_GENERATION.set(_backend.generation)
+            if _backend is None:
+                backend = open_backend()
+                if SYNC_ON_STARTUP or backend.count() == 0:
+                    report = sync_catalog(backend, get_catalog().as_dicts())
+                    if report.changed:
+                        logger.info("catalog sync: %s", report)
+                _backend = backend
+    return _backend
+
+
+def close_backend() -> None:
+    """Drop the shared backend and release its resources"""
+    global _backend
+    with _lock:
+        if _backend is not None:
+            _backend.close()
+        _backend = None
+
+
+def search(query: str, top_k: int = 4, include_themes: Optional[List[str]] = None,
+           exclude_themes: Optional[List[str]] = None):
+    """Search the vector index and return top matches as dicts (optionally theme-filtered)"""
+    return search_batch([query], [top_k], include_themes=include_themes, exclude_themes=exclude_themes)[0]
+
+
+def search_batch(queries: List[str], top_ks: Optional[List[int]] = None, default_top_k: int = 4,
+                 include_themes: Optional[List[str]] = None, exclude_themes: Optional[List[str]] = None):
+    """
+    Search many queries with one embeddings pass and one multi-query backend call.
+    With HYBRID_SEARCH, queries naming a title are answered from the lexical index
+    alone and the others fuse vector and BM25 rankings (reciprocal rank fusion)
+    Args:
+        queries: Query texts
+        top_ks: Per-query number of hits (defaults to default_top_k for every query)
+        default_top_k: Used when top_ks is not given
+        include_themes: Only books with at least one of these themes
+        exclude_themes: No books with any of these themes
+    Returns:
+        One list of hit dicts per query, in request order
+    """
+    if not queries:
+        return []
+    top_ks = list(top_ks) if top_ks is not None else [default_top_k] * len(queries)
+    if len(top_ks) != len(queries):
+        raise ValueError("top_ks must have one entry per query")
+    # Theme filters resolve to an id set from the posting index, applied before any scan
+    allowed = get_catalog().ids_for_themes(include_themes, exclude_themes)
+    if allowed is not None and not allowed:
+        return [[] for _ in queries]
+    lexical = get_lexical_index() if HYBRID_SEARCH else None
+    results: List[Optional[list]] = [None] * len(queries)
+    pending = []
+    with span("lexical"):
+        for i, query in enumerate(queries):
+            doc = lexical.match_title(query) if lexical is not None else None
+            if doc is not None and (allowed is None or lexical.books[doc].id in allowed):
+                results[i] = lexical.title_hits(doc, top_ks[i], allowed=allowed)  # no embeddings call
+            else:
+                pending.append(i)
+    if pending:
+        # Query embeddings come from the local cache when the same query was seen before
+        with span("embed"):
+            vectors = embed_texts([queries[i] for i in pending])
+        pool = max(top_ks[i] for i in pending)
+        if lexical is not None:
+            pool = max(pool, HYBRID_POOL)
+        with span("vector_query"):
+            vector_hits = get_backend().query(vectors, n_results=pool, ids=allowed)
+        for i, hits in zip(pending, vector_hits):
+            if lexical is not None:
+                with span("lexical"):
+                    hits = lexical.fuse(hits, lexical.search(queries[i], pool, allowed=allowed), top_ks[i], k=RRF_K)
+            results[i] = hits[:top_ks[i]]
+    return results
@@ -0,0 +1,172 @@
+"""
+Query-embedding cache in front of the OpenAI embeddings API.
+
+Embeddings are keyed by (EMBED_MODEL, normalized text). A bounded in-memory LRU tier
+answers repeated queries in-process; an optional SQLite tier (EMBED_CACHE_PATH)
+survives restarts. Hit/miss counters show how many embedding round trips are saved.
+"""
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+from .config import EMBED_MODEL, EMBED_CACHE_SIZE, EMBED_CACHE_PATH, EMBED_BATCH_SIZE
+from .metrics import record_usage
+from .resources import get_openai_client
+from .upstream import call
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form used for cache keys: NFC, trimmed, single-spaced"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def _cache_key(text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\x00{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache: bounded in-memory LRU plus optional SQLite persistence
+    """
+
+    def __init__(self, max_entries: int = 1024, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self._mem: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+    def _conn(self) -> Optional[sqlite3.Connection]:
+        """Open the SQLite tier on first use (None when persistence is disabled)"""
+        if self.path and self._db is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, model TEXT, vec BLOB)"
+            )
+            self._db.commit()
+        return self._db
+
+    def _remember(self, key: str, vec: List[float]) -> None:
+        self._mem[key] = vec
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def get(self, key: str) -> Optional[List[float]]:
+        """Return the cached vector for `key` (memory first, then disk) or None"""
+        with self._lock:
+            vec = self._mem.get(key)
+            if vec is not None:
+                self._mem.move_to_end(key)
+                self.hits_memory += 1
+                return vec
+            conn = self._conn()
+            if conn is not None:
+                row = conn.execute("SELECT vec FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    vec = array("f", row[0]).tolist()
+                    self._remember(key, vec)
+                    self.hits_disk += 1
+                    return vec
+            self.misses += 1
+            return None
+
+    def put(self, key: str, vec: List[float], model: str = EMBED_MODEL) -> None:
+        """Store a vector in both tiers"""
+        with self._lock:
+            self._remember(key, vec)
+            conn = self._conn()
+            if conn is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, model, vec) VALUES (?, ?, ?)",
+                    (key, model, array("f", vec).tobytes()),
+                )
+                conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            lookups = self.hits_memory + self.hits_disk + self.misses
+            return {
+                "entries": len(self._mem),
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "saved_round_trips": self.hits_memory + self.hits_disk,
+                "lookups": lookups,
+            }
+
+    def close(self) -> None:
+        """Close the SQLite connection; it is reopened on next use"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+_cache = EmbeddingCache(max_entries=EMBED_CACHE_SIZE, path=EMBED_CACHE_PATH)
+
+
+def embed_documents(texts: List[str], model: str = EMBED_MODEL) -> List[List[float]]:
+    """Embed catalog documents in one API call, bypassing the query cache"""
+    resp = call("embeddings", lambda timeout: get_openai_client().embeddings.create(
+        model=model, input=texts, timeout=timeout), hedge=False)  # a bulk request: too costly to duplicate
+    record_usage("embeddings", resp.usage)
+    return [list(d.embedding) for d in sorted(resp.data, key=lambda d: d.index)]
+
+
+def embed_texts(texts: List[str], model: str = EMBED_MODEL, batch_size: int = EMBED_BATCH_SIZE) -> List[List[float]]:
+    """
+    Embed a list of texts, serving cached vectors locally and sending
+    only the distinct misses to the embeddings API, `batch_size` per call
+    Args:
+        texts: Texts to embed
+        model: Embedding model name (part of the cache key)
+        batch_size: Maximum inputs per embeddings request
+    Returns:
+        One vector per input text, in input order
+    """
+    keys = [_cache_key(t, model) for t in texts]
+    out: List[Optional[List[float]]] = [_cache.get(k) for k in keys]
+    # Texts that normalize to the same key are embedded once
+    missing: Dict[str, List[int]] = OrderedDict()
+    for i, v in enumerate(out):
+        if v is None:
+            missing.setdefault(keys[i], []).append(i)
+    pending = list(missing.values())
+    for start in range(0, len(pending), batch_size):
+        chunk = pending[start:start + batch_size]
+        inputs = [normalize_query(texts[idx[0]]) for idx in chunk]
+        # Concurrent requests embedding the same texts share one API call; only
+        # single-query requests (the latency-critical ones) are hedged
+        resp = call("embeddings", lambda timeout: get_openai_client().embeddings.create(
+            model=model, input=inputs, timeout=timeout), key=(model, tuple(inputs)), hedge=len(inputs) == 1)
+        record_usage("embeddings", resp.usage)
+        for idx, item in zip(chunk, sorted(resp.data, key=lambda d: d.index)):
+            vector = list(item.embedding)
+            for i in idx:
+                out[i] = vector
+            _cache.put(keys[idx[0]], vector, model=model)
+    return out  # type: ignore[return-value]
+
+
+def embed_query(text: str, model: str = EMBED_MODEL) -> List[float]:
+    """Embed a single query text through the cache"""
+    return embed_texts([text], model=model)[0]
+
+
+def cache_stats() -> Dict[str, int]:
+    """Hit/miss counters of the query-embedding cache"""
+    return _cache.stats()
+
+
+def close_cache() -> None:
+    """Close the persistent tier (if any)"""
+    _cache.close()
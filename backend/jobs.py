@@ -0,0 +1,158 @@
+"""
+Background job queue for media generation (covers, TTS audio).
+
+/recommend can hand its media work to this queue and answer with job ids right away;
+a fixed pool of asyncio worker tasks drains a bounded queue, and clients poll
+/jobs or subscribe to /jobs/events for completions.
+"""
+import asyncio
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+from .config import JOB_WORKERS, JOB_QUEUE_SIZE, JOB_RETENTION_SECONDS
+from .media_store import store as media_store
+
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+
+class QueueFull(Exception):
+    """Raised when the job queue is at capacity"""
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    status: str = PENDING
+    result: Optional[str] = None
+    url: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    _factory: Optional[Callable[[], Awaitable[object]]] = field(default=None, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def public(self) -> Dict[str, object]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "result": self.result,
+            "url": self.url,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    def __init__(self, workers: int = JOB_WORKERS, max_pending: int = JOB_QUEUE_SIZE,
+                 retention: float = JOB_RETENTION_SECONDS):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retention = retention
+        self._jobs: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._finished = asyncio.Condition()
+
+    async def start(self) -> None:
+        """Spawn the worker tasks (call from the running event loop)"""
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, kind: str, factory: Callable[[], Awaitable[object]]) -> Job:
+        """
+        Enqueue a media job
+        Args:
+            kind: Job kind ("image" / "audio")
+            factory: Zero-argument callable returning the awaitable that produces the file path
+        Returns:
+            The pending Job
+        Raises:
+            QueueFull: if the bounded queue has no room
+        """
+        if self._queue is None:
+            raise RuntimeError("JobQueue.start() was not called")
+        self._prune()
+        job = Job(id=uuid.uuid4().hex, kind=kind, _factory=factory)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFull("media job queue is full")
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    async def completions(self, job_ids: List[str], timeout: float):
+        """
+        Yield jobs from `job_ids` as they finish (already finished ones first);
+        stops when all are finished or `timeout` seconds have passed
+        """
+        pending = [j for j in (self._jobs.get(i) for i in job_ids) if j is not None]
+        deadline = time.monotonic() + timeout
+        while pending:
+            ready = [j for j in pending if j.finished]
+            for j in ready:
+                pending.remove(j)
+                yield j
+            if not pending:
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            # Re-checked under the lock: jobs may have finished while the caller held `yield`
+            async with self._finished:
+                try:
+                    await asyncio.wait_for(self._finished.wait_for(lambda: any(j.finished for j in pending)),
+                                           remaining)
+                except asyncio.TimeoutError:
+                    return
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            job.status = RUNNING
+            try:
+                result = await job._factory()
+                job.result = str(result)
+                if isinstance(result, Path):
+                    job.url = media_store.url_for(result.name)
+                job.status = DONE
+            except Exception as e:  # report failures through the job, keep the worker alive
+                job.error = f"{type(e).__name__}: {e}"
+                job.status = FAILED
+            finally:
+                job._factory = None
+                job.finished_at = time.time()
+                self._queue.task_done()
+                async with self._finished:
+                    self._finished.notify_all()
+
+    def _prune(self) -> None:
+        """Forget finished jobs older than the retention window"""
+        cutoff = time.time() - self.retention
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "tracked": len(self._jobs),
+            "running": sum(1 for j in self._jobs.values() if j.status == RUNNING),
+        }
+
+
+queue = JobQueue()
@@ -0,0 +1,200 @@
+"""
+Local lexical retrieval over the catalog, used next to the vector index by db.search_batch().
+
+  - BM25 inverted index over titles, summaries and themes (diacritic-folded tokens,
+    Romanian/English function words dropped; titles and themes weigh double)
+  - exact-title matcher: "Dune", "Ce este 1984?" or "the hobbit" resolve to a book
+    without an embeddings call
+  - reciprocal rank fusion of the vector and BM25 rankings
+
+The index is built from the shared catalog at startup and rebuilt when the catalog
+reloads or a sync changes the collection.
+"""
+import math
+import re
+import threading
+from collections import defaultdict
+from typing import AbstractSet, Any, Dict, Iterable, List, Optional, Tuple
+from .catalog import BookRecord, Catalog, get_catalog, on_reload
+from .sync import book_document, book_metadata, document_hash, on_change
+from .textnorm import fold
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+# Folded function words; ignored by BM25 and allowed around a title in a title query
+STOPWORDS = frozenset("""
+a al ale am as asa au ca care carte cartea ce cea cel cine cu cum da de despre din dori e
+eu este fi imi in la lui ma mai mi mie o ori pe pentru poti recomanda recomandare sa se si
+sunt spune spui te tu un una unei unui vreau vrea caut ceva
+about an and are book by can could for i is it me novel of on or please recommend say
+similar something tell the to want what who wrote
+""".split())
+
+TITLE_WEIGHT = 2  # title and theme tokens count this many times in a document
+THEME_WEIGHT = 2
+
+Hit = Dict[str, Any]
+
+
+def tokenize(text: str) -> List[str]:
+    """Folded word tokens ("Țară, libertate!" -> ["tara", "libertate"])"""
+    return _TOKEN.findall(fold(text))
+
+
+def _terms(tokens: Iterable[str]) -> List[str]:
+    return [t for t in tokens if t not in STOPWORDS]
+
+
+class LexicalIndex:
+    """BM25 index plus a folded-title table over the books of one Catalog"""
+
+    def __init__(self, catalog: Catalog, k1: float = 1.5, b: float = 0.75):
+        self.catalog = catalog
+        self.books: List[BookRecord] = list(catalog.books)
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._doc_len: List[int] = []
+        self._titles: Dict[Tuple[str, ...], int] = {}
+        self._max_title_len = 0
+
+        postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        for doc, rec in enumerate(self.books):
+            title_tokens = tokenize(rec.title)
+            if title_tokens:
+                self._titles.setdefault(tuple(title_tokens), doc)
+                self._max_title_len = max(self._max_title_len, len(title_tokens))
+            terms = (_terms(title_tokens) * TITLE_WEIGHT
+                     + _terms(tokenize(rec.summary))
+                     + _terms(tokenize(" ".join(rec.themes))) * THEME_WEIGHT)
+            for term in terms:
+                postings[term][doc] = postings[term].get(doc, 0) + 1
+            self._doc_len.append(len(terms))
+        self._postings = {term: list(docs.items()) for term, docs in postings.items()}
+        self._avg_len = (sum(self._doc_len) / len(self._doc_len)) if self._doc_len else 0.0
+
+    def __len__(self) -> int:
+        return len(self.books)
+
+    def _idf(self, term: str) -> float:
+        df = len(self._postings.get(term, ()))
+        return math.log(1 + (len(self.books) - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, top_k: int, exclude: Iterable[int] = (),
+               allowed: Optional[AbstractSet[str]] = None) -> List[Tuple[int, float]]:
+        """
+        Rank books by BM25 against the query
+        Args:
+            query: Free-text query
+            top_k: Maximum number of results
+            exclude: Document positions to leave out
+            allowed: If given, only books with these ids are ranked (theme filters)
+        Returns:
+            (document position, BM25 score) pairs, best first
+        """
+        scores: Dict[int, float] = defaultdict(float)
+        avg = self._avg_len or 1.0
+        for term in set(_terms(tokenize(query))):
+            posting = self._postings.get(term)
+            if not posting:
+                continue
+            idf = self._idf(term)
+            for doc, tf in posting:
+                norm = tf + self.k1 * (1 - self.b + self.b * self._doc_len[doc] / avg)
+                scores[doc] += idf * tf * (self.k1 + 1) / norm
+        for doc in exclude:
+            scores.pop(doc, None)
+        if allowed is not None:
+            scores = {doc: score for doc, score in scores.items() if self.books[doc].id in allowed}
+        return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:top_k]
+
+    def match_title(self, query: str) -> Optional[int]:
+        """
+        Position of the book the query names outright, if any: the whole query is a
+        title, or a title surrounded only by function words ("Ce este 1984?")
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return None
+        doc = self._titles.get(tuple(tokens))
+        if doc is not None:
+            return doc
+        for n in range(min(len(tokens), self._max_title_len), 0, -1):
+            for start in range(len(tokens) - n + 1):
+                doc = self._titles.get(tuple(tokens[start:start + n]))
+                if doc is None or all(t in STOPWORDS for t in tokens[start:start + n]):
+                    continue
+                if all(t in STOPWORDS for t in tokens[:start] + tokens[start + n:]):
+                    return doc
+        return None
+
+    def hit(self, doc: int, score: Optional[float] = None) -> Hit:
+        """A hit dict shaped like the vector backends' hits"""
+        book = self.books[doc].as_dict()
+        document = book_document(book)
+        return {
+            "id": book["id"],
+            "document": document,
+            "metadata": book_metadata(book, document_hash(document)),
+            "score": score,
+        }
+
+    def title_hits(self, doc: int, top_k: int, allowed: Optional[AbstractSet[str]] = None) -> List[Hit]:
+        """The named book first, then books sharing its themes (BM25 on the themes)"""
+        rec = self.books[doc]
+        related = self.search(" ".join(rec.themes), top_k - 1, exclude=(doc,), allowed=allowed) if top_k > 1 else []
+        return [self.hit(doc, 1.0)] + [self.hit(d) for d, _ in related]
+
+    def fuse(self, vector_hits: List[Hit], lexical: List[Tuple[int, float]], top_k: int, k: int = 60) -> List[Hit]:
+        """
+        Reciprocal rank fusion: each ranking contributes 1 / (k + rank) per book
+        Args:
+            vector_hits: Hits from the vector backend, best first (they keep their cosine score)
+            lexical: (document position, BM25 score) pairs from search(), best first
+            top_k: Number of fused hits to return
+            k: RRF damping constant
+        Returns:
+            Hit dicts, best fused rank first; lexical-only hits have score None
+        """
+        fused: Dict[str, float] = defaultdict(float)
+        hits: Dict[str, Hit] = {}
+        for rank, h in enumerate(vector_hits):
+            fused[h["id"]] += 1.0 / (k + rank + 1)
+            hits[h["id"]] = h
+        for rank, (doc, _) in enumerate(lexical):
+            book_id = self.books[doc].id
+            fused[book_id] += 1.0 / (k + rank + 1)
+            if book_id not in hits:
+                hits[book_id] = self.hit(doc)
+        order = sorted(fused, key=lambda i: fused[i], reverse=True)
+        return [hits[i] for i in order[:top_k]]
+
+
+_lock = threading.Lock()
+_index: Optional[LexicalIndex] = None
+
+
+def get_index() -> LexicalIndex:
+    """Return the shared index, building it from the current catalog when needed"""
+    global _index
+    catalog = get_catalog()
+    index = _index
+    if index is None or index.catalog is not catalog:
+        with _lock:
+            if _index is None or _index.catalog is not catalog:
+                _index = LexicalIndex(catalog)
+            index = _index
+    return index
+
+
+def rebuild(catalog: Optional[Catalog] = None) -> LexicalIndex:
+    """Rebuild the shared index (from `catalog`, or the current one)"""
+    global _index
+    index = LexicalIndex(catalog if catalog is not None else get_catalog())
+    with _lock:
+        _index = index
+    return index
+
+
+on_reload(rebuild)
+on_change(lambda _report: rebuild())
@@ -0,0 +1,154 @@
+"""
+Content-addressed store for generated media (covers, TTS audio).
+
+Files are keyed by a hash of everything that determines their content (model,
+prompt or text, voice, size), so a repeated request is served from disk without an
+API call and concurrent requests never overwrite each other's files. Writes are
+atomic (temp file + rename) and the store is kept under a disk budget by evicting
+the least recently used files.
+
+Files are served over HTTP by GET /media/{key} (see url_for); entry() gives the
+handler the path, stat and a strong ETag (a digest of the file's bytes).
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional
+from .config import MEDIA_DIR, MEDIA_MAX_BYTES, MEDIA_BASE_URL
+
+_KEY_RE = re.compile(r"[0-9a-f]{64}\.[a-z0-9]{1,5}")
+
+
+class MediaEntry(NamedTuple):
+    path: Path
+    stat: os.stat_result
+    etag: str
+
+
+@lru_cache(maxsize=4096)
+def _digest(path: str, inode: int, size: int) -> str:
+    # Keyed by inode as well: a re-rendered file is a new inode (temp file + rename)
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()[:32]
+
+
+class MediaStore:
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None  # computed lazily on first write
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key_for(kind: str, ext: str, **params) -> str:
+        """Deterministic file key for a media item, e.g. '3fa1…e2.png'"""
+        blob = json.dumps({"kind": kind, **params}, sort_keys=True, ensure_ascii=False)
+        return f"{hashlib.sha256(blob.encode('utf-8')).hexdigest()}.{ext}"
+
+    @staticmethod
+    def valid_key(key: str) -> bool:
+        return _KEY_RE.fullmatch(key) is not None
+
+    @staticmethod
+    def url_for(key: str) -> str:
+        """URL the API serves the file under"""
+        return f"{MEDIA_BASE_URL}/media/{key}"
+
+    def path_for(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def entry(self, key: str) -> Optional[MediaEntry]:
+        """Path, stat and strong ETag of a stored file for serving it, or None (unknown/invalid key)"""
+        if not self.valid_key(key):
+            return None
+        path = self.path_for(key)
+        try:
+            os.utime(path)  # a served file counts as recently used
+            st = path.stat()
+            digest = _digest(str(path), st.st_ino, st.st_size)
+        except FileNotFoundError:
+            return None
+        return MediaEntry(path, st, f'"{digest}"')
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """Return the stored file for `key` (marking it recently used) or None"""
+        path = self.path_for(key)
+        try:
+            os.utime(path)  # mtime doubles as the LRU clock
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    @contextmanager
+    def writer(self, key: str) -> Iterator[Path]:
+        """
+        Yield a temporary path to write into; on success it is atomically
+        renamed to the key's final path, on error it is removed
+        """
+        final = self.path_for(key)
+        final.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=final.parent, prefix=".tmp-", suffix=final.suffix)
+        os.close(fd)
+        tmp_path = Path(tmp)
+        try:
+            yield tmp_path
+            size = tmp_path.stat().st_size
+            os.replace(tmp_path, final)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        self._account(size)
+
+    def put_bytes(self, key: str, data: bytes) -> Path:
+        with self.writer(key) as tmp:
+            tmp.write_bytes(data)
+        return self.path_for(key)
+
+    def _files(self):
+        return [p for p in self.root.glob("*/*") if p.is_file() and not p.name.startswith(".tmp-")]
+
+    def _account(self, added: int) -> None:
+        with self._lock:
+            if self._size is None:
+                self._size = sum(p.stat().st_size for p in self._files())
+            else:
+                self._size += added
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Delete least recently used files until the store fits its budget (lock held)"""
+        entries = []
+        for p in self._files():
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in entries:
+            if total <= self.max_bytes:
+                break
+            p.unlink(missing_ok=True)
+            total -= size
+        self._size = total
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "bytes": self._size, "max_bytes": self.max_bytes}
+
+
+store = MediaStore(Path(MEDIA_DIR), MEDIA_MAX_BYTES)
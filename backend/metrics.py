@@ -0,0 +1,249 @@
+"""
+In-process metrics exposed in the Prometheus text format on /metrics.
+
+  span(stage)         times one pipeline stage (embed, vector_query, chat_select, tts, ...)
+                      into librarian_stage_seconds and into the current request's
+                      timing breakdown (sent back as a Server-Timing header)
+  record_usage(...)   OpenAI token usage (prompt / completion / cached prompt tokens)
+
+Counters and histograms are plain dicts guarded by a lock per metric: an observation
+costs two perf_counter() calls, a bisect and a dict update.
+"""
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _labels(self, key: LabelValues, extra: str = "") -> str:
+        parts = [f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = sorted(self._values.items())
+        lines += [f"{self.name}{self._labels(k)} {_fmt(v)}" for k, v in items]
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = sorted(self._values.items())
+        lines += [f"{self.name}{self._labels(k)} {_fmt(v)}" for k, v in items]
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, List[float]] = {}  # per-bucket counts + [sum, count]
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 3)
+            series[i] += 1  # i == len(buckets) is the +Inf overflow slot
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels: Any) -> int:
+        series = self._series.get(self._key(labels))
+        return int(series[-1]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for key, series in items:
+            cumulative = 0.0
+            for bound, n in zip(self.buckets + (float("inf"),), series):
+                cumulative += n
+                le = f'le="{_fmt(bound)}"'
+                lines.append(f"{self.name}_bucket{self._labels(key, le)} {_fmt(cumulative)}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {repr(series[-2])}")
+            lines.append(f"{self.name}_count{self._labels(key)} {_fmt(series[-1])}")
+        return lines
+
+
+def render() -> str:
+    """Every registered metric in the Prometheus text exposition format (0.0.4)"""
+    lines: List[str] = []
+    for metric in _registry:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = Histogram(
+    "librarian_stage_seconds", "Time spent in each pipeline stage.", ("stage",))
+HTTP_SECONDS = Histogram(
+    "librarian_http_request_seconds", "HTTP request latency (until the response headers for streams).",
+    ("method", "route", "status"))
+OPENAI_TOKENS = Counter(
+    "librarian_openai_tokens_total", "OpenAI token usage reported by the API.", ("call", "kind"))
+OPENAI_REQUESTS = Counter(
+    "librarian_openai_requests_total", "OpenAI requests that reported usage.", ("call",))
+UPSTREAM_IN_FLIGHT = Gauge(
+    "librarian_upstream_in_flight", "Upstream calls holding a concurrency slot.", ("upstream",))
+UPSTREAM_QUEUE_DEPTH = Gauge(
+    "librarian_upstream_queue_depth", "Callers waiting for an upstream concurrency slot.", ("upstream",))
+UPSTREAM_QUEUE_WAIT = Histogram(
+    "librarian_upstream_queue_wait_seconds", "Time spent waiting for an upstream concurrency slot.", ("upstream",))
+UPSTREAM_REJECTED = Counter(
+    "librarian_upstream_rejected_total", "Calls refused by an upstream limiter.", ("upstream", "reason"))
+UPSTREAM_COALESCED = Counter(
+    "librarian_upstream_coalesced_total", "Calls served by an identical in-flight call.", ("upstream",))
+UPSTREAM_SECONDS = Histogram(
+    "librarian_upstream_seconds", "Duration of each upstream attempt (hedges included, queue wait excluded).",
+    ("upstream", "outcome"), buckets=DEFAULT_BUCKETS + (60.0, 120.0))
+UPSTREAM_RETRIES = Counter(
+    "librarian_upstream_retries_total", "Extra upstream attempts: retries after errors and hedged duplicates.",
+    ("upstream", "kind"))
+UPSTREAM_HEDGE_WINS = Counter(
+    "librarian_upstream_hedge_wins_total", "Hedged duplicates that answered before the original attempt.", ("upstream",))
+UPSTREAM_BUDGET_EXHAUSTED = Counter(
+    "librarian_upstream_retry_budget_exhausted_total", "Retries or hedges skipped because the retry budget was spent.",
+    ("upstream", "kind"))
+RECOMMEND_DEGRADED = Counter(
+    "librarian_recommend_degraded_total", "Recommendations built from retrieval alone, by reason.", ("reason",))
+RESPONSE_CACHE_LOOKUPS = Counter(
+    "librarian_response_cache_lookups_total", "Response cache lookups, by result (exact, semantic, miss).", ("result",))
+RESPONSE_CACHE_HIT_RATIO = Gauge(
+    "librarian_response_cache_hit_ratio", "Share of response cache lookups served from the cache.")
+RESPONSE_CACHE_SAVED_SECONDS = Counter(
+    "librarian_response_cache_saved_seconds_total", "Pipeline time the response cache hits did not have to spend.")
+RESPONSE_CACHE_ENTRIES = Gauge(
+    "librarian_response_cache_entries", "Entries held by the response cache.")
+RESPONSE_CACHE_INVALIDATIONS = Counter(
+    "librarian_response_cache_invalidations_total", "Times the response cache was cleared after a catalog change.")
+INDEX_GENERATION = Gauge(
+    "librarian_index_snapshot_generation", "Shared index snapshot generation this process serves.")
+
+
+# Per-request stage totals (stage -> seconds); None outside an HTTP request
+_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("timings", default=None)
+
+
+def begin_request() -> Dict[str, float]:
+    """Start collecting the current request's stage breakdown"""
+    timings: Dict[str, float] = {}
+    _timings.set(timings)
+    return timings
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a block as `stage` (histogram + the current request's breakdown)"""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def server_timing(timings: Dict[str, float], total: Optional[float] = None) -> str:
+    """Server-Timing header value ("embed;dur=12.1, chat_select;dur=803.4, total;dur=...")"""
+    parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def record_usage(call: str, usage: Any) -> None:
+    """Count the tokens from an OpenAI response's `usage` (no-op when it is missing)"""
+    if usage is None:
+        return
+    OPENAI_REQUESTS.inc(call=call)
+    # Chat/embeddings report prompt/completion tokens, the image API input/output tokens
+    prompt = getattr(usage, "prompt_tokens", None) or getattr(usage, "input_tokens", None)
+    completion = getattr(usage, "completion_tokens", None) or getattr(usage, "output_tokens", None)
+    if prompt:
+        OPENAI_TOKENS.inc(prompt, call=call, kind="prompt")
+    if completion:
+        OPENAI_TOKENS.inc(completion, call=call, kind="completion")
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details is not None else None
+    if cached:
+        OPENAI_TOKENS.inc(cached, call=call, kind="cached")
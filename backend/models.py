@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
+from .config import SEARCH_BATCH_MAX, TTS_VOICE
 
 
 class Book(BaseModel):
@@ -17,7 +18,9 @@ class SearchRequest(BaseModel):
     Model for representing a search request
     """
     query: str
-    top_k: int = 4 
+    top_k: int = Field(4, ge=1)
+    include_themes: Optional[List[str]] = None  # only books with at least one of these themes
+    exclude_themes: Optional[List[str]] = None  # no books with any of these themes
 
 
 class SearchHit(BaseModel):
@@ -27,6 +30,29 @@ class SearchHit(BaseModel):
     id: str
     document: str
     metadata: Dict[str, Any]
+    score: Optional[float] = None  # cosine similarity to the query
+
+
+class SearchBatchRequest(BaseModel):
+    """
+    Model for representing a batch of search requests (each with its own top_k)
+    """
+    queries: List[SearchRequest] = Field(min_length=1, max_length=SEARCH_BATCH_MAX)
+
+
+class SearchResult(BaseModel):
+    """
+    Model for representing the hits of one query in a batch
+    """
+    query: str
+    hits: List[SearchHit]
+
+
+class SearchBatchResult(BaseModel):
+    """
+    Model for representing batch search results, in request order
+    """
+    results: List[SearchResult]
 
 
 class RecommendationItem(BaseModel):
@@ -38,6 +64,10 @@ class RecommendationItem(BaseModel):
     detailed_summary: str
     image_path: Optional[str] = None # it can have a generated image per item
     audio_path: Optional[str] = None # it can have a generated audio per item
+    image_url: Optional[str] = None  # GET /media/{key} URL of image_path, usable where the backend's disk is not
+    audio_url: Optional[str] = None  # GET /media/{key} URL of audio_path
+    image_job_id: Optional[str] = None # set instead of image_path/image_url when media is deferred
+    audio_job_id: Optional[str] = None # set instead of audio_path/audio_url when media is deferred
 
 
 class RecommendationRequest(BaseModel):
@@ -45,11 +75,17 @@ class RecommendationRequest(BaseModel):
     Model for representing a recommendation request
     """
     query: str
-    top_k: int = 4                    # in how many results from rag to look into
+    top_k: int = Field(4, ge=1)       # in how many results from rag to look into
     num_recommendations: int = 1      # nr of recommendations to generate in the final response
     language_filter: bool = True      # if we use language filter
     generate_image: bool = False     # if we generate an image for each item
     tts: bool = False                # if we use text-to-speech
+    defer_media: bool = False        # return right away with job ids; media is produced in the background
+    mode: Literal["tool", "single"] = "tool"  # "single": one structured-output call instead of tool calling + JSON
+    include_themes: Optional[List[str]] = None  # restrict retrieval to books with at least one of these themes
+    exclude_themes: Optional[List[str]] = None  # drop books with any of these themes before retrieval
+    context_tokens: Optional[int] = Field(None, ge=0)  # token budget for the RAG candidates in the prompt (0 = no limit)
+    latency_budget_ms: Optional[int] = Field(None, ge=0)  # past it, answer from retrieval alone (degraded); None = LATENCY_BUDGET_MS, 0 = no budget
 
 
 class RecommendationResult(BaseModel):
@@ -57,6 +93,19 @@ class RecommendationResult(BaseModel):
     Model for representing a recommendation result 
     """
     items: List[RecommendationItem] # we can have multiple recommendations in the same response 
+    degraded: bool = False # built from retrieval alone (chat too slow or overloaded); media is then deferred
+
+
+class JobStatus(BaseModel):
+    """
+    Model for representing the state of a background media job
+    """
+    id: str
+    kind: str                        # "image" or "audio"
+    status: str                      # pending | running | done | failed
+    result: Optional[str] = None     # file path once done
+    url: Optional[str] = None        # /media/{key} URL of the file once done
+    error: Optional[str] = None
 
 
 class TTSRequest(BaseModel):
@@ -64,8 +113,7 @@ class TTSRequest(BaseModel):
     Model for representing a text-to-speech request
     """
     text: str
-    voice: Optional[str] = "verse"   # we use "verse" as default voice
-    filename: Optional[str] = "recommendation.wav"
+    voice: Optional[str] = TTS_VOICE  # config.TTS_VOICE unless the client picks one
 
 
 class ImageRequest(BaseModel):
@@ -74,4 +122,3 @@ class ImageRequest(BaseModel):
     """
     title: str
     themes: Optional[str] = ""
-    filename: Optional[str] = "cover.png"
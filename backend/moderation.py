@@ -0,0 +1,163 @@
+"""
+Query moderation: the lexicon file (plus config.BAD_WORDS) compiled into one
+Aho–Corasick automaton over normalized text.
+
+Text and terms are normalized the same way (textnorm.normalize_key: casefolded,
+diacritics stripped, any run of punctuation/whitespace -> one space), so "Ești
+PROȘTI!", "esti prosti" and "prost-ul" all reach the automaton in the same form.
+Terms are compiled with space delimiters (" idiot " or, for "hateword*", " hateword"),
+which turns word boundaries into ordinary characters: one left-to-right pass over
+" <text> " finds every matching term, whatever the lexicon size.
+
+The lexicon is re-read when the file changes (checked at most every
+MODERATION_RELOAD_INTERVAL seconds).
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from .config import BAD_WORDS, MODERATION_LEXICON, MODERATION_RELOAD_INTERVAL
+from .textnorm import normalize_key
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ModerationResult:
+    blocked: bool
+    matched: Tuple[str, ...] = ()  # lexicon terms (as written) found in the text
+
+
+class Automaton:
+    """Aho–Corasick automaton mapping normalized patterns to the terms they came from"""
+
+    def __init__(self, patterns: Dict[str, str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._out: List[Tuple[str, ...]] = [()]
+        for pattern, term in patterns.items():
+            state = 0
+            for ch in pattern:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._out.append(())
+                state = nxt
+            self._out[state] += (term,)
+
+        # Failure links, breadth-first; outputs are merged along them so a
+        # state reports every pattern ending at it
+        self._fail = [0] * len(self._goto)
+        frontier = list(self._goto[0].values())
+        while frontier:
+            nxt_frontier = []
+            for state in frontier:
+                for ch, child in self._goto[state].items():
+                    fallback = self._fail[state]
+                    while fallback and ch not in self._goto[fallback]:
+                        fallback = self._fail[fallback]
+                    target = self._goto[fallback].get(ch, 0)
+                    self._fail[child] = target if target != child else 0
+                    self._out[child] += self._out[self._fail[child]]
+                    nxt_frontier.append(child)
+            frontier = nxt_frontier
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def find(self, text: str) -> List[str]:
+        """Distinct terms whose patterns occur in `text`, in order of first match"""
+        goto, fail, out = self._goto, self._fail, self._out
+        found: Dict[str, None] = {}
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                for term in out[state]:
+                    found[term] = None
+        return list(found)
+
+
+def compile_terms(terms: Iterable[str]) -> Automaton:
+    """Compile lexicon terms ("word", "word*", "two words") into an Automaton"""
+    patterns: Dict[str, str] = {}
+    for term in terms:
+        raw = term.strip()
+        prefix = raw.endswith("*")
+        key = normalize_key(raw.rstrip("*"))
+        if key:
+            patterns.setdefault(f" {key}" if prefix else f" {key} ", raw)
+    # "word" is redundant next to "word*"
+    for pattern in [p for p in patterns if p.endswith(" ") and p[:-1] in patterns]:
+        del patterns[pattern]
+    return Automaton(patterns)
+
+
+def read_lexicon(path: Path) -> List[str]:
+    """Terms from a lexicon file (blank lines and # comments skipped)"""
+    if not path.exists():
+        return []
+    lines = path.read_text(encoding="utf-8").splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.lstrip().startswith("#")]
+
+
+class Moderator:
+    """Shared, hot-reloadable automaton for one lexicon file plus built-in terms"""
+
+    def __init__(self, path: str, extra_terms: Iterable[str] = (), reload_interval: float = 5.0):
+        self.path = Path(path)
+        self.extra_terms = tuple(extra_terms)
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._automaton: Optional[Automaton] = None
+        self._signature = None
+        self._checked_at = 0.0
+        self.terms = 0
+
+    def _file_signature(self):
+        try:
+            st = self.path.stat()
+            return st.st_mtime, st.st_size
+        except FileNotFoundError:
+            return None
+
+    def reload(self) -> Automaton:
+        """Recompile from the lexicon file now"""
+        with self._lock:
+            signature = self._file_signature()
+            terms = list(self.extra_terms) + read_lexicon(self.path)
+            automaton = compile_terms(terms)
+            self._automaton, self._signature, self.terms = automaton, signature, len(terms)
+            self._checked_at = time.monotonic()
+        logger.info("moderation lexicon compiled: %d terms, %d states", len(terms), len(automaton))
+        return automaton
+
+    def automaton(self) -> Automaton:
+        """The current automaton, recompiled first if the lexicon file changed"""
+        automaton = self._automaton
+        now = time.monotonic()
+        if automaton is not None and now - self._checked_at < self.reload_interval:
+            return automaton
+        self._checked_at = now
+        if automaton is None or self._file_signature() != self._signature:
+            automaton = self.reload()
+        return automaton
+
+    def check(self, text: str) -> ModerationResult:
+        """Moderate one text"""
+        matched = self.automaton().find(f" {normalize_key(text)} ")
+        return ModerationResult(blocked=bool(matched), matched=tuple(matched))
+
+
+moderator = Moderator(MODERATION_LEXICON, extra_terms=BAD_WORDS, reload_interval=MODERATION_RELOAD_INTERVAL)
+
+
+def moderate(text: str) -> ModerationResult:
+    """Moderate a query against the shared lexicon"""
+    return moderator.check(text)
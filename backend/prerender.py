@@ -0,0 +1,165 @@
+"""
+Offline pre-rendering of catalog media: a cover for every title.
+
+The files land in the media store under the key /recommend looks up (the cover of
+the catalog title, see tools.cover_key), so covers of recommended catalog books are
+served from disk and only new content is rendered on demand. Narrations are not
+pre-rendered: /recommend speaks each recommendation with its own rationale, which
+is only known once the recommendation is made.
+
+Items are rendered by `--concurrency` asyncio tasks (the calls are network-bound;
+the upstream limiters still cap each API). Rate limits, timeouts, 5xx answers and
+a busy limiter that outlast upstream.call's own short retries are retried with
+longer jittered exponential backoff, honouring Retry-After. Every finished or
+failed item is appended to a JSON-lines manifest, so an interrupted run resumes
+where it stopped; files already in the store are never rendered again.
+
+    python -m backend.prerender [--concurrency 4] [--limit N] [--dry-run]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+from .catalog import get_catalog
+from .config import PRERENDER_MANIFEST, PRERENDER_CONCURRENCY, validate
+from .media_store import store
+from .tools import agenerate_book_image, cover_key
+from .upstream import Overloaded, UpstreamTimeout, retry_after
+from . import resources
+
+
+@dataclass
+class Item:
+    kind: str                    # "image" (the manifest records it)
+    title: str
+    key: str                     # media store key of the finished file
+
+    async def render(self) -> Path:
+        return await agenerate_book_image(self.title, "")
+
+
+def plan() -> List[Item]:
+    """Every catalog cover the media store should hold, in catalog order"""
+    return [Item("image", title, cover_key(title)) for title in get_catalog().titles()]
+
+
+class Manifest:
+    """Append-only JSON-lines log of rendered/failed items; the last record per key wins"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.records: Dict[str, dict] = {}
+        if self.path.exists():
+            for line in self.path.read_text(encoding="utf-8").splitlines():
+                try:
+                    rec = json.loads(line)
+                except ValueError:  # a line cut short by an interrupted run
+                    continue
+                self.records[rec["key"]] = rec
+
+    def status(self, key: str) -> Optional[str]:
+        rec = self.records.get(key)
+        return rec["status"] if rec else None
+
+    def record(self, item: Item, status: str, **extra) -> None:
+        rec = {"key": item.key, "kind": item.kind, "title": item.title, "status": status, "at": time.time(), **extra}
+        self.records[item.key] = rec
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+
+def retry_delay(exc: BaseException, attempt: int, base: float = 1.0, cap: float = 60.0) -> Optional[float]:
+    """
+    Seconds to wait before retrying after `exc`
+    Args:
+        exc: The error the render raised
+        attempt: 0 for the first retry, 1 for the second, ...
+        base: Delay before the first retry (doubled per attempt, then jittered)
+        cap: Longest backoff
+    Returns:
+        The delay, or None when the error is not worth retrying (e.g. a rejected prompt)
+    """
+    import openai
+    if not isinstance(exc, (Overloaded, UpstreamTimeout, openai.RateLimitError, openai.InternalServerError,
+                            openai.APIConnectionError)):
+        return None
+    return max(retry_after(exc), min(cap, base * 2 ** attempt) * random.uniform(0.5, 1.0))
+
+
+async def run(items: List[Item], manifest: Manifest, concurrency: int = PRERENDER_CONCURRENCY,
+              retries: int = 8, retry_failed: bool = False) -> Counter:
+    """Render the items missing from the store; returns counts (rendered, present, failed, ...)"""
+    counts: Counter = Counter()
+    slots = asyncio.Semaphore(concurrency)
+    total = len(items)
+
+    async def one(item: Item) -> None:
+        if store.lookup(item.key) is not None:
+            counts["present"] += 1
+            if manifest.status(item.key) != "done":
+                manifest.record(item, "done", rendered=False)
+            return
+        if manifest.status(item.key) == "failed" and not retry_failed:
+            counts["skipped_failed"] += 1
+            return
+        async with slots:
+            t0 = time.perf_counter()
+            for attempt in range(retries + 1):
+                try:
+                    await item.render()
+                    break
+                except Exception as exc:
+                    delay = retry_delay(exc, attempt) if attempt < retries else None
+                    if delay is None:
+                        counts["failed"] += 1
+                        manifest.record(item, "failed", error=f"{type(exc).__name__}: {exc}", attempts=attempt + 1)
+                        print(f"failed  {item.kind:<5} {item.title!r}: {type(exc).__name__}: {exc}")
+                        return
+                    counts["retries"] += 1
+                    await asyncio.sleep(delay)
+            seconds = time.perf_counter() - t0
+        counts["rendered"] += 1
+        manifest.record(item, "done", rendered=True, seconds=round(seconds, 3))
+        done = counts["rendered"] + counts["failed"]
+        print(f"[{done}] {item.kind:<5} {item.title!r} in {seconds:.1f}s (of {total} items)")
+
+    try:
+        await asyncio.gather(*(one(item) for item in items))
+    finally:
+        await resources.ashutdown()
+    return counts
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Pre-render covers for the catalog.")
+    parser.add_argument("--concurrency", type=int, default=PRERENDER_CONCURRENCY)
+    parser.add_argument("--retries", type=int, default=8, help="retries per item for rate limits and transient errors")
+    parser.add_argument("--retry-failed", action="store_true", help="also retry items the manifest lists as failed")
+    parser.add_argument("--limit", type=int, default=None, help="only the first N items")
+    parser.add_argument("--manifest", default=PRERENDER_MANIFEST)
+    parser.add_argument("--dry-run", action="store_true", help="only report what is missing")
+    args = parser.parse_args(argv)
+
+    validate()
+    items = plan()[:args.limit]
+    if args.dry_run:
+        missing = Counter(item.kind for item in items if store.lookup(item.key) is None)
+        print(f"{len(items)} items, missing: " + (", ".join(f"{k}={n}" for k, n in sorted(missing.items())) or "none"))
+        return
+    t0 = time.perf_counter()
+    try:
+        counts = asyncio.run(run(items, Manifest(args.manifest), args.concurrency, args.retries, args.retry_failed))
+    except KeyboardInterrupt:
+        print("interrupted; finished items are kept, run again to resume")
+        return
+    print(f"{len(items)} items in {time.perf_counter() - t0:.1f}s: " + ", ".join(f"{k}={n}" for k, n in sorted(counts.items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,108 @@
-from typing import List, Dict, Any, Tuple, Optional
-from openai import OpenAI
+from typing import List, Dict, Any, Tuple, Optional, AsyncIterator, Callable, Coroutine, Iterator
+import asyncio
 import json
-from .config import OPENAI_API_KEY, CHAT_MODEL, DEFAULT_TOP_K, BAD_WORDS
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from .catalog import get_catalog
+from .config import (
+    CHAT_MODEL, CONTEXT_MIN_SCORE, CONTEXT_TOKEN_BUDGET, DEFAULT_TOP_K, HYBRID_SEARCH,
+    LATENCY_BUDGET_MS, DEGRADE_ON_UPSTREAM_ERRORS,
+)
+from .context import PackedContext, hit_body, pack_context
 from .db import search
+from .embeddings import embed_query
+from .lexical import get_index as get_lexical_index
+from .metrics import RECOMMEND_DEGRADED, record_usage, span
+from .moderation import ModerationResult, moderate
+from .response_cache import cache as response_cache
+from .resources import get_openai_client, get_async_openai_client
+from .streaming import JsonArrayItems, ToolCallAccumulator
+from .textnorm import normalize_key
 from .tools import get_summary_by_title
+from .upstream import Overloaded, UpstreamTimeout, acall, acoalesce, astream, call, deadline
 
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+logger = logging.getLogger(__name__)
+
+
+def moderation_stage(query: str) -> ModerationResult:
+    """
+    First pipeline stage: match the query against the compiled moderation lexicon
+    (casefolded, diacritic- and punctuation-insensitive; see moderation.py)
+    Args:
+        query: User query
+    Returns:
+        ModerationResult with `blocked` and the lexicon terms that matched
+    """
+    with span("moderation"):
+        result = moderate(query)
+    if result.blocked:
+        logger.info("query blocked by moderation: %s", ", ".join(result.matched))
+    return result
 
 
 def contains_bad_language(text: str) -> bool:
+    """Returns True if the moderation lexicon matches the text"""
+    return moderate(text).blocked
+
+
+def _cache_params(top_k: int, num_recs: int, mode: str, include_themes: Optional[List[str]],
+                  exclude_themes: Optional[List[str]], context_tokens: Optional[int] = None) -> Tuple[Any, ...]:
+    """Response-cache key parameters; theme filters are order- and case-insensitive"""
+    include = tuple(sorted({normalize_key(t) for t in include_themes or ()}))
+    exclude = tuple(sorted({normalize_key(t) for t in exclude_themes or ()}))
+    budget = CONTEXT_TOKEN_BUDGET if context_tokens is None else context_tokens
+    return (top_k, num_recs, mode, include, exclude, budget)
+
+
+def _cache_embedder(query: str) -> Optional[Callable[[str], List[float]]]:
     """
-    Returns True if the input text contains any word found in BAD_WORDS.
-    The check is token-based (splits by whitespace) and normalizes tokens
-    by stripping common punctuation and lowercasing before comparison
+    Embedding function for the response cache's semantic tier, or None when the
+    query names a title: those are served by the lexical fast path, no embeddings call
     """
-    words = {w.strip(".,!?").lower() for w in text.split()}
-    return any(bad in words for bad in BAD_WORDS)
+    if HYBRID_SEARCH and get_lexical_index().match_title(query) is not None:
+        return None
+    return embed_query
+
+
+def _retrieve(query: str, top_k: int, include_themes: Optional[List[str]],
+              exclude_themes: Optional[List[str]]) -> List[Dict[str, Any]]:
+    """Retrieval stage: the (optionally theme-filtered) search for the query"""
+    with span("retrieval"):
+        return search(query, top_k=top_k, include_themes=include_themes, exclude_themes=exclude_themes)
+
+
+async def _aretrieve(query: str, top_k: int, include_themes: Optional[List[str]],
+                     exclude_themes: Optional[List[str]]) -> List[Dict[str, Any]]:
+    """Async variant of _retrieve; the (blocking) search runs in a worker thread"""
+    with span("retrieval"):
+        return await asyncio.to_thread(search, query, top_k, include_themes, exclude_themes)
 
 
-def _ctx_from_hits(hits: List[Dict[str, Any]]) -> str:
+def _pack_hits(
+    hits: List[Dict[str, Any]], num_recs: int, context_tokens: Optional[int],
+    body: Callable[[Dict[str, Any]], str] = hit_body,
+) -> PackedContext:
     """
-    Builds a human-readable context string from retrieval hits
+    Builds the prompt's context block from retrieval hits within the token budget
+    (low-score hits dropped, documents trimmed in rank order; see context.py)
     Args:
         hits: Retrieval results containing 'metadata.title' and 'document'
+        num_recs: Number of recommendations asked for (that many candidates are always kept)
+        context_tokens: Token budget for the block (None: CONTEXT_TOKEN_BUDGET, 0: no limit)
+        body: Text of each candidate below its title
     Returns:
-        A formatted context string
+        A PackedContext; its hits are the eligible candidates
     """
-    return "\n\n".join(
-        f"[#{i+1}] {h['metadata']['title']}\n{h['document']}" for i, h in enumerate(hits)
-    )
+    budget = CONTEXT_TOKEN_BUDGET if context_tokens is None else context_tokens
+    with span("context"):
+        packed = pack_context(hits, budget, min_score=CONTEXT_MIN_SCORE, min_hits=num_recs, body=body)
+    if packed.trimmed or packed.dropped:
+        logger.debug("context: %d of %d hits, %d tokens (%d trimmed)",
+                     len(packed.hits), len(hits), packed.tokens, packed.trimmed)
+    return packed
 
 
 def _titles_from_hits(hits: List[Dict[str, Any]]) -> List[str]:
@@ -60,18 +133,9 @@ _TOOLS_SCHEMA = [{
 }]
 
 
-def _finalize_with_json(messages: List[Dict[str, Any]], num_recs: int) -> List[Tuple[str, str, str]]:
-    """
-    Ask the model to return STRICT JSON: [{title, rationale, detailed_summary}] and parse it
-
-    Args:
-        messages: The message list (system/user/assistant/tool) accumulated so far.
-        num_recs: Expected number of recommendation items
-    Returns:
-        A list of (title, rationale, detailed_summary) tuples with at most `num_recs` items
-        or empty list if parsing fails
-    """
-    messages_for_json = messages + [{
+def _json_request(messages: List[Dict[str, Any]], num_recs: int) -> List[Dict[str, Any]]:
+    """Append the instruction asking for STRICT JSON output to the message list"""
+    return messages + [{
         "role": "system",
         "content": (
             "Formatează rezultatul STRICT ca JSON, fără text suplimentar: "
@@ -79,21 +143,41 @@ def _finalize_with_json(messages: List[Dict[str, Any]], num_recs: int) -> List[T
         ),
     }]
 
-    final = client.chat.completions.create(
-        model=CHAT_MODEL,
-        messages=messages_for_json,
-        temperature=0.2,
-    )
-    content = final.choices[0].message.content or "[]"
+
+def _finalize_request(messages: List[Dict[str, Any]], num_recs: int) -> Dict[str, Any]:
+    """Arguments of the chat completion asking for the final JSON"""
+    return {"model": CHAT_MODEL, "messages": _json_request(messages, num_recs), "temperature": 0.2}
+
+
+# Extra arguments of the streamed chat completions (usage arrives with the last chunk)
+_STREAM_ARGS = {"stream": True, "stream_options": {"include_usage": True}}
+
+
+def _item_tuple(item: Dict[str, Any]) -> Optional[Tuple[str, str, str]]:
+    """(title, rationale, detailed_summary) from one parsed JSON item; None without a title"""
+    title = str(item.get("title", "")).strip()
+    rationale = str(item.get("rationale", "")).strip()
+    detailed = str(item.get("detailed_summary", "")).strip()
+    return (title, rationale, detailed) if title else None
+
+
+def _item_payload(rec: Tuple[str, str, str]) -> Dict[str, str]:
+    title, rationale, detailed = rec
+    return {"title": title, "rationale": rationale, "detailed_summary": detailed}
+
+
+def _parse_recommendations(content: str, num_recs: int) -> List[Tuple[str, str, str]]:
+    """
+    Parse the model's JSON answer into (title, rationale, detailed_summary) tuples;
+    returns an empty list if parsing fails
+    """
     try:
         data = json.loads(content)
         results: List[Tuple[str, str, str]] = []
         for item in data:
-            title = str(item.get("title", "")).strip()
-            rationale = str(item.get("rationale", "")).strip()
-            detailed = str(item.get("detailed_summary", "")).strip()
-            if title:
-                results.append((title, rationale, detailed))
+            rec = _item_tuple(item)
+            if rec:
+                results.append(rec)
         # Enforce exact length if the model produced more
         return results[:num_recs]
     except Exception:
@@ -101,24 +185,46 @@ def _finalize_with_json(messages: List[Dict[str, Any]], num_recs: int) -> List[T
         return []
 
 
-def recommend_multiple_with_tool(query: str, top_k: int, num_recs: int) -> List[Tuple[str, str, str]]:
+def _finalize_with_json(messages: List[Dict[str, Any]], num_recs: int) -> List[Tuple[str, str, str]]:
     """
-    Multi-item recommendation using OpenAI Function Calling over a RAG shortlist.
+    Ask the model to return STRICT JSON: [{title, rationale, detailed_summary}] and parse it
 
     Args:
-        query: User interests / query string
-        top_k: Number of RAG hits to retrieve
-        num_recs: Number of distinct recommendations to return
-
+        messages: The message list (system/user/assistant/tool) accumulated so far.
+        num_recs: Expected number of recommendation items
     Returns:
-        A list of (title, rationale, detailed_summary) tuples or empty if no hits
+        A list of (title, rationale, detailed_summary) tuples with at most `num_recs` items
+        or empty list if parsing fails
     """
-    hits = search(query, top_k=top_k)
-    if not hits:
-        return []
+    request = _finalize_request(messages, num_recs)
+    with span("chat_finalize"):
+        final = call("chat", lambda timeout: get_openai_client().chat.completions.create(**request, timeout=timeout))
+    record_usage("chat_finalize", final.usage)
+    return _parse_recommendations(final.choices[0].message.content or "[]", num_recs)
+
 
-    allowed_titles = _titles_from_hits(hits)
-    books_context = _ctx_from_hits(hits)
+async def _afinalize_with_json(messages: List[Dict[str, Any]], num_recs: int) -> List[Tuple[str, str, str]]:
+    """Async variant of _finalize_with_json"""
+    request = _finalize_request(messages, num_recs)
+    with span("chat_finalize"):
+        final = await acall("chat", lambda timeout: get_async_openai_client().chat.completions.create(
+            **request, timeout=timeout))
+    record_usage("chat_finalize", final.usage)
+    return _parse_recommendations(final.choices[0].message.content or "[]", num_recs)
+
+
+def _initial_messages(query: str, context: PackedContext, num_recs: int) -> List[Dict[str, Any]]:
+    """
+    Builds the system + user messages for the title-selection call
+    Args:
+        query: User interests / query string
+        context: The packed RAG shortlist
+        num_recs: Number of distinct recommendations to ask for
+    Returns:
+        The initial message list
+    """
+    allowed_titles = context.titles
+    books_context = context.text
 
     system_msg = {
         "role": "system",
@@ -140,100 +246,544 @@ def recommend_multiple_with_tool(query: str, top_k: int, num_recs: int) -> List[
             f"{books_context}\n"
         ),
     }
+    return [system_msg, user_msg]
 
-    messages: List[Dict[str, Any]] = [system_msg, user_msg]
 
-    # First, model selects titles and requests tool_calls
-    first = client.chat.completions.create(
-        model=CHAT_MODEL,
-        messages=messages,
-        tools=_TOOLS_SCHEMA,
-        tool_choice="auto",
-        temperature=0.4,
-    )
-
-    assistant_msg = first.choices[0].message
-    messages.append({
-        "role": "assistant",
-        "content": assistant_msg.content or "",
-        "tool_calls": assistant_msg.tool_calls,
-    })
+def _select_request(messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Arguments of the title-selection chat completion (function calling)"""
+    return {"model": CHAT_MODEL, "messages": messages, "tools": _TOOLS_SCHEMA, "tool_choice": "auto", "temperature": 0.4}
 
-    tool_calls = assistant_msg.tool_calls or []
 
-    # Execute requested tools + respond to every tool_call_id
-    used_titles: List[str] = []
-    executed = 0
-
-    for call in tool_calls:
-        fn = getattr(call, "function", None)
-        fn_name = getattr(fn, "name", None) if fn else None
-
-        # Unsupported or missing tool
-        if fn_name != "get_summary_by_title":
-            messages.append({
-                "role": "tool",
-                "tool_call_id": call.id,
-                "name": fn_name or "unknown_tool",
-                "content": "Unsupported tool.",
-            })
-            continue
+def _tool_response(tool_call: Any, allowed_titles: List[str], used_titles: List[str], num_recs: int) -> Dict[str, Any]:
+    """
+    Validates and executes a single tool call; every tool_call_id gets a response
+    Args:
+        tool_call: Tool call from the assistant message
+        allowed_titles: Titles the model may pick (from the RAG shortlist)
+        used_titles: Titles already fetched; extended in place when this call executes
+        num_recs: Maximum number of tool executions
+    Returns:
+        The "tool" role message answering the call
+    """
+    fn = getattr(tool_call, "function", None)
+    fn_name = getattr(fn, "name", None) if fn else None
 
-        # Limit reached: acknowledge but don’t execute
-        if executed >= num_recs:
-            messages.append({
-                "role": "tool",
-                "tool_call_id": call.id,
-                "name": "get_summary_by_title",
-                "content": "Skipped: limit reached.",
-            })
-            continue
+    # Unsupported or missing tool
+    if fn_name != "get_summary_by_title":
+        return {
+            "role": "tool",
+            "tool_call_id": tool_call.id,
+            "name": fn_name or "unknown_tool",
+            "content": "Unsupported tool.",
+        }
 
-        # Parse arguments safely
-        try:
-            args = json.loads(getattr(fn, "arguments", "") or "{}")
-        except Exception:
-            args = {}
-        title = str(args.get("title", "")).strip()
-
-        # Validate & deduplicate titles, but still respond to the tool_call
-        if not title or title not in allowed_titles or title in used_titles:
-            messages.append({
-                "role": "tool",
-                "tool_call_id": call.id,
-                "name": "get_summary_by_title",
-                "content": "Ineligible or duplicate title.",
-            })
-            continue
+    # Limit reached: acknowledge but don’t execute
+    if len(used_titles) >= num_recs:
+        return {
+            "role": "tool",
+            "tool_call_id": tool_call.id,
+            "name": "get_summary_by_title",
+            "content": "Skipped: limit reached.",
+        }
 
-        # Execute tool
-        detailed = get_summary_by_title(title)
-        used_titles.append(title)
-        executed += 1
+    # Parse arguments safely
+    try:
+        args = json.loads(getattr(fn, "arguments", "") or "{}")
+    except Exception:
+        args = {}
+    title = str(args.get("title", "")).strip()
 
-        messages.append({
+    # Validate & deduplicate titles, but still respond to the tool_call
+    if not title or title not in allowed_titles or title in used_titles:
+        return {
             "role": "tool",
-            "tool_call_id": call.id,
+            "tool_call_id": tool_call.id,
             "name": "get_summary_by_title",
-            "content": detailed,
-        })
+            "content": "Ineligible or duplicate title.",
+        }
 
+    # Execute tool
+    detailed = get_summary_by_title(title)
+    used_titles.append(title)
+    return {
+        "role": "tool",
+        "tool_call_id": tool_call.id,
+        "name": "get_summary_by_title",
+        "content": detailed,
+    }
 
-    results = _finalize_with_json(messages, num_recs=num_recs) # request JSON
 
-    # Fallback: if JSON failed, build minimal results from executed titles
+def _run_tool_calls(
+    messages: List[Dict[str, Any]], assistant_msg: Any, allowed_titles: List[str], num_recs: int
+) -> List[str]:
+    """
+    Records the assistant turn, executes the requested tools and responds to every tool_call_id
+    Args:
+        messages: Message list to extend in place
+        assistant_msg: The assistant message returned by the title-selection call
+        allowed_titles: Titles the model may pick (from the RAG shortlist)
+        num_recs: Maximum number of tool executions
+    Returns:
+        The titles whose summaries were fetched, in call order
+    """
+    messages.append({
+        "role": "assistant",
+        "content": assistant_msg.content or "",
+        "tool_calls": assistant_msg.tool_calls,
+    })
+
+    used_titles: List[str] = []
+    for tool_call in assistant_msg.tool_calls or []:
+        messages.append(_tool_response(tool_call, allowed_titles, used_titles, num_recs))
+    return used_titles
+
+
+def _with_fallback(
+    results: List[Tuple[str, str, str]], used_titles: List[str], num_recs: int
+) -> List[Tuple[str, str, str]]:
+    """If JSON failed, build minimal results from executed titles"""
     if not results and used_titles:
         for t in used_titles:
             detailed = get_summary_by_title(t)
             rationale = "High thematic match based on RAG."
             results.append((t, rationale, detailed))
+    return results[:num_recs]
+
+
+def recommend_multiple_with_tool(
+    query: str, top_k: int, num_recs: int,
+    include_themes: Optional[List[str]] = None, exclude_themes: Optional[List[str]] = None,
+    context_tokens: Optional[int] = None, hits: Optional[List[Dict[str, Any]]] = None,
+) -> List[Tuple[str, str, str]]:
+    """
+    Multi-item recommendation using OpenAI Function Calling over a RAG shortlist.
+
+    Args:
+        query: User interests / query string
+        top_k: Number of RAG hits to retrieve
+        num_recs: Number of distinct recommendations to return
+        include_themes: Retrieve only books with at least one of these themes
+        exclude_themes: Leave out books with any of these themes
+        context_tokens: Token budget for the candidates in the prompt (None: CONTEXT_TOKEN_BUDGET)
+        hits: Retrieval results already fetched for the query (skips the search)
 
+    Returns:
+        A list of (title, rationale, detailed_summary) tuples or empty if no hits
+    """
+    if hits is None:
+        hits = _retrieve(query, top_k, include_themes, exclude_themes)
+    if not hits:
+        return []
+
+    context = _pack_hits(hits, num_recs, context_tokens)
+    messages = _initial_messages(query, context, num_recs)
+
+    # First, model selects titles and requests tool_calls
+    request = _select_request(messages)
+    with span("chat_select"):
+        first = call("chat", lambda timeout: get_openai_client().chat.completions.create(**request, timeout=timeout))
+    record_usage("chat_select", first.usage)
+    used_titles = _run_tool_calls(messages, first.choices[0].message, context.titles, num_recs)
+
+    results = _finalize_with_json(messages, num_recs=num_recs) # request JSON
+    return _with_fallback(results, used_titles, num_recs)
+
+
+async def arecommend_multiple_with_tool(
+    query: str, top_k: int, num_recs: int,
+    include_themes: Optional[List[str]] = None, exclude_themes: Optional[List[str]] = None,
+    context_tokens: Optional[int] = None, hits: Optional[List[Dict[str, Any]]] = None,
+) -> List[Tuple[str, str, str]]:
+    """
+    Async variant of recommend_multiple_with_tool; the (blocking) vector search
+    runs in a worker thread and both chat completions use the async client
+    """
+    if hits is None:
+        hits = await _aretrieve(query, top_k, include_themes, exclude_themes)
+    if not hits:
+        return []
+
+    context = _pack_hits(hits, num_recs, context_tokens)
+    messages = _initial_messages(query, context, num_recs)
+
+    request = _select_request(messages)
+    with span("chat_select"):
+        first = await acall("chat", lambda timeout: get_async_openai_client().chat.completions.create(
+            **request, timeout=timeout))
+    record_usage("chat_select", first.usage)
+    used_titles = _run_tool_calls(messages, first.choices[0].message, context.titles, num_recs)
+
+    results = await _afinalize_with_json(messages, num_recs=num_recs)
+    return _with_fallback(results, used_titles, num_recs)
+
+
+def _single_call_body(hit: Dict[str, Any]) -> str:
+    """Candidate text for the single-call mode: the document plus the full summary"""
+    return f"{hit_body(hit)}\nRezumat complet: {get_summary_by_title(hit['metadata']['title'])}"
+
+
+def _single_call_messages(query: str, context: PackedContext, num_recs: int) -> List[Dict[str, Any]]:
+    """
+    Builds the messages for the single-call mode: the full summary of every candidate
+    is attached up front, so no tool round trip is needed
+    Args:
+        query: User interests / query string
+        context: The packed RAG shortlist (bodies from _single_call_body)
+        num_recs: Number of distinct recommendations to ask for
+    Returns:
+        The message list
+    """
+    candidates = context.text
+    return [
+        {
+            "role": "system",
+            "content": (
+                "Ești un recomandator de cărți atent la temele cerute. Răspunde în română. "
+                "NU inventa titluri. Alege doar din lista de titluri eligibile."
+            ),
+        },
+        {
+            "role": "user",
+            "content": (
+                f"Alege EXACT {num_recs} titluri DISTINCTE din candidații de mai jos și explică "
+                "pe scurt de ce fiecare se potrivește intereselor.\n\n"
+                f"Interese: {query}\n\n"
+                f"Candidați:\n{candidates}\n"
+            ),
+        },
+    ]
+
+
+def _single_call_format(allowed_titles: List[str]) -> Dict[str, Any]:
+    """Structured-output schema; the title enum keeps the model inside the shortlist"""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "recommendations",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "items": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "title": {"type": "string", "enum": allowed_titles},
+                                "rationale": {"type": "string"},
+                            },
+                            "required": ["title", "rationale"],
+                            "additionalProperties": False,
+                        },
+                    },
+                },
+                "required": ["items"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+def _single_call_request(query: str, context: PackedContext, num_recs: int) -> Dict[str, Any]:
+    """Arguments of the single-call mode's structured-output chat completion"""
+    return {
+        "model": CHAT_MODEL,
+        "messages": _single_call_messages(query, context, num_recs),
+        "response_format": _single_call_format(context.titles),
+        "temperature": 0.3,
+    }
+
+
+def _single_call_results(items: List[Dict[str, Any]], allowed_titles: List[str], num_recs: int) -> List[Tuple[str, str, str]]:
+    """
+    Validates structured-output items: titles must be eligible and distinct;
+    the detailed summary comes from the local tool data, not from the model
+    """
+    results: List[Tuple[str, str, str]] = []
+    seen: List[str] = []
+    for item in items:
+        title = str(item.get("title", "")).strip()
+        if not title or title not in allowed_titles or title in seen:
+            continue
+        seen.append(title)
+        results.append((title, str(item.get("rationale", "")).strip(), get_summary_by_title(title)))
     return results[:num_recs]
 
 
+def _parse_single_call(content: str, allowed_titles: List[str], num_recs: int) -> List[Tuple[str, str, str]]:
+    try:
+        data = json.loads(content)
+        return _single_call_results(data.get("items", []), allowed_titles, num_recs)
+    except Exception:
+        # Defensive fallback: do not break the flow if JSON is invalid
+        return []
+
+
+def recommend_single_call(
+    query: str, top_k: int, num_recs: int,
+    include_themes: Optional[List[str]] = None, exclude_themes: Optional[List[str]] = None,
+    context_tokens: Optional[int] = None, hits: Optional[List[Dict[str, Any]]] = None,
+) -> List[Tuple[str, str, str]]:
+    """
+    Multi-item recommendation in ONE structured-output chat completion
+    (no function-calling round trip); falls back to the top hits like the tool mode
+
+    Args:
+        query: User interests / query string
+        top_k: Number of RAG hits to retrieve
+        num_recs: Number of distinct recommendations to return
+        include_themes: Retrieve only books with at least one of these themes
+        exclude_themes: Leave out books with any of these themes
+        context_tokens: Token budget for the candidates in the prompt (None: CONTEXT_TOKEN_BUDGET)
+        hits: Retrieval results already fetched for the query (skips the search)
+
+    Returns:
+        A list of (title, rationale, detailed_summary) tuples or empty if no hits
+    """
+    if hits is None:
+        hits = _retrieve(query, top_k, include_themes, exclude_themes)
+    if not hits:
+        return []
+    context = _pack_hits(hits, num_recs, context_tokens, body=_single_call_body)
+    allowed_titles = context.titles
+    request = _single_call_request(query, context, num_recs)
+    with span("chat_single"):
+        resp = call("chat", lambda timeout: get_openai_client().chat.completions.create(**request, timeout=timeout))
+    record_usage("chat_single", resp.usage)
+    results = _parse_single_call(resp.choices[0].message.content or "{}", allowed_titles, num_recs)
+    return _with_fallback(results, allowed_titles[:num_recs], num_recs)
+
+
+async def arecommend_single_call(
+    query: str, top_k: int, num_recs: int,
+    include_themes: Optional[List[str]] = None, exclude_themes: Optional[List[str]] = None,
+    context_tokens: Optional[int] = None, hits: Optional[List[Dict[str, Any]]] = None,
+) -> List[Tuple[str, str, str]]:
+    """Async variant of recommend_single_call"""
+    if hits is None:
+        hits = await _aretrieve(query, top_k, include_themes, exclude_themes)
+    if not hits:
+        return []
+    context = _pack_hits(hits, num_recs, context_tokens, body=_single_call_body)
+    allowed_titles = context.titles
+    request = _single_call_request(query, context, num_recs)
+    with span("chat_single"):
+        resp = await acall("chat", lambda timeout: get_async_openai_client().chat.completions.create(
+            **request, timeout=timeout))
+    record_usage("chat_single", resp.usage)
+    results = _parse_single_call(resp.choices[0].message.content or "{}", allowed_titles, num_recs)
+    return _with_fallback(results, allowed_titles[:num_recs], num_recs)
+
+
+class Recommendations(list):
+    """(title, rationale, detailed_summary) tuples; `degraded` when built from retrieval alone"""
+    degraded = False
+
+
+def _same_stem(a: str, b: str) -> bool:
+    """Crude stemming for Romanian/English inflections ("prieteniei" ~ "prietenie", "magia" ~ "magie")"""
+    n = min(len(a), len(b))
+    if n < 4:
+        return a == b
+    k = max(4, n - 2)
+    return a[:k] == b[:k]
+
+
+def theme_overlap(query: str, themes: List[str], wanted: Optional[List[str]] = None) -> List[str]:
+    """
+    Themes of a book the query mentions (a word of the theme matches a query word up
+    to its inflection) or the request asked for through include_themes
+    Args:
+        query: User interests / query string
+        themes: The book's catalog themes
+        wanted: include_themes of the request, if any
+    Returns:
+        The overlapping themes, in the book's order
+    """
+    words = normalize_key(query).split()
+    wanted_keys = {normalize_key(t) for t in wanted or ()}
+    matched = []
+    for theme in themes:
+        parts = normalize_key(theme).split()
+        if normalize_key(theme) in wanted_keys or any(_same_stem(p, w) for p in parts for w in words):
+            matched.append(theme)
+    return matched
+
+
+def _hit_themes(hit: Dict[str, Any]) -> List[str]:
+    rec = get_catalog().find_title(hit["metadata"]["title"])
+    if rec is not None:
+        return list(rec.themes)
+    return [t for t in (hit["metadata"].get("themes") or "").split(", ") if t]
+
+
+def degraded_recommendations(
+    query: str, hits: List[Dict[str, Any]], num_recs: int, include_themes: Optional[List[str]] = None,
+    reason: str = "budget", skip: Optional[List[str]] = None,
+) -> Recommendations:
+    """
+    Deterministic recommendations built locally from the top retrieval hits, for when
+    the chat stage is too slow or the upstream is shedding load: the rationale names
+    the book's themes that overlap the query, the summary comes from the local tool data
+    Args:
+        query: User interests / query string
+        hits: Retrieval results, best first
+        num_recs: Number of distinct recommendations to return
+        include_themes: Themes the request asked for (count as overlap)
+        reason: Why the chat stage was skipped ("budget", "timeout", "overloaded", ...), for the metrics
+        skip: Titles already recommended (e.g. streamed before the chat stage failed)
+    Returns:
+        Recommendations flagged `degraded`
+    """
+    RECOMMEND_DEGRADED.inc(reason=reason)
+    logger.warning("answering from retrieval alone (%s)", reason)
+    seen = {normalize_key(t) for t in skip or ()}
+    recs = Recommendations()
+    recs.degraded = True
+    for hit in hits:
+        title = hit["metadata"]["title"]
+        if len(recs) >= num_recs or normalize_key(title) in seen:
+            continue
+        seen.add(normalize_key(title))
+        themes = _hit_themes(hit)
+        overlap = theme_overlap(query, themes, include_themes)
+        if overlap:
+            rationale = f"Se potrivește cu interesele tale prin temele: {', '.join(overlap)}."
+        elif themes:
+            rationale = f"Printre cele mai apropiate rezultate ale căutării; teme: {', '.join(themes)}."
+        else:
+            rationale = "Printre cele mai apropiate rezultate ale căutării."
+        recs.append((title, rationale, get_summary_by_title(title)))
+    return recs
+
+
+def _degrade_reason(exc: BaseException, over_budget: bool = False) -> Optional[str]:
+    """Why a chat-stage error is answered in degraded mode; None if it must surface"""
+    if isinstance(exc, asyncio.TimeoutError) or (over_budget and isinstance(exc, UpstreamTimeout)):
+        return "budget"
+    if not DEGRADE_ON_UPSTREAM_ERRORS:
+        return None
+    if isinstance(exc, Overloaded):
+        return "overloaded"
+    if isinstance(exc, UpstreamTimeout):
+        return "timeout"
+    import openai  # only imported once a call failed
+    if isinstance(exc, openai.RateLimitError):
+        return "rate_limited"
+    if isinstance(exc, (openai.APIConnectionError, openai.InternalServerError)):
+        return "unavailable"
+    return None
+
+
+async def _awithin_budget(chat: Coroutine[Any, Any, List[Tuple[str, str, str]]], seconds: Optional[float]):
+    """Await the chat stage, cancelling it with asyncio.TimeoutError after `seconds` (None: no limit)"""
+    if seconds is None:
+        return await chat
+    if seconds <= 0:
+        chat.close()  # never started
+        raise asyncio.TimeoutError
+    with deadline(seconds):  # also tells the upstream calls how long their attempts may take
+        return await asyncio.wait_for(chat, seconds)
+
+
+@dataclass
+class _Pipeline:
+    """
+    One recommendation request and the stages the sync, async and streaming pipelines
+    share: moderation, response cache, retrieval, the latency budget of the chat
+    stage and the degraded answer when that stage fails
+    """
+    query: str
+    top_k: int
+    num_recs: int
+    mode: str
+    include_themes: Optional[List[str]]
+    exclude_themes: Optional[List[str]]
+    context_tokens: Optional[int]
+    latency_budget_ms: Optional[int]
+    started: float = field(default_factory=time.perf_counter)
+
+    @property
+    def params(self) -> Tuple[Any, ...]:
+        return _cache_params(self.top_k, self.num_recs, self.mode, self.include_themes,
+                             self.exclude_themes, self.context_tokens)
+
+    def blocked(self, language_filter: bool) -> Optional[ModerationResult]:
+        """The moderation result when the query is blocked, else None"""
+        if not language_filter:
+            return None
+        result = moderation_stage(self.query)
+        return result if result.blocked else None
+
+    def cached(self) -> Optional[List[Tuple[str, str, str]]]:
+        with span("response_cache"):
+            return response_cache.get(self.query, self.params, embed=_cache_embedder(self.query))
+
+    async def acached(self) -> Optional[List[Tuple[str, str, str]]]:
+        # The semantic lookup may need an embeddings call: keep it off the event loop
+        with span("response_cache"):
+            return await asyncio.to_thread(response_cache.get, self.query, self.params, _cache_embedder(self.query))
+
+    def store(self, recs: List[Tuple[str, str, str]], t0: float) -> None:
+        """Cache a complete answer (never a degraded one) computed since `t0`"""
+        if recs:
+            response_cache.put(self.query, self.params, recs, time.perf_counter() - t0, embed=_cache_embedder(self.query))
+
+    async def astore(self, recs: List[Tuple[str, str, str]], t0: float) -> None:
+        if recs:
+            await asyncio.to_thread(response_cache.put, self.query, self.params, recs,
+                                    time.perf_counter() - t0, _cache_embedder(self.query))
+
+    def retrieve(self) -> List[Dict[str, Any]]:
+        return _retrieve(self.query, self.top_k, self.include_themes, self.exclude_themes)
+
+    async def aretrieve(self) -> List[Dict[str, Any]]:
+        return await _aretrieve(self.query, self.top_k, self.include_themes, self.exclude_themes)
+
+    def chat(self, hits: List[Dict[str, Any]]) -> List[Tuple[str, str, str]]:
+        """The chat stage of the request's mode, on hits already retrieved"""
+        chat = recommend_single_call if self.mode == "single" else recommend_multiple_with_tool
+        return chat(self.query, top_k=self.top_k, num_recs=self.num_recs, include_themes=self.include_themes,
+                    exclude_themes=self.exclude_themes, context_tokens=self.context_tokens, hits=hits)
+
+    def achat(self, hits: List[Dict[str, Any]]) -> Coroutine[Any, Any, List[Tuple[str, str, str]]]:
+        chat = arecommend_single_call if self.mode == "single" else arecommend_multiple_with_tool
+        return chat(self.query, top_k=self.top_k, num_recs=self.num_recs, include_themes=self.include_themes,
+                    exclude_themes=self.exclude_themes, context_tokens=self.context_tokens, hits=hits)
+
+    def budget_left(self) -> Optional[float]:
+        """Seconds of the latency budget left (negative once spent), None without a budget"""
+        budget = LATENCY_BUDGET_MS if self.latency_budget_ms is None else self.latency_budget_ms
+        if not budget:
+            return None
+        return budget / 1000 - (time.perf_counter() - self.started)
+
+    @contextmanager
+    def chat_deadline(self) -> Iterator[None]:
+        """Bound the upstream calls inside the block (attempts and streams) by the budget left"""
+        left = self.budget_left()
+        if left is not None and left <= 0:
+            raise UpstreamTimeout("chat")
+        with deadline(left):
+            yield
+
+    def degraded(self, exc: BaseException, hits: List[Dict[str, Any]],
+                 skip: Optional[List[str]] = None) -> Optional[Recommendations]:
+        """The degraded answer for a chat-stage error, or None when the error must surface"""
+        left = self.budget_left()
+        reason = _degrade_reason(exc, over_budget=left is not None and left <= 0)
+        if reason is None:
+            return None
+        return degraded_recommendations(self.query, hits, self.num_recs - len(skip or ()),
+                                        self.include_themes, reason, skip=skip)
+
+
 def run_recommendation_pipeline_multi(
-    query: str, top_k: int = DEFAULT_TOP_K, num_recs: int = 1, language_filter: bool = True
-) -> Optional[List[Tuple[str, str, str]]]:
+    query: str, top_k: int = DEFAULT_TOP_K, num_recs: int = 1, language_filter: bool = True,
+    mode: str = "tool", include_themes: Optional[List[str]] = None,
+    exclude_themes: Optional[List[str]] = None, context_tokens: Optional[int] = None,
+    latency_budget_ms: Optional[int] = None,
+) -> Optional[Recommendations]:
     """
     Entry point for the multi-recommendation pipeline with optional language filtering
     Args:
@@ -241,10 +791,225 @@ def run_recommendation_pipeline_multi(
         top_k: Number of RAG hits to retrieve
         num_recs: Number of distinct recommendations to return
         language_filter: If True, checks for bad language and blocks when detected
+        mode: "tool" (function calling + JSON, two chat calls) or "single" (one structured-output call)
+        include_themes: Retrieve only books with at least one of these themes
+        exclude_themes: Leave out books with any of these themes
+        context_tokens: Token budget for the candidates in the prompt (None: CONTEXT_TOKEN_BUDGET)
+        latency_budget_ms: Time the call may take before the chat stage is given up for
+            degraded_recommendations (None: LATENCY_BUDGET_MS, 0: no budget); here it bounds
+            the upstream attempts, the async variant also cancels the wait for a slot
     Returns:
-        None if blocked by language_filter; otherwise a list of (title, rationale, detailed_summary)
+        None if blocked by language_filter; otherwise Recommendations, flagged `degraded`
+        when they were built from retrieval alone
     """
-    if language_filter and contains_bad_language(query):
+    run = _Pipeline(query, top_k, num_recs, mode, include_themes, exclude_themes, context_tokens, latency_budget_ms)
+    if run.blocked(language_filter):
         return None  # flagging inadequate language
-    recs = recommend_multiple_with_tool(query, top_k=top_k, num_recs=num_recs)
-    return recs
+    cached = run.cached()
+    if cached is not None:
+        return Recommendations(cached)
+    t0 = time.perf_counter()
+    hits = run.retrieve()
+    if not hits:
+        return Recommendations()
+    try:
+        with run.chat_deadline():
+            recs = run.chat(hits)
+    except Exception as exc:
+        degraded = run.degraded(exc, hits)
+        if degraded is None:
+            raise
+        return degraded
+    run.store(recs, t0)
+    return Recommendations(recs)
+
+
+async def arun_recommendation_pipeline_multi(
+    query: str, top_k: int = DEFAULT_TOP_K, num_recs: int = 1, language_filter: bool = True,
+    mode: str = "tool", include_themes: Optional[List[str]] = None,
+    exclude_themes: Optional[List[str]] = None, context_tokens: Optional[int] = None,
+    latency_budget_ms: Optional[int] = None,
+) -> Optional[Recommendations]:
+    """Async variant of run_recommendation_pipeline_multi (same contract)"""
+    run = _Pipeline(query, top_k, num_recs, mode, include_themes, exclude_themes, context_tokens, latency_budget_ms)
+    if run.blocked(language_filter):
+        return None  # flagging inadequate language
+    cached = await run.acached()
+    if cached is not None:
+        return Recommendations(cached)
+
+    async def compute() -> Recommendations:
+        t0 = time.perf_counter()
+        hits = await run.aretrieve()
+        if not hits:
+            return Recommendations()
+        try:
+            recs = await _awithin_budget(run.achat(hits), run.budget_left())
+        except Exception as exc:
+            degraded = run.degraded(exc, hits)
+            if degraded is None:
+                raise
+            return degraded
+        await run.astore(recs, t0)
+        return Recommendations(recs)
+
+    # Identical requests arriving before the first one is cached share its pipeline run
+    key = (normalize_key(query),) + run.params + (latency_budget_ms,)
+    return await acoalesce(key, compute, label="recommend")
+
+
+async def astream_recommendations(
+    query: str, top_k: int = DEFAULT_TOP_K, num_recs: int = 1, language_filter: bool = True,
+    mode: str = "tool", include_themes: Optional[List[str]] = None,
+    exclude_themes: Optional[List[str]] = None, context_tokens: Optional[int] = None,
+    latency_budget_ms: Optional[int] = None,
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Streaming variant of the pipeline: yields (event, payload) pairs as each stage completes
+      "blocked"   – inadequate language {matched: [terms]} (last event)
+      "hits"      – retrieval shortlist [{id, title}]
+      "selected"  – a title whose tool call resolved (one event per title)
+      "item"      – one recommendation {title, rationale, detailed_summary}, as soon as it parses
+      "done"      – all items (including fallback ones) once the pipeline finished;
+                    {"degraded": true} when some came from retrieval alone
+    Args:
+        query: User interests / query string
+        top_k: Number of RAG hits to retrieve
+        num_recs: Number of distinct recommendations to return
+        language_filter: If True, checks for bad language and blocks when detected
+        mode: "tool" or "single" (no "selected" events: titles arrive with the items)
+        include_themes: Retrieve only books with at least one of these themes
+        exclude_themes: Leave out books with any of these themes
+        context_tokens: Token budget for the candidates in the prompt (None: CONTEXT_TOKEN_BUDGET)
+        latency_budget_ms: As in run_recommendation_pipeline_multi; once it is spent, or the
+            upstream sheds load, the missing items come from degraded_recommendations
+    """
+    run = _Pipeline(query, top_k, num_recs, mode, include_themes, exclude_themes, context_tokens, latency_budget_ms)
+    moderation = run.blocked(language_filter)
+    if moderation is not None:
+        yield "blocked", {"matched": list(moderation.matched)}
+        return
+
+    cached = await run.acached()
+    if cached is not None:
+        for rec in cached:
+            yield "item", _item_payload(rec)
+        yield "done", {"items": [_item_payload(r) for r in cached], "cached": True}
+        return
+    t0 = time.perf_counter()
+
+    hits = await run.aretrieve()
+    yield "hits", [{"id": h["id"], "title": h["metadata"]["title"]} for h in hits]
+    if not hits:
+        yield "done", {"items": []}
+        return
+
+    emitted: List[Dict[str, str]] = []
+    try:
+        with run.chat_deadline():  # the streams stop at the deadline (see upstream.astream)
+            async for event, data in _astream_chat(run, hits, t0):
+                if event == "item":
+                    emitted.append(data)
+                yield event, data
+    except Exception as exc:
+        recs = run.degraded(exc, hits, skip=[item["title"] for item in emitted])
+        if recs is None:
+            raise
+        for rec in recs:
+            emitted.append(_item_payload(rec))
+            yield "item", emitted[-1]
+        yield "done", {"items": emitted, "degraded": True}
+
+
+async def _astream_chat(run: _Pipeline, hits: List[Dict[str, Any]], t0: float) -> AsyncIterator[Tuple[str, Any]]:
+    """The chat stage of astream_recommendations: "selected", "item" and "done" events"""
+    client = get_async_openai_client()
+    query, num_recs = run.query, run.num_recs
+
+    if run.mode == "single":
+        context = _pack_hits(hits, num_recs, run.context_tokens, body=_single_call_body)
+        allowed_titles = context.titles
+        request = _single_call_request(query, context, num_recs)
+        parser = JsonArrayItems()  # scans the "items" array of the structured output
+        results: List[Tuple[str, str, str]] = []
+        # Streamed stages are timed until the upstream stream opens (~time to first token)
+        async with astream("chat", lambda timeout: client.chat.completions.create(
+            **request, **_STREAM_ARGS, timeout=timeout,
+        ), stage="chat_single") as stream:
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    record_usage("chat_single", chunk.usage)
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                for obj in parser.feed(chunk.choices[0].delta.content):
+                    rec = next(iter(_single_call_results([obj], allowed_titles, 1)), None)
+                    if rec and rec[0] not in [r[0] for r in results] and len(results) < num_recs:
+                        results.append(rec)
+                        yield "item", _item_payload(rec)
+        streamed = len(results)
+        results = _with_fallback(results, allowed_titles[:num_recs], num_recs)
+        for rec in results[streamed:]:
+            yield "item", _item_payload(rec)
+        await run.astore(results, t0)
+        yield "done", {"items": [_item_payload(r) for r in results]}
+        return
+
+    context = _pack_hits(hits, num_recs, run.context_tokens)
+    allowed_titles = context.titles
+    messages = _initial_messages(query, context, num_recs)
+
+    # Title selection, streamed so each tool call is executed as soon as its arguments are complete
+    acc = ToolCallAccumulator()
+    used_titles: List[str] = []
+    tool_messages: List[Dict[str, Any]] = []
+    request = _select_request(messages)
+    async with astream("chat", lambda timeout: client.chat.completions.create(
+        **request, **_STREAM_ARGS, timeout=timeout,
+    ), stage="chat_select") as stream:  # timed until the stream opens, as above
+        async for chunk in stream:
+            if chunk.usage is not None:
+                record_usage("chat_select", chunk.usage)
+            if not chunk.choices:
+                continue
+            for tool_call in acc.add(chunk.choices[0].delta):
+                before = len(used_titles)
+                tool_messages.append(_tool_response(tool_call, allowed_titles, used_titles, num_recs))
+                if len(used_titles) > before:
+                    yield "selected", {"title": used_titles[-1]}
+    last_call, assistant_msg = acc.finish()
+    if last_call is not None:
+        before = len(used_titles)
+        tool_messages.append(_tool_response(last_call, allowed_titles, used_titles, num_recs))
+        if len(used_titles) > before:
+            yield "selected", {"title": used_titles[-1]}
+    messages.append({
+        "role": "assistant",
+        "content": assistant_msg.content or "",
+        "tool_calls": assistant_msg.tool_calls,
+    })
+    messages.extend(tool_messages)
+
+    # Final JSON, streamed; each array item is emitted as soon as it is complete
+    parser = JsonArrayItems()
+    results: List[Tuple[str, str, str]] = []
+    request = _finalize_request(messages, num_recs)
+    async with astream("chat", lambda timeout: client.chat.completions.create(
+        **request, **_STREAM_ARGS, timeout=timeout,
+    ), stage="chat_finalize") as stream:
+        async for chunk in stream:
+            if chunk.usage is not None:
+                record_usage("chat_finalize", chunk.usage)
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            for obj in parser.feed(chunk.choices[0].delta.content):
+                rec = _item_tuple(obj)
+                if rec and len(results) < num_recs:
+                    results.append(rec)
+                    yield "item", _item_payload(rec)
+
+    streamed = len(results)
+    results = _with_fallback(results, used_titles, num_recs)
+    for rec in results[streamed:]:
+        yield "item", _item_payload(rec)
+    await run.astore(results, t0)
+    yield "done", {"items": [_item_payload(r) for r in results]}
@@ -0,0 +1,92 @@
+"""
+Process-wide resources shared by the API handlers.
+
+The vector backend and the OpenAI clients are opened once per process
+(at FastAPI startup) and reused by every request instead of being rebuilt per call.
+Importing this module is cheap: the openai package is only imported when a client
+is first needed, and the configuration is validated by startup(), not at import.
+"""
+import threading
+from typing import TYPE_CHECKING, Optional
+from . import config
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+
+
+_lock = threading.Lock()
+_openai_client: Optional["OpenAI"] = None
+_async_openai_client: Optional["AsyncOpenAI"] = None
+
+
+def get_openai_client() -> "OpenAI":
+    """Return the shared OpenAI client, creating it on first use"""
+    global _openai_client
+    if _openai_client is None:
+        with _lock:
+            if _openai_client is None:
+                from openai import OpenAI
+                # Retries and timeouts are upstream.call's (deadline-aware, within the retry budget)
+                _openai_client = OpenAI(api_key=config.OPENAI_API_KEY, max_retries=0)
+    return _openai_client
+
+
+def get_async_openai_client() -> "AsyncOpenAI":
+    """Return the shared async OpenAI client (used by the async /recommend pipeline)"""
+    global _async_openai_client
+    if _async_openai_client is None:
+        with _lock:
+            if _async_openai_client is None:
+                from openai import AsyncOpenAI
+                _async_openai_client = AsyncOpenAI(api_key=config.OPENAI_API_KEY, max_retries=0)
+    return _async_openai_client
+
+
+def warmup() -> None:
+    """
+    Pay the cold-open costs up front so the first user request does not:
+    opens the vector backend (syncing it if needed), loads its index,
+    builds the lexical index, compiles the moderation lexicon, loads the tokenizer
+    and creates the OpenAI clients
+    """
+    from . import context, db, lexical, moderation  # imported here: db depends on this module for its clients
+    db.get_backend().warmup()
+    lexical.get_index()
+    moderation.moderator.automaton()
+    context.count_tokens("")
+    # The SDK imports each API resource module on first attribute access (~0.2 s)
+    for client in (get_openai_client(), get_async_openai_client()):
+        client.embeddings, client.chat.completions, client.images, client.audio.speech
+
+
+def startup(warm: bool = True) -> None:
+    """Validate the configuration and open shared resources; called once from the FastAPI lifespan"""
+    config.validate()
+    from . import db, lexical
+    if warm:
+        warmup()
+    else:
+        db.get_backend()
+        lexical.get_index()
+        get_openai_client()
+
+
+def shutdown() -> None:
+    """Release shared resources; called once from the FastAPI lifespan"""
+    from . import db, embeddings
+    global _openai_client
+    with _lock:
+        if _openai_client is not None:
+            _openai_client.close()
+            _openai_client = None
+    db.close_backend()
+    embeddings.close_cache()
+
+
+async def ashutdown() -> None:
+    """Close the async client (needs the running event loop), then the rest"""
+    global _async_openai_client
+    if _async_openai_client is not None:
+        await _async_openai_client.close()
+        _async_openai_client = None
+    shutdown()
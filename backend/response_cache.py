@@ -0,0 +1,149 @@
+"""
+Response cache in front of the recommendation pipeline.
+
+Lookups first try an exact key of (normalized query, top_k, num_recs, mode); on a
+miss, the query embedding is compared with the cached entries that share the same
+parameters and the closest one is served if its cosine similarity reaches
+RESPONSE_CACHE_SIMILARITY. Entries expire after RESPONSE_CACHE_TTL seconds, the
+cache is bounded (LRU) and it is cleared whenever a catalog sync changes the collection
+or the catalog files are reloaded. Hits, misses and the time saved are exported on /metrics.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from . import metrics
+from .catalog import on_reload
+from .config import RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_SIMILARITY
+from .sync import on_change
+from .textnorm import normalize_key
+
+Recs = List[Tuple[str, str, str]]
+Params = Tuple[Any, ...]  # (top_k, num_recs, mode, include_themes, exclude_themes)
+
+
+@dataclass
+class _Entry:
+    params: Params
+    vector: Optional[np.ndarray]  # unit-normalized query embedding
+    result: Recs
+    created: float
+    compute_seconds: float  # what a hit saves
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int, ttl: float, similarity: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries: "OrderedDict[Tuple[str, Params], _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits_exact = 0
+        self.hits_semantic = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self.invalidations = 0
+
+    @staticmethod
+    def _unit(vector: List[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        n = float(np.linalg.norm(v))
+        return v / n if n else v
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return now - entry.created > self.ttl
+
+    def _count(self, result: str, entry: Optional[_Entry] = None) -> None:
+        """Record one lookup (called with the lock held)"""
+        if result == "exact":
+            self.hits_exact += 1
+        elif result == "semantic":
+            self.hits_semantic += 1
+        else:
+            self.misses += 1
+        metrics.RESPONSE_CACHE_LOOKUPS.inc(result=result)
+        if entry is not None:
+            self.saved_seconds += entry.compute_seconds
+            metrics.RESPONSE_CACHE_SAVED_SECONDS.inc(entry.compute_seconds)
+        hits = self.hits_exact + self.hits_semantic
+        metrics.RESPONSE_CACHE_HIT_RATIO.set(hits / (hits + self.misses))
+        metrics.RESPONSE_CACHE_ENTRIES.set(len(self._entries))
+
+    def get(self, query: str, params: Params, embed: Optional[Callable[[str], List[float]]] = None) -> Optional[Recs]:
+        """
+        Cached result for the query, or None
+        Args:
+            query: Raw user query
+            params: (top_k, num_recs, mode, include_themes, exclude_themes)
+            embed: Returns the query embedding; enables the semantic fallback
+        """
+        key = (normalize_key(query), params)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._count("exact", entry)
+                return list(entry.result)
+            candidates = [(k, e) for k, e in self._entries.items()
+                          if e.params == params and e.vector is not None and not self._expired(e, now)]
+        if embed is None or self.similarity <= 0 or not candidates:
+            with self._lock:
+                self._count("miss")
+            return None
+
+        q = self._unit(embed(query))
+        sims = np.stack([e.vector for _, e in candidates]) @ q
+        best = int(np.argmax(sims))
+        with self._lock:
+            if float(sims[best]) < self.similarity:
+                self._count("miss")
+                return None
+            k, entry = candidates[best]
+            if k in self._entries:
+                self._entries.move_to_end(k)
+            self._count("semantic", entry)
+            return list(entry.result)
+
+    def put(self, query: str, params: Params, result: Recs, compute_seconds: float,
+            embed: Optional[Callable[[str], List[float]]] = None) -> None:
+        vector = self._unit(embed(query)) if embed is not None and self.similarity > 0 else None
+        key = (normalize_key(query), params)
+        with self._lock:
+            self._entries[key] = _Entry(params, vector, list(result), time.time(), compute_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            metrics.RESPONSE_CACHE_ENTRIES.set(len(self._entries))
+
+    def invalidate(self, *_args) -> None:
+        """Drop every entry (the catalog changed)"""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+            metrics.RESPONSE_CACHE_INVALIDATIONS.inc()
+            metrics.RESPONSE_CACHE_ENTRIES.set(0)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            hits = self.hits_exact + self.hits_semantic
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits_exact": self.hits_exact,
+                "hits_semantic": self.hits_semantic,
+                "misses": self.misses,
+                "hit_ratio": hits / lookups if lookups else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+                "invalidations": self.invalidations,
+            }
+
+
+cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_SIMILARITY)
+on_change(cache.invalidate)
+on_reload(cache.invalidate)
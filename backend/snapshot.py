@@ -0,0 +1,155 @@
+"""
+Shared, read-only index snapshot for multi-process serving (SHARED_INDEX=1).
+
+With `uvicorn backend.app:app --workers N` every worker would otherwise open its own
+Chroma client on CHROMA_DIR and, on a fresh volume, race through the initial sync
+(paying for the embeddings N times). With SHARED_INDEX:
+
+  * the first process to start takes a file lock, syncs the source index
+    (VECTOR_BACKEND) and publishes its rows as a snapshot: one NumpyBackend
+    generation in SNAPSHOT_DIR, with CURRENT repointed atomically;
+  * the other processes wait for the lock, find a snapshot whose MANIFEST.json
+    fingerprint matches the catalog and attach without opening the source;
+  * every worker serves from the snapshot memory-mapped and read-only, so the
+    matrix pages are shared through the page cache instead of copied per process,
+    and switches to a newer generation within SNAPSHOT_CHECK_INTERVAL seconds of it
+    being published.
+
+Publish after the catalog changed (running workers pick the new generation up):
+    python -m backend.snapshot [--batch-size N]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from filelock import FileLock, Timeout
+from .catalog import get_catalog
+from .config import (
+    EMBED_MODEL, VECTOR_BACKEND, NUMPY_INDEX_DTYPE, SYNC_BATCH_SIZE, SYNC_ON_STARTUP,
+    SNAPSHOT_DIR, SNAPSHOT_CHECK_INTERVAL, SNAPSHOT_KEEP, validate,
+)
+from .sync import sync_catalog
+from .vector_store import NumpyBackend
+
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "MANIFEST.json"
+
+
+def fingerprint(books: List[Dict[str, Any]]) -> str:
+    """Hash of everything a snapshot's rows depend on (catalog, embedding model, source backend)"""
+    blob = json.dumps({"model": EMBED_MODEL, "source": VECTOR_BACKEND, "books": books},
+                      sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def read_manifest(path: str = SNAPSHOT_DIR) -> Dict[str, Any]:
+    try:
+        return json.loads((Path(path) / MANIFEST).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _write_manifest(path: str, manifest: Dict[str, Any]) -> None:
+    tmp = Path(path) / f".{MANIFEST}.tmp"
+    tmp.write_text(json.dumps(manifest), encoding="utf-8")
+    os.replace(tmp, Path(path) / MANIFEST)
+
+
+class _locked:
+    """The snapshot directory's inter-process lock (logs when another process holds it)"""
+
+    def __init__(self, path: str):
+        Path(path).mkdir(parents=True, exist_ok=True)
+        self.lock = FileLock(str(Path(path) / ".lock"))
+
+    def __enter__(self):
+        try:
+            self.lock.acquire(timeout=0)
+        except Timeout:
+            logger.info("index snapshot: waiting for the process building it")
+            self.lock.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.lock.release()
+        return False
+
+
+def publish(books: List[Dict[str, Any]], batch_size: int = SYNC_BATCH_SIZE, sync: bool = True,
+            path: str = SNAPSHOT_DIR) -> Dict[str, Any]:
+    """
+    Sync the source index with `books` and write all its rows as a new snapshot
+    generation; the caller holds the snapshot lock
+    Args:
+        books: Catalog entries ({id, title, summary, themes})
+        batch_size: Documents per embeddings request during the sync
+        sync: If False, only sync a source that is still empty
+        path: Snapshot directory
+    Returns:
+        The new manifest (generation, fingerprint, rows, published_at)
+    """
+    from .db import open_backend  # db imports this module
+    source = open_backend()
+    try:
+        if sync or source.count() == 0:
+            report = sync_catalog(source, books, batch_size=batch_size)
+            logger.info("index snapshot: source sync %s", report)
+        ids, documents, metadatas, embeddings = source.export()
+    finally:
+        source.close()
+    snap = NumpyBackend(path, dtype=NUMPY_INDEX_DTYPE, keep_generations=SNAPSHOT_KEEP)
+    snap.replace(ids, documents, metadatas, embeddings)
+    manifest = {
+        "generation": snap.generation,
+        "fingerprint": fingerprint(books),
+        "rows": len(ids),
+        "published_at": time.time(),
+    }
+    _write_manifest(path, manifest)
+    snap.close()
+    logger.info("index snapshot: published generation %d (%d rows)", snap.generation, len(ids))
+    return manifest
+
+
+def attach(on_switch: Optional[Callable[[int], None]] = None, path: str = SNAPSHOT_DIR) -> NumpyBackend:
+    """
+    Open the shared snapshot for serving, publishing it first if it is missing or
+    (with SYNC_ON_STARTUP) out of date; at most one process builds it at a time
+    Args:
+        on_switch: Called with the generation whenever a newer snapshot is mapped
+        path: Snapshot directory
+    Returns:
+        A read-only NumpyBackend following the published generations
+    """
+    books = get_catalog().as_dicts()
+    with _locked(path):
+        manifest = read_manifest(path)
+        current = NumpyBackend(path, dtype=NUMPY_INDEX_DTYPE)
+        published = bool(manifest) and manifest.get("generation") == current.generation
+        current.close()
+        if not published or (SYNC_ON_STARTUP and manifest.get("fingerprint") != fingerprint(books)):
+            publish(books, sync=SYNC_ON_STARTUP, path=path)
+    return NumpyBackend(path, dtype=NUMPY_INDEX_DTYPE, watch=SNAPSHOT_CHECK_INTERVAL, on_switch=on_switch)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Sync the vector index and publish it as the shared snapshot.")
+    parser.add_argument("--batch-size", type=int, default=SYNC_BATCH_SIZE,
+                        help="documents per embeddings request (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    validate()
+    with _locked(SNAPSHOT_DIR):
+        manifest = publish(get_catalog().as_dicts(), batch_size=args.batch_size)
+    print(f"generation={manifest['generation']} rows={manifest['rows']} dir={SNAPSHOT_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Helpers for the streaming (/recommend/stream) pipeline: Server-Sent Events framing,
+an incremental parser that pulls complete objects out of a streamed JSON array, and
+an accumulator for streamed tool calls.
+"""
+import json
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletionMessage, ChatCompletionMessageToolCall
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Frame one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class JsonArrayItems:
+    """
+    Incremental scanner for a JSON array of objects arriving in chunks.
+    feed() returns every top-level object completed by the new text, so items
+    can be used before the closing bracket arrives. Text before the first '['
+    (e.g. a code fence) is ignored.
+    """
+
+    def __init__(self):
+        self._buf: List[str] = []
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        items: List[Dict[str, Any]] = []
+        for ch in text:
+            if not self._started:
+                if ch == "[":
+                    self._started = True
+                continue
+            if self._depth > 0:
+                self._buf.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                if self._depth == 0:
+                    self._buf = [ch]
+                self._depth += 1
+            elif ch == "}" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        obj = json.loads("".join(self._buf))
+                    except ValueError:
+                        obj = None
+                    if isinstance(obj, dict):
+                        items.append(obj)
+                    self._buf = []
+        return items
+
+
+class ToolCallAccumulator:
+    """
+    Rebuilds tool calls from streamed chat-completion deltas. add() returns
+    the calls that became complete (a call is complete once the next one starts);
+    finish() returns the last one and the assembled assistant message.
+    """
+
+    def __init__(self):
+        self.content: List[str] = []
+        self._calls: List[Dict[str, Any]] = []
+
+    def _call(self, raw: Dict[str, Any]) -> "ChatCompletionMessageToolCall":
+        from openai.types.chat import ChatCompletionMessageToolCall  # the client has imported openai by now
+        return ChatCompletionMessageToolCall(
+            id=raw["id"], type="function",
+            function={"name": raw["name"], "arguments": raw["arguments"]},
+        )
+
+    def add(self, delta: Any) -> List["ChatCompletionMessageToolCall"]:
+        if getattr(delta, "content", None):
+            self.content.append(delta.content)
+        completed = []
+        for tc in getattr(delta, "tool_calls", None) or []:
+            while len(self._calls) <= tc.index:
+                if self._calls:
+                    completed.append(self._call(self._calls[-1]))
+                self._calls.append({"id": "", "name": "", "arguments": ""})
+            raw = self._calls[tc.index]
+            if tc.id:
+                raw["id"] = tc.id
+            fn = getattr(tc, "function", None)
+            if fn is not None:
+                raw["name"] += fn.name or ""
+                raw["arguments"] += fn.arguments or ""
+        return completed
+
+    def finish(self) -> "tuple[Optional[ChatCompletionMessageToolCall], ChatCompletionMessage]":
+        from openai.types.chat import ChatCompletionMessage
+        last = self._call(self._calls[-1]) if self._calls else None
+        message = ChatCompletionMessage(
+            role="assistant",
+            content="".join(self.content) or None,
+            tool_calls=[self._call(c) for c in self._calls] or None,
+        )
+        return last, message
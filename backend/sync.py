@@ -0,0 +1,172 @@
+"""
+Incremental catalog sync: keeps the vector index in step with data/book_summaries.json.
+
+Each book's document text is hashed and the hash is stored in its metadata. A sync
+upserts only new or changed books (embedding them in batches of `batch_size`),
+updates metadata-only changes without re-embedding, and deletes removed books.
+
+Run from the command line:
+    python -m backend.sync [--batch-size N] [--dry-run]
+"""
+import argparse
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List
+from .catalog import get_catalog
+from .config import SYNC_BATCH_SIZE, validate
+from .embeddings import embed_documents
+
+
+# Called with the SyncReport after every sync that changed the collection
+_listeners: List[Callable[["SyncReport"], None]] = []
+
+
+def on_change(callback: Callable[["SyncReport"], None]) -> None:
+    """Register a callback (e.g. cache invalidation) for syncs that change the collection"""
+    _listeners.append(callback)
+
+
+def notify(report: "SyncReport") -> None:
+    """Run the on_change callbacks (also used when another process published new rows)"""
+    for callback in _listeners:
+        callback(report)
+
+
+def book_document(book: Dict[str, Any]) -> str:
+    """Document text embedded for a book (title + summary + themes)"""
+    themes_str = ", ".join(book.get("themes", []))
+    return f"Title: {book['title']}\nSummary: {book['summary']}\nThemes: {themes_str}"
+
+
+def document_hash(document: str) -> str:
+    return hashlib.sha256(document.encode("utf-8")).hexdigest()
+
+
+def book_metadata(book: Dict[str, Any], doc_hash: str) -> Dict[str, Any]:
+    """Metadata stored next to a book's vector (theme filters match on book_id, see db.search_batch)"""
+    return {
+        "book_id": book["id"],
+        "title": book["title"],
+        "themes": ", ".join(book.get("themes", [])),
+        "doc_hash": doc_hash,
+    }
+
+
+@dataclass
+class SyncReport:
+    """Outcome of a sync run (lists of book ids)"""
+    added: List[str] = field(default_factory=list)
+    updated: List[str] = field(default_factory=list)
+    metadata_only: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.updated or self.metadata_only or self.removed)
+
+    def __str__(self) -> str:
+        return (
+            f"added={len(self.added)} updated={len(self.updated)} "
+            f"metadata_only={len(self.metadata_only)} removed={len(self.removed)} "
+            f"unchanged={self.unchanged}"
+        )
+
+
+def _batches(items: List[Any], size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def sync_catalog(
+    backend, books: List[Dict[str, Any]], batch_size: int = SYNC_BATCH_SIZE, dry_run: bool = False
+) -> SyncReport:
+    """
+    Bring the vector index in line with `books`, touching only what changed
+    Args:
+        backend: VectorBackend to update
+        books: Catalog entries ({id, title, summary, themes})
+        batch_size: Maximum number of documents per embeddings request / upsert
+        dry_run: If True, compute the report without writing anything
+    Returns:
+        A SyncReport with the ids that were added, updated, re-tagged or removed
+    """
+    ids, documents, metadatas = backend.rows()
+    stored: Dict[str, Dict[str, Any]] = {}
+    for id_, meta, doc in zip(ids, metadatas, documents):
+        meta = meta or {}
+        # Rows seeded before hashes were stored: hash the stored document instead
+        stored[id_] = {"hash": meta.get("doc_hash") or document_hash(doc or ""), "metadata": meta}
+
+    report = SyncReport()
+    to_embed: List[Dict[str, Any]] = []
+    to_retag: List[Dict[str, Any]] = []
+    seen = set()
+    for b in books:
+        seen.add(b["id"])
+        doc = book_document(b)
+        h = document_hash(doc)
+        meta = book_metadata(b, h)
+        row = {"id": b["id"], "document": doc, "metadata": meta}
+        current = stored.get(b["id"])
+        if current is None:
+            report.added.append(b["id"])
+            to_embed.append(row)
+        elif current["hash"] != h:
+            report.updated.append(b["id"])
+            to_embed.append(row)
+        elif current["metadata"] != meta:
+            report.metadata_only.append(b["id"])
+            to_retag.append(row)
+        else:
+            report.unchanged += 1
+    report.removed = [id_ for id_ in stored if id_ not in seen]
+
+    if dry_run:
+        return report
+
+    # Embeddings are requested `batch_size` documents at a time; writes are grouped
+    # up to the backend's own limit (the numpy backend rewrites its files per write)
+    write_batch = backend.max_write_batch or max(len(to_embed), len(to_retag), len(report.removed), 1)
+    pending: List[Dict[str, Any]] = []
+    vectors: List[List[float]] = []
+    for i, chunk in enumerate(_batches(to_embed, batch_size)):
+        pending.extend(chunk)
+        vectors.extend(embed_documents([r["document"] for r in chunk]))
+        if len(pending) >= write_batch or (i + 1) * batch_size >= len(to_embed):
+            for rows, vecs in zip(_batches(pending, write_batch), _batches(vectors, write_batch)):
+                backend.upsert(
+                    ids=[r["id"] for r in rows],
+                    documents=[r["document"] for r in rows],
+                    metadatas=[r["metadata"] for r in rows],
+                    embeddings=vecs,
+                )
+            pending, vectors = [], []
+    for chunk in _batches(to_retag, write_batch):
+        backend.update_metadata([r["id"] for r in chunk], [r["metadata"] for r in chunk])
+    for chunk in _batches(report.removed, write_batch):
+        backend.delete(chunk)
+    if report.changed:
+        notify(report)
+    return report
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Sync the book catalog into the vector index.")
+    parser.add_argument("--batch-size", type=int, default=SYNC_BATCH_SIZE,
+                        help="documents per embeddings request (default: %(default)s)")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would change")
+    args = parser.parse_args(argv)
+
+    validate()
+    from .db import open_backend
+    backend = open_backend()
+    try:
+        report = sync_catalog(backend, get_catalog().as_dicts(), batch_size=args.batch_size, dry_run=args.dry_run)
+    finally:
+        backend.close()
+    print(("[dry-run] " if args.dry_run else "") + str(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+"""
+Text normalization shared by caches and indexes: casefolding, Romanian diacritic
+folding (ș/ş → s, ț/ţ → t, ă/â → a, î → i, …) and punctuation-insensitive keys.
+"""
+import re
+import unicodedata
+
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def fold(text: str) -> str:
+    """Casefold and strip diacritics ("Și Țară" -> "si tara")"""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def normalize_key(text: str) -> str:
+    """Folded text with punctuation removed and whitespace collapsed, for exact-match keys"""
+    return " ".join(_NON_WORD.sub(" ", fold(text)).split())
@@ -0,0 +1,734 @@
+"""
+Admission control and call policy for the OpenAI APIs the backend calls
+(embeddings, chat, image, speech).
+
+Each upstream has its own limiter: at most `concurrency` calls in flight, at most
+`max_queue` callers waiting for a slot, each for at most `queue_timeout` seconds.
+A caller that finds the queue full, or whose wait runs out, gets Overloaded at once
+(the API answers 503 with Retry-After) instead of tying up a worker thread or a task
+behind slow image renders. Threads (sync endpoints, searches run in worker threads)
+and asyncio tasks wait in the same FIFO queue.
+
+Identical in-flight calls are coalesced (singleflight): callers passing the same `key`
+while a call with that key is running get its result, and only one upstream request
+is made (the same query embedding, the same cover prompt, the same recommendation).
+
+Every call also follows its upstream's policy, to keep slow or failing attempts out
+of the tail latency:
+  * each attempt gets a timeout: the upstream's own (EMBED_TIMEOUT, ...), cut to what
+    is left of the request deadline (set per API request, see deadline());
+  * timeouts, connection errors, 429 and 5xx answers are retried with jittered
+    exponential backoff (honouring Retry-After) while the deadline allows;
+  * retries and hedges draw on one retry budget shared by all upstreams, so they stay
+    a small fraction of the traffic during an outage instead of multiplying it;
+  * for HEDGE_UPSTREAMS, an attempt still running after the upstream's recent p95
+    latency gets a duplicate, and whichever answers first wins.
+
+The request callables receive the attempt's timeout, to pass on to the SDK:
+
+    resp = call("embeddings", lambda timeout: client.embeddings.create(..., timeout=timeout), key=(model, inputs))
+    img = await acall("image", lambda timeout: aclient.images.generate(..., timeout=timeout), key=prompt)
+    async with astream("chat", lambda timeout: aclient.chat.completions.create(..., stream=True, timeout=timeout)) as stream:
+        ...                       # streamed responses hold the slot until they finish
+"""
+import asyncio
+import concurrent.futures
+import contextvars
+import math
+import random
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Hashable, Iterator, List, Optional, TypeVar
+from .config import (
+    EMBED_CONCURRENCY, CHAT_CONCURRENCY, IMAGE_CONCURRENCY, SPEECH_CONCURRENCY,
+    UPSTREAM_QUEUE_SIZE, UPSTREAM_QUEUE_TIMEOUT,
+    EMBED_TIMEOUT, CHAT_TIMEOUT, IMAGE_TIMEOUT, SPEECH_TIMEOUT, UPSTREAM_MAX_RETRIES, RETRY_BACKOFF,
+    RETRY_BUDGET_RATIO, RETRY_BUDGET_MAX, HEDGE_UPSTREAMS, HEDGE_QUANTILE, HEDGE_MIN_DELAY, HEDGE_MIN_SAMPLES,
+)
+from .metrics import (
+    UPSTREAM_COALESCED, UPSTREAM_IN_FLIGHT, UPSTREAM_QUEUE_DEPTH, UPSTREAM_QUEUE_WAIT, UPSTREAM_REJECTED,
+    UPSTREAM_SECONDS, UPSTREAM_RETRIES, UPSTREAM_HEDGE_WINS, UPSTREAM_BUDGET_EXHAUSTED, span,
+)
+
+T = TypeVar("T")
+
+
+class Overloaded(Exception):
+    """Raised when an upstream's queue is full or a caller's wait for a slot ran out"""
+
+    def __init__(self, upstream: str, reason: str, retry_after: float):
+        super().__init__(f"The {upstream} service is busy, please retry shortly ({reason})")
+        self.upstream = upstream
+        self.reason = reason  # "queue_full" or "deadline"
+        self.retry_after = retry_after
+
+
+class UpstreamTimeout(Exception):
+    """Raised when an upstream call ran out of time (its attempts timed out or the request deadline passed)"""
+
+    def __init__(self, upstream: str):
+        super().__init__(f"The {upstream} service did not answer in time")
+        self.upstream = upstream
+
+
+class _Waiter:
+    __slots__ = ("event", "loop", "future", "granted")
+
+    def __init__(self, event: Optional[threading.Event] = None, loop=None, future=None):
+        self.event = event
+        self.loop = loop
+        self.future = future
+        self.granted = False
+
+
+def _wake(future: "asyncio.Future") -> None:
+    if not future.done():
+        future.set_result(True)
+
+
+class Limiter:
+    """Concurrency limit plus a bounded FIFO wait queue with a per-caller deadline"""
+
+    def __init__(self, name: str, concurrency: int, max_queue: int = UPSTREAM_QUEUE_SIZE,
+                 queue_timeout: float = UPSTREAM_QUEUE_TIMEOUT):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters: Deque[_Waiter] = deque()
+        self.rejected = 0
+
+    @property
+    def in_flight(self) -> int:
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _publish(self) -> None:
+        UPSTREAM_IN_FLIGHT.set(self._active, upstream=self.name)
+        UPSTREAM_QUEUE_DEPTH.set(len(self._waiters), upstream=self.name)
+
+    def _reject(self, reason: str) -> Overloaded:
+        self.rejected += 1
+        UPSTREAM_REJECTED.inc(upstream=self.name, reason=reason)
+        return Overloaded(self.name, reason, retry_after=max(1.0, math.ceil(self.queue_timeout)))
+
+    def _enter(self, waiter: _Waiter) -> bool:
+        """Take a free slot (True) or queue `waiter` (False); raises when the queue is full"""
+        with self._lock:
+            if self._active < self.concurrency and not self._waiters:
+                self._active += 1
+                self._publish()
+                return True
+            if len(self._waiters) >= self.max_queue:
+                raise self._reject("queue_full")
+            self._waiters.append(waiter)
+            self._publish()
+            return False
+
+    def _withdraw(self, waiter: _Waiter) -> bool:
+        """Leave the queue after a timeout/cancel; True if a slot was handed over meanwhile"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            self._publish()
+            return False
+
+    def acquire(self) -> None:
+        """Wait (blocking the thread) for a slot"""
+        t0 = time.perf_counter()
+        waiter = _Waiter(event=threading.Event())
+        if not self._enter(waiter):
+            if not waiter.event.wait(self.queue_timeout) and not self._withdraw(waiter):
+                raise self._reject("deadline")
+        UPSTREAM_QUEUE_WAIT.observe(time.perf_counter() - t0, upstream=self.name)
+
+    async def aacquire(self) -> None:
+        """Wait (without blocking the event loop) for a slot"""
+        t0 = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(loop=loop, future=loop.create_future())
+        if not self._enter(waiter):
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+            except asyncio.TimeoutError:
+                if not self._withdraw(waiter):
+                    raise self._reject("deadline") from None
+            except asyncio.CancelledError:
+                if self._withdraw(waiter):
+                    self.release()
+                raise
+        UPSTREAM_QUEUE_WAIT.observe(time.perf_counter() - t0, upstream=self.name)
+
+    def try_acquire(self) -> bool:
+        """Take a slot only if one is free right now (nobody queued)"""
+        with self._lock:
+            if self._active < self.concurrency and not self._waiters:
+                self._active += 1
+                self._publish()
+                return True
+            return False
+
+    def release(self) -> None:
+        """Free a slot, handing it straight to the longest-waiting caller if any"""
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                if waiter.event is not None:
+                    waiter.event.set()
+                    break
+                try:
+                    waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+                    break
+                except RuntimeError:  # its event loop is gone; try the next caller
+                    continue
+            else:
+                self._active -= 1
+            self._publish()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "in_flight": self._active,
+            "queued": len(self._waiters),
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+        }
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _AFlight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0  # callers still awaiting the task
+
+
+class Singleflight:
+    """Coalesces concurrent calls with the same key into one execution"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._acalls: Dict[Hashable, _AFlight] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], T], label: str = "") -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            UPSTREAM_COALESCED.inc(upstream=label)
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+    async def ado(self, key: Hashable, factory: Callable[[], Awaitable[T]], label: str = "") -> T:
+        """
+        Async variant of do(). The work runs in its own task, which every caller awaits
+        through asyncio.shield: a caller that is cancelled (e.g. a dropped client) leaves
+        without cancelling the others; the last one to leave cancels the work
+        """
+        loop = asyncio.get_running_loop()
+        loop_key = (id(loop), key)  # tasks belong to one event loop
+        with self._lock:
+            flight = self._acalls.get(loop_key)
+            if flight is None:
+                flight = self._acalls[loop_key] = _AFlight(loop.create_task(factory()))
+                flight.task.add_done_callback(lambda task: self._aforget(loop_key, flight))
+            else:
+                UPSTREAM_COALESCED.inc(upstream=label)
+            flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            self._aleave(loop_key, flight)
+            raise
+
+    def _aleave(self, loop_key: Hashable, flight: _AFlight) -> None:
+        """A caller was cancelled: cancel the work if nobody else awaits it"""
+        with self._lock:
+            flight.waiters -= 1
+            orphaned = flight.waiters == 0 and not flight.task.done()
+            if orphaned and self._acalls.get(loop_key) is flight:
+                del self._acalls[loop_key]  # later callers start afresh
+        if orphaned:
+            flight.task.cancel()
+
+    def _aforget(self, loop_key: Hashable, flight: _AFlight) -> None:
+        with self._lock:
+            if self._acalls.get(loop_key) is flight:
+                del self._acalls[loop_key]
+        # Mark the outcome as retrieved even when every caller left
+        flight.task.cancelled() or flight.task.exception()
+
+
+# Monotonic time by which the current API request's upstream calls must be done (None: no
+# deadline). Context variables follow asyncio tasks and asyncio.to_thread, so the searches
+# run in worker threads see it too; background media jobs run without one.
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("upstream_deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[None]:
+    """Bound the upstream calls made inside the block to `seconds` from now (nesting only shortens it)"""
+    if not seconds:
+        yield
+        return
+    end = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(end if current is None else min(current, end))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline (negative once it passed), None without one"""
+    end = _deadline.get()
+    return None if end is None else end - time.monotonic()
+
+
+class RetryBudget:
+    """
+    Token bucket shared by every upstream: each call deposits `ratio` tokens and each
+    retry or hedge spends one, so extra attempts stay a fraction of the traffic
+    """
+
+    def __init__(self, ratio: float = RETRY_BUDGET_RATIO, maximum: float = RETRY_BUDGET_MAX):
+        self.ratio = ratio
+        self.maximum = maximum
+        self._tokens = maximum
+        self._lock = threading.Lock()
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._tokens = min(self.maximum, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class Policy:
+    """Timeout, retries and hedging for one upstream, plus its recent latencies"""
+
+    def __init__(self, name: str, timeout: float, retries: int = UPSTREAM_MAX_RETRIES, hedge: bool = False,
+                 window: int = 256):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.hedge = hedge
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._hedge_delay: Optional[float] = None
+        self._stale = 0
+        self._lock = threading.Lock()
+
+    def attempt_timeout(self) -> float:
+        """Timeout for the next attempt: the upstream's own, cut to what is left of the deadline"""
+        left = remaining()
+        if left is None:
+            return self.timeout
+        if left <= 0:
+            raise UpstreamTimeout(self.name)
+        return min(self.timeout, left)
+
+    def observe(self, seconds: float, outcome: str, sample: bool = True) -> None:
+        UPSTREAM_SECONDS.observe(seconds, upstream=self.name, outcome=outcome)
+        if outcome == "ok" and sample:
+            with self._lock:
+                self._latencies.append(seconds)
+                self._stale += 1
+
+    def hedge_delay(self) -> Optional[float]:
+        """How long an attempt may run before it gets a duplicate; None = do not hedge (yet)"""
+        if not self.hedge:
+            return None
+        with self._lock:
+            n = len(self._latencies)
+            if n < HEDGE_MIN_SAMPLES:
+                return None
+            if self._hedge_delay is None or self._stale >= 16:  # re-sorted every 16 new samples
+                ordered = sorted(self._latencies)
+                self._hedge_delay = max(HEDGE_MIN_DELAY, ordered[min(n - 1, int(HEDGE_QUANTILE * n))])
+                self._stale = 0
+            return self._hedge_delay
+
+
+limiters: Dict[str, Limiter] = {
+    "embeddings": Limiter("embeddings", EMBED_CONCURRENCY),
+    "chat": Limiter("chat", CHAT_CONCURRENCY),
+    "image": Limiter("image", IMAGE_CONCURRENCY),
+    "speech": Limiter("speech", SPEECH_CONCURRENCY),
+}
+policies: Dict[str, Policy] = {
+    name: Policy(name, timeout, hedge=name in HEDGE_UPSTREAMS)
+    for name, timeout in (("embeddings", EMBED_TIMEOUT), ("chat", CHAT_TIMEOUT),
+                          ("image", IMAGE_TIMEOUT), ("speech", SPEECH_TIMEOUT))
+}
+retry_budget = RetryBudget()
+_flight = Singleflight()
+_executor_lock = threading.Lock()
+_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+
+def _hedge_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """Threads for hedged sync calls; every task holds an upstream slot, so the slots bound them"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = sum(limiters[name].concurrency for name in HEDGE_UPSTREAMS) or 1
+                _executor = concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix="upstream-hedge")
+    return _executor
+
+
+def _is_timeout(exc: BaseException) -> bool:
+    import openai  # only imported once an attempt failed
+    return isinstance(exc, openai.APITimeoutError)
+
+
+def _transient(exc: BaseException) -> bool:
+    """Errors worth another attempt: timeouts, connection errors, 429 and 5xx answers"""
+    import openai
+    return isinstance(exc, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError))
+
+
+def retry_after(exc: BaseException) -> float:
+    """The Retry-After seconds an API error or Overloaded carries (0 without one)"""
+    if isinstance(exc, Overloaded):
+        return exc.retry_after
+    response = getattr(exc, "response", None)
+    try:
+        return float(response.headers.get("retry-after", 0)) if response is not None else 0.0
+    except ValueError:
+        return 0.0
+
+
+def _outcome(exc: BaseException) -> str:
+    if isinstance(exc, asyncio.CancelledError):
+        return "cancelled"
+    return "timeout" if _is_timeout(exc) else "error"
+
+
+def _backoff(policy: Policy, exc: BaseException, attempt: int) -> Optional[float]:
+    """Seconds to wait before retrying after `exc`, or None to give up"""
+    if attempt >= policy.retries or not _transient(exc):
+        return None
+    delay = max(retry_after(exc), RETRY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+    left = remaining()
+    if left is not None and delay >= left:
+        return None
+    if not retry_budget.withdraw():
+        UPSTREAM_BUDGET_EXHAUSTED.inc(upstream=policy.name, kind="retry")
+        return None
+    UPSTREAM_RETRIES.inc(upstream=policy.name, kind="retry")
+    return delay
+
+
+def _failure(policy: Policy, exc: BaseException) -> BaseException:
+    """What the caller sees once `exc` is not retried: timeouts become UpstreamTimeout"""
+    return UpstreamTimeout(policy.name) if _is_timeout(exc) else exc
+
+
+def _hedge_timeout(policy: Policy, limiter: Limiter) -> Optional[float]:
+    """Take a free slot and a budget token for a hedge; returns its timeout, None if it may not be sent"""
+    left = remaining()
+    if left is not None and left <= 0:
+        return None
+    if not limiter.try_acquire():
+        return None
+    if not retry_budget.withdraw():
+        limiter.release()
+        UPSTREAM_BUDGET_EXHAUSTED.inc(upstream=policy.name, kind="hedge")
+        return None
+    UPSTREAM_RETRIES.inc(upstream=policy.name, kind="hedge")
+    return policy.timeout if left is None else min(policy.timeout, left)
+
+
+def _attempt(policy: Policy, fn: Callable[[float], T], timeout: float, sample: bool = True) -> T:
+    t0 = time.perf_counter()
+    try:
+        result = fn(timeout)
+    except BaseException as exc:
+        policy.observe(time.perf_counter() - t0, _outcome(exc))
+        raise
+    policy.observe(time.perf_counter() - t0, "ok", sample)
+    return result
+
+
+async def _aattempt(policy: Policy, factory: Callable[[float], Awaitable[T]], timeout: float,
+                    sample: bool = True) -> T:
+    t0 = time.perf_counter()
+    try:
+        result = await factory(timeout)
+    except BaseException as exc:
+        policy.observe(time.perf_counter() - t0, _outcome(exc))
+        raise
+    policy.observe(time.perf_counter() - t0, "ok", sample)
+    return result
+
+
+def _released(limiter: Limiter, policy: Policy, fn: Callable[[float], T], timeout: float, sample: bool = True) -> T:
+    """One attempt by a caller already holding a slot, freeing it afterwards"""
+    try:
+        return _attempt(policy, fn, timeout, sample)
+    finally:
+        limiter.release()
+
+
+async def _areleased(limiter: Limiter, policy: Policy, factory: Callable[[float], Awaitable[T]], timeout: float,
+                     sample: bool = True) -> T:
+    try:
+        return await _aattempt(policy, factory, timeout, sample)
+    finally:
+        limiter.release()
+
+
+def _once(policy: Policy, fn: Callable[[float], T], timeout: float, hedge: bool) -> T:
+    """One attempt under a slot, hedged once it outlives the upstream's hedge delay"""
+    limiter = limiters[policy.name]
+    delay = policy.hedge_delay() if hedge else None
+    limiter.acquire()
+    if delay is None:
+        return _released(limiter, policy, fn, timeout, sample=hedge)
+    submit = lambda t: _hedge_executor().submit(contextvars.copy_context().run, _released, limiter, policy, fn, t)
+    primary = submit(timeout)
+    try:
+        return primary.result(timeout=delay)
+    except concurrent.futures.TimeoutError:
+        pass
+    hedge_timeout = _hedge_timeout(policy, limiter)
+    if hedge_timeout is None:
+        return primary.result()
+    hedge = submit(hedge_timeout)
+    # The losing attempt cannot be interrupted; it finishes in the background and frees its slot
+    for future in concurrent.futures.as_completed((primary, hedge)):
+        if future.exception() is None:
+            if future is hedge:
+                UPSTREAM_HEDGE_WINS.inc(upstream=policy.name)
+            return future.result()
+    return primary.result()  # both failed: raise the original attempt's error
+
+
+async def _aonce(policy: Policy, factory: Callable[[float], Awaitable[T]], timeout: float, hedge: bool) -> T:
+    """Async variant of _once(); the losing attempt is cancelled"""
+    limiter = limiters[policy.name]
+    delay = policy.hedge_delay() if hedge else None
+    await limiter.aacquire()
+    if delay is None:
+        return await _areleased(limiter, policy, factory, timeout, sample=hedge)
+    primary = asyncio.ensure_future(_areleased(limiter, policy, factory, timeout))
+    tasks: List["asyncio.Future"] = [primary]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            hedge_timeout = _hedge_timeout(policy, limiter)
+            if hedge_timeout is not None:
+                tasks.append(asyncio.ensure_future(_areleased(limiter, policy, factory, hedge_timeout)))
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        UPSTREAM_HEDGE_WINS.inc(upstream=policy.name)
+                    return task.result()
+        return primary.result()  # both failed: raise the original attempt's error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _retrying(policy: Policy, once: Callable[[float], T]) -> T:
+    """Run `once(timeout)` until it succeeds, the error is not transient or retries/budget/deadline run out"""
+    retry_budget.deposit()
+    attempt = 0
+    while True:
+        try:
+            return once(policy.attempt_timeout())
+        except Exception as exc:
+            delay = _backoff(policy, exc, attempt)
+            if delay is None:
+                failure = _failure(policy, exc)
+                if failure is exc:
+                    raise
+                raise failure from exc
+        attempt += 1
+        time.sleep(delay)
+
+
+async def _aretrying(policy: Policy, once: Callable[[float], Awaitable[T]]) -> T:
+    """Async variant of _retrying()"""
+    retry_budget.deposit()
+    attempt = 0
+    while True:
+        try:
+            return await once(policy.attempt_timeout())
+        except Exception as exc:
+            delay = _backoff(policy, exc, attempt)
+            if delay is None:
+                failure = _failure(policy, exc)
+                if failure is exc:
+                    raise
+                raise failure from exc
+        attempt += 1
+        await asyncio.sleep(delay)
+
+
+@contextmanager
+def slot(upstream: str) -> Iterator[None]:
+    """Hold one of the upstream's concurrency slots (blocking wait)"""
+    limiter = limiters[upstream]
+    limiter.acquire()
+    try:
+        yield
+    finally:
+        limiter.release()
+
+
+@asynccontextmanager
+async def aslot(upstream: str) -> AsyncIterator[None]:
+    """Hold one of the upstream's concurrency slots (async wait)"""
+    limiter = limiters[upstream]
+    await limiter.aacquire()
+    try:
+        yield
+    finally:
+        limiter.release()
+
+
+def timeout_for(upstream: str) -> float:
+    """Timeout for a request made outside call()/acall() (raises UpstreamTimeout past the deadline)"""
+    return policies[upstream].attempt_timeout()
+
+
+def call(upstream: str, fn: Callable[[float], T], key: Optional[Hashable] = None, hedge: bool = True) -> T:
+    """
+    Run one upstream request under the upstream's limiter and call policy
+    Args:
+        upstream: "embeddings", "chat", "image" or "speech"
+        fn: Makes the request; called with the attempt's timeout in seconds (to pass on
+            as the SDK's `timeout=`), again for every retry or hedge
+        key: If given, concurrent calls with an equal key share one request
+        hedge: False for requests unlike the upstream's usual ones (e.g. bulk embeddings):
+            never duplicated, and kept out of the latencies the hedge delay comes from
+    Returns:
+        What `fn` returned
+    Raises:
+        Overloaded: if no slot was free within the queue limits
+        UpstreamTimeout: if the last attempt timed out or the request deadline passed
+    """
+    policy = policies[upstream]
+
+    def limited() -> T:
+        return _retrying(policy, lambda timeout: _once(policy, fn, timeout, hedge))
+
+    return limited() if key is None else _flight.do((upstream, key), limited, label=upstream)
+
+
+async def acall(upstream: str, factory: Callable[[float], Awaitable[T]], key: Optional[Hashable] = None,
+                hedge: bool = True) -> T:
+    """Async variant of call(): `factory(timeout)` returns the awaitable making the request"""
+    policy = policies[upstream]
+
+    async def limited() -> T:
+        return await _aretrying(policy, lambda timeout: _aonce(policy, factory, timeout, hedge))
+
+    return await (limited() if key is None else _flight.ado((upstream, key), limited, label=upstream))
+
+
+async def _until_deadline(policy: Policy, stream: AsyncIterator[T]) -> AsyncIterator[T]:
+    """The stream's chunks, cut off with UpstreamTimeout once the deadline passed"""
+    end = _deadline.get()
+    if end is None:
+        async for chunk in stream:
+            yield chunk
+        return
+    chunks = stream.__aiter__()
+    while True:
+        try:
+            chunk = await asyncio.wait_for(chunks.__anext__(), end - time.monotonic())
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError:
+            raise UpstreamTimeout(policy.name) from None
+        yield chunk
+
+
+@asynccontextmanager
+async def astream(upstream: str, factory: Callable[[float], Awaitable[AsyncIterator[T]]],
+                  stage: Optional[str] = None) -> AsyncIterator[AsyncIterator[T]]:
+    """
+    Open a streamed response and hold an upstream slot until the block exits. Opening
+    is timed out and retried like acall() but never hedged; the timeout also bounds each
+    wait for the next chunk, and the chunks stop at the deadline. `stage`, if given,
+    times the opening (~time to first token).
+    """
+    policy = policies[upstream]
+    async with aslot(upstream):
+        with span(stage) if stage else nullcontext():
+            stream = await _aretrying(policy, lambda timeout: _aattempt(policy, factory, timeout, sample=False))
+        try:
+            yield _until_deadline(policy, stream)
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                await close()
+
+
+def coalesce(key: Hashable, fn: Callable[[], T], label: str = "pipeline") -> T:
+    """Singleflight without a limiter (for work that makes several upstream calls)"""
+    return _flight.do((label, key), fn, label=label)
+
+
+async def acoalesce(key: Hashable, factory: Callable[[], Awaitable[T]], label: str = "pipeline") -> T:
+    """Async variant of coalesce()"""
+    return await _flight.ado((label, key), factory, label=label)
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    """Limiter counts and call policy per upstream, plus the shared retry budget"""
+    out: Dict[str, Dict[str, Any]] = {}
+    for name, limiter in limiters.items():
+        policy = policies[name]
+        out[name] = {**limiter.stats(), "timeout": policy.timeout, "hedge_delay": policy.hedge_delay()}
+    out["retry_budget"] = {"tokens": round(retry_budget.tokens, 2), "max": retry_budget.maximum}
+    return out
@@ -0,0 +1,392 @@
+"""
+Vector backends behind db.search() and the catalog sync.
+
+  ChromaBackend – the persistent Chroma collection (default)
+  NumpyBackend  – read-mostly alternative: unit-normalized float16/float32 embeddings in a
+                  memory-mapped .npy matrix plus a JSON sidecar (ids, documents,
+                  metadatas); vectorized cosine top-k with argpartition
+
+Select one with VECTOR_BACKEND in config.py. Both return the same hit dicts:
+{"id", "document", "metadata", "score"} where score is the cosine similarity.
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Collection, Dict, List, Optional, Tuple
+
+Hit = Dict[str, Any]
+Rows = Tuple[List[str], List[Optional[str]], List[Dict[str, Any]]]
+
+
+class VectorBackend:
+    """Interface shared by the vector backends"""
+    max_write_batch: Optional[int] = None  # rows per write call (None = unbounded)
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def rows(self) -> Rows:
+        """(ids, documents, metadatas) of every stored row"""
+        raise NotImplementedError
+
+    def export(self) -> Tuple[List[str], List[Optional[str]], List[Dict[str, Any]], Any]:
+        """(ids, documents, metadatas, embeddings) of every stored row, e.g. to publish a snapshot"""
+        raise NotImplementedError
+
+    def upsert(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]],
+               embeddings: List[List[float]]) -> None:
+        raise NotImplementedError
+
+    def update_metadata(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    def delete(self, ids: List[str]) -> None:
+        raise NotImplementedError
+
+    def query(self, query_embeddings: List[List[float]], n_results: int,
+              ids: Optional[Collection[str]] = None) -> List[List[Hit]]:
+        """Top `n_results` hits for each query vector, best first; `ids` restricts the scan"""
+        raise NotImplementedError
+
+    def warmup(self) -> None:
+        """Load the index into memory without calling the embeddings API"""
+
+    def close(self) -> None:
+        pass
+
+
+class ChromaBackend(VectorBackend):
+    def __init__(self, client, collection):
+        self.client = client
+        self.collection = collection
+        self.max_write_batch = client.get_max_batch_size()
+        space = (collection.metadata or {}).get("hnsw:space", "l2")
+        # Chroma returns distances; on unit vectors all three spaces map back to cosine
+        self._to_score = {"cosine": lambda d: 1.0 - d, "ip": lambda d: 1.0 - d}.get(space, lambda d: 1.0 - d / 2.0)
+
+    @classmethod
+    def open(cls, path: str, name: str, api_key: str, embed_model: str) -> "ChromaBackend":
+        """Open the persistent Chroma client and the collection (no syncing)"""
+        import chromadb
+        from chromadb.utils import embedding_functions
+        openai_ef = embedding_functions.OpenAIEmbeddingFunction(api_key=api_key, model_name=embed_model)
+        client = chromadb.PersistentClient(path=path)
+        col = client.get_or_create_collection(name=name, embedding_function=openai_ef)
+        return cls(client, col)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def rows(self) -> Rows:
+        res = self.collection.get(include=["metadatas", "documents"])
+        return res["ids"], res["documents"], res["metadatas"]
+
+    def export(self):
+        ids, documents, metadatas, embeddings = [], [], [], []
+        for offset in range(0, self.count(), self.max_write_batch):
+            res = self.collection.get(include=["metadatas", "documents", "embeddings"],
+                                      limit=self.max_write_batch, offset=offset)
+            ids.extend(res["ids"])
+            documents.extend(res["documents"])
+            metadatas.extend(res["metadatas"])
+            embeddings.extend(res["embeddings"])
+        return ids, documents, metadatas, embeddings
+
+    def upsert(self, ids, documents, metadatas, embeddings) -> None:
+        self.collection.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+
+    def update_metadata(self, ids, metadatas) -> None:
+        # Chroma merges metadata on update: keys the new metadata lacks are removed with None
+        current = self.collection.get(ids=ids, include=["metadatas"])
+        stored = {id_: meta or {} for id_, meta in zip(current["ids"], current["metadatas"])}
+        metadatas = [{**{k: None for k in stored.get(id_, {}) if k not in meta}, **meta}
+                     for id_, meta in zip(ids, metadatas)]
+        self.collection.update(ids=ids, metadatas=metadatas)
+
+    def delete(self, ids) -> None:
+        self.collection.delete(ids=ids)
+
+    def query(self, query_embeddings, n_results, ids=None) -> List[List[Hit]]:
+        where = None
+        if ids is not None:
+            if not ids:
+                return [[] for _ in query_embeddings]
+            # Pre-filter on the book_id metadata; Chroma then scans only the allowed rows
+            where = {"book_id": {"$in": sorted(ids)}} if len(ids) > 1 else {"book_id": next(iter(ids))}
+            n_results = min(n_results, len(ids))
+        res = self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where,
+            include=["documents", "metadatas", "distances"],
+        )
+        out = []
+        for q in range(len(res.get("ids", []))):
+            out.append([
+                {
+                    "id": res["ids"][q][i],
+                    "document": res["documents"][q][i],
+                    "metadata": res["metadatas"][q][i],
+                    "score": self._to_score(res["distances"][q][i]),
+                }
+                for i in range(len(res["ids"][q]))
+            ])
+        return out
+
+    def warmup(self) -> None:
+        # A query with a stored embedding pages the HNSW index in
+        sample = self.collection.peek(limit=1)
+        embeddings = sample.get("embeddings")
+        if embeddings is not None and len(embeddings) > 0:
+            self.collection.query(query_embeddings=[list(embeddings[0])], n_results=1)
+
+    def close(self) -> None:
+        self.client.clear_system_cache()
+
+
+class NumpyBackend(VectorBackend):
+    """
+    Memory-mapped matrix of unit vectors + JSON sidecar in `path`.
+
+    float16 storage halves RAM and disk but every query upcasts the blocks it
+    scores; float32 is scored straight from the mapping.
+
+    Each write produces a new generation (vectors.<gen>.npy + rows.<gen>.json) and
+    then atomically repoints the CURRENT file at it, so files that are mapped are
+    never overwritten in place. Readers work on an immutable
+    (matrix, sidecar) pair and never take a lock.
+
+    With `watch` > 0 the backend also follows generations written by other
+    processes: at most every `watch` seconds it re-reads CURRENT and, when it moved,
+    maps the new generation and calls `on_switch` (see snapshot.py).
+    """
+    POINTER = "CURRENT"
+    BLOCK_ROWS = 65536  # rows scored per block, bounds the float32 working set
+
+    def __init__(self, path: str, dtype: str = "float16", watch: float = 0.0, keep_generations: int = 1,
+                 on_switch: Optional[Callable[[int], None]] = None):
+        import numpy as np
+        self._np = np
+        self.path = Path(path)
+        self.dtype = dtype
+        self.watch = watch
+        self.keep_generations = max(1, keep_generations)
+        self.on_switch = on_switch
+        self._write_lock = threading.Lock()
+        self._checked_at = time.monotonic()
+        self.generation = 0
+        self._state = self._load()
+
+    def _files(self, generation: int) -> Tuple[Path, Path]:
+        return self.path / f"vectors.{generation:06d}.npy", self.path / f"rows.{generation:06d}.json"
+
+    def _current_generation(self) -> int:
+        try:
+            return int((self.path / self.POINTER).read_text().strip())
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _load(self):
+        np = self._np
+        for attempt in range(3):
+            self.generation = self._current_generation()
+            if not self.generation:
+                return None, [], [], [], {}
+            matrix_path, sidecar_path = self._files(self.generation)
+            try:
+                matrix = np.load(matrix_path, mmap_mode="r")
+                side = json.loads(sidecar_path.read_text(encoding="utf-8"))
+                break
+            except FileNotFoundError:
+                # Another process published and cleaned up between reading CURRENT and opening
+                if attempt == 2:
+                    raise
+        ids = side["ids"]
+        return matrix, ids, side["documents"], side["metadatas"], {id_: i for i, id_ in enumerate(ids)}
+
+    def refresh(self) -> bool:
+        """Map the generation CURRENT points at if another process wrote a newer one"""
+        self._checked_at = time.monotonic()
+        if self._current_generation() == self.generation:
+            return False
+        with self._write_lock:
+            if self._current_generation() == self.generation:
+                return False
+            self._state = self._load()
+        if self.on_switch is not None:
+            self.on_switch(self.generation)
+        return True
+
+    def _snapshot(self):
+        """The current (matrix, ids, documents, metadatas, index), refreshed first when watching"""
+        if self.watch and time.monotonic() - self._checked_at >= self.watch:
+            self.refresh()
+        return self._state
+
+    def _write(self, matrix, ids, documents, metadatas) -> None:
+        """Persist a new generation, repoint CURRENT atomically and swap it in (write lock held)"""
+        np = self._np
+        self.path.mkdir(parents=True, exist_ok=True)
+        generation = max(self.generation, self._current_generation()) + 1
+        matrix_path, sidecar_path = self._files(generation)
+        with open(matrix_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(matrix, dtype=self.dtype))
+        sidecar_path.write_text(
+            json.dumps({"ids": ids, "documents": documents, "metadatas": metadatas}, ensure_ascii=False),
+            encoding="utf-8",
+        )
+        tmp_pointer = self.path / f".{self.POINTER}.tmp"
+        tmp_pointer.write_text(f"{generation}\n")
+        os.replace(tmp_pointer, self.path / self.POINTER)
+        self._state = self._load()
+        self._remove_stale(newest=generation)
+
+    def _remove_stale(self, newest: int) -> None:
+        """
+        Best-effort cleanup of generations older than the last `keep_generations`
+        (a file still mapped elsewhere may refuse; on POSIX its mappings stay valid)
+        """
+        oldest_kept = newest - self.keep_generations + 1
+        for p in list(self.path.glob("vectors.*.npy")) + list(self.path.glob("rows.*.json")):
+            try:
+                stale = int(p.name.split(".")[1]) < oldest_kept
+            except ValueError:
+                continue
+            if stale:
+                try:
+                    p.unlink()
+                except OSError:
+                    pass
+
+    def _normalize(self, vectors):
+        np = self._np
+        m = np.asarray(vectors, dtype=np.float32)
+        if m.ndim == 1:
+            m = m[None, :]
+        norms = np.linalg.norm(m, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return m / norms
+
+    def count(self) -> int:
+        return len(self._snapshot()[1])
+
+    def rows(self) -> Rows:
+        _, ids, documents, metadatas, _ = self._snapshot()
+        return list(ids), list(documents), list(metadatas)
+
+    def export(self):
+        matrix, ids, documents, metadatas, _ = self._snapshot()
+        embeddings = self._np.zeros((0, 0), dtype=self._np.float32) if matrix is None else matrix
+        return list(ids), list(documents), list(metadatas), embeddings
+
+    def replace(self, ids, documents, metadatas, embeddings) -> None:
+        """Write all rows as one new generation (nothing of the previous one is kept)"""
+        np = self._np
+        with self._write_lock:
+            if len(ids):
+                data = self._normalize(embeddings)
+            else:
+                # Keep the index's dimension; an empty index also takes any upsert (see below)
+                matrix = self._state[0]
+                data = np.zeros((0, matrix.shape[1] if matrix is not None else 0), dtype=np.float32)
+            self._write(data, list(ids), list(documents), list(metadatas))
+
+    def upsert(self, ids, documents, metadatas, embeddings) -> None:
+        np = self._np
+        new = self._normalize(embeddings)
+        with self._write_lock:
+            matrix, cur_ids, cur_docs, cur_metas, index = self._state
+            dim = new.shape[1]
+            # An index without rows takes the dimension of its first upsert
+            if matrix is not None and len(cur_ids) and matrix.shape[1] != dim:
+                raise ValueError(f"Embedding dimension {dim} does not match the index ({matrix.shape[1]})")
+            old_rows = len(cur_ids)
+            cur_ids, cur_docs, cur_metas, index = list(cur_ids), list(cur_docs), list(cur_metas), dict(index)
+            for id_ in ids:
+                if id_ not in index:
+                    index[id_] = len(cur_ids)
+                    cur_ids.append(id_)
+                    cur_docs.append(None)
+                    cur_metas.append(None)
+            data = np.zeros((len(cur_ids), dim), dtype=np.float32)
+            if old_rows:
+                data[:old_rows] = matrix
+            for row, (id_, doc, meta) in enumerate(zip(ids, documents, metadatas)):
+                i = index[id_]
+                data[i] = new[row]
+                cur_docs[i] = doc
+                cur_metas[i] = meta
+            self._write(data, cur_ids, cur_docs, cur_metas)
+
+    def update_metadata(self, ids, metadatas) -> None:
+        with self._write_lock:
+            matrix, cur_ids, cur_docs, cur_metas, index = self._state
+            cur_metas = list(cur_metas)
+            for id_, meta in zip(ids, metadatas):
+                if id_ in index:
+                    cur_metas[index[id_]] = meta
+            self._write(matrix, cur_ids, cur_docs, cur_metas)
+
+    def delete(self, ids) -> None:
+        np = self._np
+        with self._write_lock:
+            matrix, cur_ids, cur_docs, cur_metas, index = self._state
+            drop = {index[i] for i in ids if i in index}
+            if not drop:
+                return
+            keep = [i for i in range(len(cur_ids)) if i not in drop]
+            self._write(
+                np.asarray(matrix)[keep],
+                [cur_ids[i] for i in keep], [cur_docs[i] for i in keep], [cur_metas[i] for i in keep],
+            )
+
+    def query(self, query_embeddings, n_results, ids=None) -> List[List[Hit]]:
+        np = self._np
+        matrix, row_ids, documents, metadatas, index = self._snapshot()  # one consistent snapshot
+        q = self._normalize(query_embeddings)
+        rows = None
+        if ids is not None:
+            # Pre-filter: gather only the allowed rows and scan that sub-matrix
+            rows = np.array(sorted(index[i] for i in ids if i in index), dtype=np.int64)
+            if matrix is not None and len(rows):
+                matrix = matrix[rows]
+        if matrix is None or len(row_ids) == 0 or (rows is not None and not len(rows)):
+            return [[] for _ in range(q.shape[0])]
+        k = min(n_results, matrix.shape[0])
+        best_scores = np.full((q.shape[0], 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((q.shape[0], 0), dtype=np.int64)
+        # Score the matrix block by block, keeping a running top-k per query
+        for start in range(0, matrix.shape[0], self.BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + self.BLOCK_ROWS], dtype=np.float32)
+            scores = q @ block.T
+            kb = min(k, scores.shape[1])
+            part = np.argpartition(-scores, kb - 1, axis=1)[:, :kb]
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, part, axis=1)], axis=1)
+            best_rows = np.concatenate([best_rows, part + start], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+        if rows is not None:
+            best_rows = rows[best_rows]
+        order = np.argsort(-best_scores, axis=1)
+        out = []
+        for qi in range(q.shape[0]):
+            hits = []
+            for j in order[qi]:
+                r = int(best_rows[qi, j])
+                hits.append({
+                    "id": row_ids[r],
+                    "document": documents[r],
+                    "metadata": metadatas[r],
+                    "score": float(best_scores[qi, j]),
+                })
+            out.append(hits)
+        return out
+
+    def warmup(self) -> None:
+        matrix = self._snapshot()[0]
+        if matrix is not None and matrix.shape[0]:
+            self.query(self._np.asarray(matrix[:1], dtype=self._np.float32), 1)
@@ -0,0 +1 @@
+"""Offline benchmarks for the Smart Librarian backend (stubbed OpenAI clients)."""
@@ -0,0 +1,73 @@
+"""
+Prompt size and latency of both recommendation modes for several top_k values and
+RAG context budgets (CONTEXT_TOKEN_BUDGET / the per-request `context_tokens`).
+
+Uses the stubbed chat client and retrieval of bench_pipeline_modes; the stub charges
+`--per-prompt-token` seconds per prompt token, so a bigger context block shows up as
+latency the way prefill time does on the real API. With --live the configured OpenAI
+client and vector index are used.
+
+    python -m benchmarks.bench_context_budget --top-k 4 8 16 --budgets 0 1500 600 300
+    python -m benchmarks.bench_context_budget --live --runs 3
+"""
+import argparse
+from types import SimpleNamespace
+
+from benchmarks.bench_pipeline_modes import StubChat, _stub_search, run
+from backend import rag, resources
+from backend.catalog import get_catalog
+from backend.context import count_tokens
+from backend.response_cache import ResponseCache
+
+
+def _metered_pack(stats):
+    pack = rag._pack_hits
+
+    def wrapped(hits, num_recs, context_tokens, body=rag.hit_body):
+        packed = pack(hits, num_recs, context_tokens, body)
+        stats["blocks"] += len(packed.hits)
+        stats["context"] += count_tokens(packed.text)
+        stats["calls"] += 1
+        return packed
+    return wrapped
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Prompt size and latency per top_k and context budget.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top-k", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--budgets", type=int, nargs="+", default=[0, 1500, 600, 300],
+                        help="context budgets in tokens (0 = no limit)")
+    parser.add_argument("--num-recs", type=int, default=2)
+    parser.add_argument("--modes", nargs="+", default=["tool", "single"], choices=["tool", "single"])
+    parser.add_argument("--live", action="store_true", help="use the real OpenAI client and vector index")
+    parser.add_argument("--base-latency", type=float, default=0.3, help="stub: seconds per chat call")
+    parser.add_argument("--per-token", type=float, default=0.005, help="stub: seconds per completion token")
+    parser.add_argument("--per-prompt-token", type=float, default=0.0002, help="stub: seconds per prompt token")
+    args = parser.parse_args(argv)
+
+    rag.response_cache = ResponseCache(max_entries=0, ttl=0, similarity=0)
+    if args.live:
+        completions = resources.get_openai_client().chat.completions
+    else:
+        completions = StubChat(args.base_latency, args.per_token, args.per_prompt_token)
+        resources._openai_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        rag.search = _stub_search(get_catalog().as_dicts())
+
+    stats = {"blocks": 0, "context": 0, "calls": 0}
+    rag._pack_hits = _metered_pack(stats)
+
+    print(f"{'mode':<8}{'top_k':>6}{'budget':>8}{'candidates':>12}{'context tok':>13}{'prompt tok':>12}"
+          f"{'mean latency':>14}")
+    for mode in args.modes:
+        for top_k in args.top_k:
+            for budget in args.budgets:
+                stats.update(blocks=0, context=0, calls=0)
+                r = run(mode, args.runs, top_k, args.num_recs, completions, context_tokens=budget)
+                calls = stats["calls"] or 1
+                print(f"{mode:<8}{top_k:>6}{budget or '-':>8}{stats['blocks'] / calls:>12.1f}"
+                      f"{stats['context'] / calls:>13.0f}{r['prompt_tokens']:>12.0f}{r['mean_s']:>13.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Vector-only vs hybrid retrieval (exact-title fast path + BM25/vector fusion).
+
+The embeddings client is stubbed (`--latency` seconds per request, random vectors)
+and the catalog is synced into a NumpyBackend in a temporary directory. Title queries
+("Dune", "Ce este 1984?") skip the embeddings call on the hybrid path; theme queries
+pay the same embeddings call plus a local BM25 lookup and the fusion step.
+
+    python -m benchmarks.bench_hybrid_search --latency 0.15 --runs 20
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from backend import db, embeddings, resources  # noqa: E402
+from backend.catalog import get_catalog  # noqa: E402
+from backend.embeddings import EmbeddingCache  # noqa: E402
+from backend.sync import sync_catalog  # noqa: E402
+from backend.vector_store import NumpyBackend  # noqa: E402
+from benchmarks.bench_search_batch import StubEmbeddings  # noqa: E402
+
+TITLE_QUERIES = ["Dune", "Ce este 1984?", "the hobbit", "Vreau o carte despre Fahrenheit 451", "Les Miserables"]
+THEME_QUERIES = ["o distopie despre control social", "prietenie si magie", "război și vinovăție"]
+
+
+def _measure(stub: StubEmbeddings, queries, runs: int, top_k: int):
+    latencies = []
+    stub.calls = 0
+    for _ in range(runs):
+        for q in queries:
+            embeddings._cache = EmbeddingCache(max_entries=0)  # every query is a cache miss
+            t0 = time.perf_counter()
+            db.search(q, top_k)
+            latencies.append(time.perf_counter() - t0)
+    return statistics.median(latencies) * 1000, stub.calls
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Compare vector-only and hybrid retrieval.")
+    parser.add_argument("--latency", type=float, default=0.15, help="seconds per embeddings request")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--dim", type=int, default=1536)
+    args = parser.parse_args(argv)
+
+    stub = StubEmbeddings(args.dim, 0.0, 0.0)
+    resources._openai_client = SimpleNamespace(embeddings=stub)
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = NumpyBackend(tmp)
+        sync_catalog(backend, get_catalog().as_dicts())
+        db._backend = backend
+        stub.latency = args.latency
+
+        print(f"{'queries':<8}{'mode':<9}{'p50 ms':>9}{'embed calls':>13}")
+        for label, queries in (("title", TITLE_QUERIES), ("theme", THEME_QUERIES)):
+            for hybrid in (False, True):
+                db.HYBRID_SEARCH = hybrid
+                p50, calls = _measure(stub, queries, args.runs, args.top_k)
+                print(f"{label:<8}{'hybrid' if hybrid else 'vector':<9}{p50:>9.2f}{calls:>13}")
+        db._backend = None
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
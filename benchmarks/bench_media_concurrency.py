@@ -0,0 +1,127 @@
+"""
+Serial vs concurrent media generation for /recommend, against stubbed OpenAI clients.
+
+The serial baseline is the previous handler loop (image, then TTS, item after item);
+the concurrent run calls the real async /recommend handler. Each stubbed API call
+sleeps for a fixed latency, so the expected results are ~(2 * n * latency) for the
+serial path and ~latency for the concurrent one.
+
+    python -m benchmarks.bench_media_concurrency --items 5 --latency 0.5
+"""
+import argparse
+import asyncio
+import base64
+import os
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from backend import app as app_module, resources, upstream  # noqa: E402
+from backend.media_store import store  # noqa: E402
+from backend.models import RecommendationRequest  # noqa: E402
+from backend.rag import Recommendations  # noqa: E402
+from backend.tools import generate_book_image, tts_save  # noqa: E402
+
+_PNG = base64.b64encode(b"\x89PNG fake").decode()
+
+
+class _SyncSpeech:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def __enter__(self):
+        time.sleep(self.latency)
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def stream_to_file(self, path):
+        Path(path).write_bytes(b"RIFF fake")
+
+
+class _AsyncSpeech(_SyncSpeech):
+    async def __aenter__(self):
+        await asyncio.sleep(self.latency)
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def stream_to_file(self, path):
+        Path(path).write_bytes(b"RIFF fake")
+
+
+def stub_clients(latency: float) -> None:
+    """Install stubbed sync/async OpenAI clients whose media calls sleep for `latency` seconds"""
+    image_result = SimpleNamespace(data=[SimpleNamespace(b64_json=_PNG)])
+
+    def images_generate(**_):
+        time.sleep(latency)
+        return image_result
+
+    async def aimages_generate(**_):
+        await asyncio.sleep(latency)
+        return image_result
+
+    resources._openai_client = SimpleNamespace(
+        images=SimpleNamespace(generate=images_generate),
+        audio=SimpleNamespace(speech=SimpleNamespace(with_streaming_response=SimpleNamespace(
+            create=lambda **_: _SyncSpeech(latency)))),
+    )
+    resources._async_openai_client = SimpleNamespace(
+        images=SimpleNamespace(generate=aimages_generate),
+        audio=SimpleNamespace(speech=SimpleNamespace(with_streaming_response=SimpleNamespace(
+            create=lambda **_: _AsyncSpeech(latency)))),
+    )
+
+
+def run(items: int, latency: float) -> None:
+    stub_clients(latency)
+    recs = Recommendations((f"Book {i}", "rationale", "summary") for i in range(items))
+
+    async def fake_pipeline(**_):
+        return recs
+
+    app_module.arun_recommendation_pipeline_multi = fake_pipeline
+    req = RecommendationRequest(query="q", num_recommendations=items, generate_image=True, tts=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Separate media stores so the second run cannot hit files from the first
+        store.root = Path(tmp) / "serial"
+        t0 = time.perf_counter()
+        for title, rationale, detailed in recs:
+            generate_book_image(title, "")
+            tts_save(f"Recomandarea mea: {title}. Pe scurt: {rationale}. Rezumat: {detailed}")
+        serial = time.perf_counter() - t0
+
+        store.root = Path(tmp) / "concurrent"
+        t0 = time.perf_counter()
+        asyncio.run(app_module.recommend(req))
+        concurrent = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        asyncio.run(app_module.recommend(req))
+        cached = time.perf_counter() - t0
+
+    print(f"items={items} calls={2 * items} latency/call={latency:.3f}s")
+    print(f"serial:     {serial:.3f}s")
+    caps = ", ".join(f"{name}={upstream.limiters[name].concurrency}" for name in ("image", "speech"))
+    print(f"concurrent: {concurrent:.3f}s  (caps: {caps})")
+    print(f"speedup:    {serial / concurrent:.1f}x")
+    print(f"repeat (media store hits): {cached:.3f}s")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per stubbed API call")
+    args = parser.parse_args(argv)
+    run(args.items, args.latency)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Moderation cost per query with a large lexicon.
+
+Builds a synthetic lexicon of `--terms` Romanian-looking words (a third of them
+prefix terms "word*"), compiles it into the automaton and times `check()` on clean
+and on offending queries. The previous token-set check (contains_bad_language before
+the automaton) is timed on the same queries for reference; it only matched exact,
+punctuation-stripped, lowercased tokens.
+
+    python -m benchmarks.bench_moderation --terms 50000 --runs 20000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from backend.moderation import Moderator  # noqa: E402
+
+SYLLABLES = ["ba", "că", "di", "fe", "gu", "hi", "je", "lo", "mă", "ni", "po", "ră", "si", "ță", "ul", "vi", "ze", "șa"]
+QUERIES = [
+    "Vreau o carte despre prietenie și magie",
+    "O distopie cu teme puternice despre libertate și control social",
+    "Caut ceva scurt de citit în vacanță, poate o poveste de război",
+]
+
+
+def synthetic_terms(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    terms = set()
+    while len(terms) < n:
+        word = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(3, 6)))
+        terms.add(word + "*" if rng.random() < 0.33 else word)
+    return sorted(terms)
+
+
+def _old_check(text: str, bad_words) -> bool:
+    words = {w.strip(".,!?").lower() for w in text.split()}
+    return any(bad in words for bad in bad_words)
+
+
+def _per_call_us(fn, queries, runs: int) -> float:
+    t0 = time.perf_counter()
+    for i in range(runs):
+        fn(queries[i % len(queries)])
+    return (time.perf_counter() - t0) / runs * 1e6
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Time the moderation automaton with a large lexicon.")
+    parser.add_argument("--terms", type=int, default=50_000)
+    parser.add_argument("--runs", type=int, default=20_000)
+    args = parser.parse_args(argv)
+
+    terms = synthetic_terms(args.terms)
+    offending = [f"{q}, {terms[i * 97 % len(terms)].rstrip('*').upper()}!" for i, q in enumerate(QUERIES)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "lexicon.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(terms))
+        moderator = Moderator(path, reload_interval=3600)
+        t0 = time.perf_counter()
+        automaton = moderator.reload()
+        compile_s = time.perf_counter() - t0
+
+        assert not any(moderator.check(q).blocked for q in QUERIES)
+        assert all(moderator.check(q).blocked for q in offending)
+
+        bad_words = {t.rstrip("*") for t in terms}
+        print(f"lexicon: {len(terms)} terms, {len(automaton)} states, compiled in {compile_s:.2f} s")
+        print(f"{'queries':<10}{'automaton us':>14}{'token set us':>14}")
+        for label, queries in (("clean", QUERIES), ("offending", offending)):
+            new = _per_call_us(moderator.check, queries, args.runs)
+            old = _per_call_us(lambda q: _old_check(q, bad_words), queries, args.runs)
+            print(f"{label:<10}{new:>14.1f}{old:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Latency and token usage of the two recommendation modes:
+  tool   – function calling + JSON finalize (two chat completions)
+  single – one structured-output completion with the candidates' summaries attached
+
+By default the chat client and the retrieval step are stubbed: the stub charges
+~4 characters per token for the prompt it receives and sleeps `base + per_token *
+completion_tokens`, so the comparison reflects what each mode sends. With --live the
+configured OpenAI client and vector index are used and usage comes from the API.
+
+    python -m benchmarks.bench_pipeline_modes --runs 5 --top-k 6 --num-recs 2
+    python -m benchmarks.bench_pipeline_modes --live
+"""
+import argparse
+import ast
+import json
+import os
+import re
+import statistics
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from backend import rag, resources  # noqa: E402
+from backend.catalog import get_catalog  # noqa: E402
+from backend.response_cache import ResponseCache  # noqa: E402
+from backend.sync import book_document  # noqa: E402
+
+QUERIES = [
+    "O carte cu prietenie si magie",
+    "Caut o distopie cu teme puternice",
+    "Vreau o carte despre libertate și control social.",
+]
+
+
+def _tokens(obj) -> int:
+    return max(1, len(json.dumps(obj, ensure_ascii=False, default=str)) // 4)
+
+
+class StubChat:
+    """Scripted chat completions for both modes (tool calls, JSON finalize, structured output)"""
+
+    def __init__(self, base: float, per_token: float, per_prompt_token: float = 0.0):
+        self.base = base
+        self.per_token = per_token
+        self.per_prompt_token = per_prompt_token
+
+    def create(self, model, messages, tools=None, response_format=None, **_):
+        user = next(m["content"] for m in messages if isinstance(m, dict) and m.get("role") == "user")
+        n = int(re.search(r"EXACT (\d+)", user).group(1))
+        if response_format is not None:
+            titles = response_format["json_schema"]["schema"]["properties"]["items"]["items"]["properties"]["title"]["enum"]
+            content = json.dumps({"items": [{"title": t, "rationale": "Se potrivește temelor cerute."} for t in titles[:n]]})
+            message = SimpleNamespace(content=content, tool_calls=None)
+        elif tools:
+            titles = ast.literal_eval(re.search(r"Titluri eligibile: (\[.*?\])\n", user).group(1))
+            calls = [SimpleNamespace(id=f"call_{i}", type="function", function=SimpleNamespace(
+                name="get_summary_by_title", arguments=json.dumps({"title": t}))) for i, t in enumerate(titles[:n])]
+            message = SimpleNamespace(content=None, tool_calls=calls)
+        else:
+            tool_msgs = [m for m in messages if isinstance(m, dict) and m.get("role") == "tool"]
+            picked = [json.loads(c.function.arguments)["title"]
+                      for m in messages if isinstance(m, dict) and m.get("tool_calls") for c in m["tool_calls"]]
+            content = json.dumps([{"title": t, "rationale": "Se potrivește temelor cerute.", "detailed_summary": m["content"]}
+                                  for t, m in zip(picked, tool_msgs)], ensure_ascii=False)
+            message = SimpleNamespace(content=content, tool_calls=None)
+        completion = _tokens(message.content or [c.function.arguments for c in message.tool_calls])
+        prompt = _tokens(messages)
+        time.sleep(self.base + self.per_prompt_token * prompt + self.per_token * completion)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=message)],
+            usage=SimpleNamespace(prompt_tokens=prompt, completion_tokens=completion),
+        )
+
+
+def _stub_search(books):
+    def search(query, top_k=4, include_themes=None, exclude_themes=None):
+        start = sum(map(ord, query)) % len(books)
+        picked = (books[start:] + books[:start])[:top_k]
+        return [{"id": b["id"], "document": book_document(b),
+                 "metadata": {"title": b["title"], "themes": ", ".join(b.get("themes", []))},
+                 "score": 0.6 - 0.02 * i} for i, b in enumerate(picked)]
+    return search
+
+
+def _metered(create, usage):
+    def wrapped(**kwargs):
+        resp = create(**kwargs)
+        usage["calls"] += 1
+        usage["prompt"] += resp.usage.prompt_tokens
+        usage["completion"] += resp.usage.completion_tokens
+        return resp
+    return wrapped
+
+
+def run(mode: str, runs: int, top_k: int, num_recs: int, completions, context_tokens=None) -> dict:
+    usage = {"calls": 0, "prompt": 0, "completion": 0}
+    original = completions.create
+    completions.create = _metered(original, usage)
+    latencies = []
+    try:
+        for i in range(runs):
+            query = QUERIES[i % len(QUERIES)]
+            t0 = time.perf_counter()
+            rag.run_recommendation_pipeline_multi(query, top_k=top_k, num_recs=num_recs, mode=mode,
+                                                  context_tokens=context_tokens)
+            latencies.append(time.perf_counter() - t0)
+    finally:
+        completions.create = original
+    return {
+        "mode": mode,
+        "mean_s": statistics.mean(latencies),
+        "calls": usage["calls"] / runs,
+        "prompt_tokens": usage["prompt"] / runs,
+        "completion_tokens": usage["completion"] / runs,
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Compare the tool and single recommendation modes.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top-k", type=int, default=6)
+    parser.add_argument("--num-recs", type=int, default=2)
+    parser.add_argument("--live", action="store_true", help="use the real OpenAI client and vector index")
+    parser.add_argument("--base-latency", type=float, default=0.4, help="stub: seconds per chat call")
+    parser.add_argument("--per-token", type=float, default=0.01, help="stub: seconds per completion token")
+    parser.add_argument("--per-prompt-token", type=float, default=0.0, help="stub: seconds per prompt token")
+    args = parser.parse_args(argv)
+
+    # Every run must reach the model: disable the response cache
+    rag.response_cache = ResponseCache(max_entries=0, ttl=0, similarity=0)
+    if args.live:
+        completions = resources.get_openai_client().chat.completions
+    else:
+        completions = StubChat(args.base_latency, args.per_token, args.per_prompt_token)
+        resources._openai_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        rag.search = _stub_search(get_catalog().as_dicts())
+
+    print(f"{'mode':<8}{'mean latency':>14}{'chat calls':>12}{'prompt tok':>12}{'completion tok':>16}")
+    for mode in ("tool", "single"):
+        r = run(mode, args.runs, args.top_k, args.num_recs, completions)
+        print(f"{r['mode']:<8}{r['mean_s']:>13.3f}s{r['calls']:>12.1f}{r['prompt_tokens']:>12.0f}{r['completion_tokens']:>16.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Per-query /rag/search calls vs one /rag/search/batch call.
+
+The embeddings client is stubbed: every request sleeps `latency + per_input * inputs`
+(a round trip plus a small per-text cost) and returns random vectors. Retrieval runs
+against a real NumpyBackend filled with `--rows` random vectors in a temporary
+directory. The query-embedding cache is emptied before each run so both paths
+embed every query.
+
+    python -m benchmarks.bench_search_batch --queries 200 --latency 0.15
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+import numpy as np  # noqa: E402
+
+from backend import db, embeddings, resources  # noqa: E402
+from backend.embeddings import EmbeddingCache  # noqa: E402
+from backend.vector_store import NumpyBackend  # noqa: E402
+
+
+class StubEmbeddings:
+    def __init__(self, dim: int, latency: float, per_input: float):
+        self.dim = dim
+        self.latency = latency
+        self.per_input = per_input
+        self.calls = 0
+        self._rng = np.random.default_rng(0)
+
+    def create(self, model, input, **_):
+        self.calls += 1
+        time.sleep(self.latency + self.per_input * len(input))
+        vectors = self._rng.standard_normal((len(input), self.dim)).astype(np.float32)
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=v.tolist()) for i, v in enumerate(vectors)],
+                               usage=None)
+
+
+def _run(label: str, stub: StubEmbeddings, fn) -> float:
+    embeddings._cache = EmbeddingCache(max_entries=0)
+    stub.calls = 0
+    t0 = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - t0
+    print(f"{label:<12}{elapsed:>9.2f} s{stub.calls:>8} embedding calls")
+    return elapsed
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Compare per-query search with batch search.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--latency", type=float, default=0.15, help="seconds per embeddings request")
+    parser.add_argument("--per-input", type=float, default=0.0005, help="extra seconds per embedded text")
+    args = parser.parse_args(argv)
+
+    stub = StubEmbeddings(args.dim, args.latency, args.per_input)
+    resources._openai_client = SimpleNamespace(embeddings=stub)
+    queries = [f"carte despre tema {i}" for i in range(args.queries)]
+    top_ks = [random.Random(i).randint(1, 8) for i in range(args.queries)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = NumpyBackend(tmp)
+        rng = np.random.default_rng(1)
+        ids = [f"b{i}" for i in range(args.rows)]
+        backend.upsert(ids, ids, [{"title": i} for i in ids],
+                       rng.standard_normal((args.rows, args.dim)).astype(np.float32))
+        db._backend = backend
+
+        serial = _run("per-query", stub, lambda: [db.search(q, k) for q, k in zip(queries, top_ks)])
+        batched = _run("batch", stub, lambda: db.search_batch(queries, top_ks))
+        print(f"speedup     {serial / batched:>9.1f}x for {args.queries} queries")
+        db._backend = None
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Cold-start cost of the backend, checked against targets:
+
+  import      `import backend.app` in a fresh interpreter (no OPENAI_API_KEY needed),
+              plus which heavy packages that import pulled in
+  ready       spawning uvicorn until /health answers, against the local fake OpenAI
+              server; measured twice: with an empty index directory (initial sync)
+              and again with the index on disk (a container with a baked index)
+  first       latency of the first /rag/search and /recommend on the warm-index
+              process, next to the second (already warm) request
+
+Exits with status 1 when a measurement misses its target, so it can gate CI.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --max-import-ms 600 --max-ready-ms 3000 --max-first-request-ms 1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.fake_openai import FakeOpenAI, parse_latency
+from benchmarks.load import ROOT, _free_port, _start_backend
+
+HEAVY = ("openai", "chromadb", "numpy", "tiktoken", "pyttsx3")
+
+_IMPORT_PROBE = (
+    "import json, sys, time\n"
+    "t0 = time.perf_counter()\n"
+    "import backend.app\n"
+    "elapsed = time.perf_counter() - t0\n"
+    f"print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {HEAVY!r} if m in sys.modules]}}))\n"
+)
+
+
+def measure_import(runs: int) -> dict:
+    env = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}
+    samples, loaded = [], []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", _IMPORT_PROBE], cwd=ROOT, env=env,
+                             capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        samples.append(result["seconds"])
+        loaded = result["loaded"]
+    return {"ms": statistics.median(samples) * 1000, "loaded": loaded}
+
+
+def _timed(client: httpx.Client, method: str, path: str, **kwargs) -> float:
+    t0 = time.perf_counter()
+    resp = client.request(method, path, **kwargs)
+    resp.raise_for_status()
+    return (time.perf_counter() - t0) * 1000
+
+
+def measure_server(args) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp, \
+            FakeOpenAI(latency=parse_latency(args.latency), jitter=0.0, dim=args.dim) as fake:
+        env = dict(os.environ)
+        env.update({
+            "OPENAI_API_KEY": "benchmark",
+            "OPENAI_BASE_URL": fake.base_url,
+            "VECTOR_BACKEND": args.vector_backend,
+            "NUMPY_INDEX_DIR": os.path.join(tmp, "vector_index"),
+            "CHROMA_DIR": os.path.join(tmp, "chroma_db"),
+            "MEDIA_DIR": os.path.join(tmp, "generated"),
+            "RESPONSE_CACHE_SIZE": "0",
+        })
+        env.pop("EMBED_CACHE_PATH", None)
+
+        for label in ("ready_empty_index", "ready_warm_index"):
+            port = _free_port()
+            t0 = time.perf_counter()
+            backend = _start_backend(port, env, args.startup_timeout)
+            results[label] = (time.perf_counter() - t0) * 1000
+            if label == "ready_empty_index":
+                backend.terminate()
+                backend.wait(timeout=30)
+                continue
+            try:
+                body = {"query": "o carte despre libertate", "num_recommendations": 1, "mode": "single"}
+                with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=60.0) as client:
+                    results["first_search"] = _timed(client, "GET", "/rag/search", params={"query": "prietenie și magie"})
+                    results["second_search"] = _timed(client, "GET", "/rag/search", params={"query": "război și pace"})
+                    results["first_recommend"] = _timed(client, "POST", "/recommend", json=body)
+                    body["query"] = "aventură și curaj"
+                    results["second_recommend"] = _timed(client, "POST", "/recommend", json=body)
+            finally:
+                backend.terminate()
+                backend.wait(timeout=30)
+    return results
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Measure backend import time and first-request latency.")
+    parser.add_argument("--import-runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=800.0)
+    parser.add_argument("--max-ready-ms", type=float, default=5000.0, help="target for the warm-index start")
+    parser.add_argument("--max-first-request-ms", type=float, default=2000.0, help="target for the first /recommend")
+    parser.add_argument("--latency", nargs="*", default=["chat=0.3", "embeddings=0.02"], metavar="ENDPOINT=SECONDS")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--vector-backend", default="numpy", choices=["numpy", "chroma"])
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    args = parser.parse_args(argv)
+
+    imp = measure_import(args.import_runs)
+    srv = measure_server(args)
+    rows = [
+        ("import backend.app", imp["ms"], args.max_import_ms),
+        ("ready (empty index)", srv["ready_empty_index"], None),
+        ("ready (index on disk)", srv["ready_warm_index"], args.max_ready_ms),
+        ("first /rag/search", srv["first_search"], None),
+        ("second /rag/search", srv["second_search"], None),
+        ("first /recommend", srv["first_recommend"], args.max_first_request_ms),
+        ("second /recommend", srv["second_recommend"], None),
+    ]
+    print(f"heavy packages loaded by the import: {', '.join(imp['loaded']) or 'none'}")
+    print(f"{'measurement':<24}{'ms':>10}{'target':>10}")
+    failed = False
+    for name, ms, target in rows:
+        verdict = ""
+        if target is not None:
+            ok = ms <= target
+            failed |= not ok
+            verdict = f"{target:>10.0f}  {'ok' if ok else 'MISSED'}"
+        print(f"{name:<24}{ms:>10.1f}{verdict}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
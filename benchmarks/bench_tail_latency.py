@@ -0,0 +1,75 @@
+"""
+Query-embedding latency with and without hedged requests.
+
+The embeddings client is stubbed with a heavy tail: most requests take `--latency`
+seconds, a `--slow-share` of them take `--slow` seconds (a stuck connection, a
+cold replica). Every query misses the embedding cache, so each one makes an
+upstream call through upstream.call(). With hedging on, a request still running
+after the recent p95 latency gets a duplicate and the first answer wins; the
+extra calls are bounded by the retry budget.
+
+    python -m benchmarks.bench_tail_latency --queries 400 --slow-share 0.03
+"""
+import argparse
+import os
+import random
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from backend import embeddings, resources, upstream  # noqa: E402
+from backend.embeddings import EmbeddingCache  # noqa: E402
+
+
+class StubEmbeddings:
+    def __init__(self, latency: float, slow: float, slow_share: float, dim: int = 64):
+        self.latency = latency
+        self.slow = slow
+        self.slow_share = slow_share
+        self.dim = dim
+        self.calls = 0
+        self._rng = random.Random(0)
+
+    def create(self, model, input, timeout=None, **_):
+        self.calls += 1
+        slow = self._rng.random() < self.slow_share
+        time.sleep(min(self.slow if slow else self.latency * self._rng.uniform(0.8, 1.2), timeout or 1e9))
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[1.0] * self.dim) for i in range(len(input))],
+                               usage=None)
+
+
+def _run(label: str, stub: StubEmbeddings, queries, hedge: bool) -> None:
+    upstream.policies["embeddings"] = upstream.Policy("embeddings", upstream.policies["embeddings"].timeout, hedge=hedge)
+    embeddings._cache = EmbeddingCache(max_entries=0)
+    stub.calls = 0
+    latencies = []
+    for q in queries:
+        t0 = time.perf_counter()
+        embeddings.embed_query(q)
+        latencies.append(time.perf_counter() - t0)
+    latencies.sort()
+    pick = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+    extra = (stub.calls - len(queries)) / len(queries)
+    print(f"{label:<10}{pick(0.5):>9.1f}{pick(0.95):>9.1f}{pick(0.99):>9.1f}{latencies[-1] * 1000:>9.1f}{extra:>10.1%}")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Compare query-embedding tail latency with and without hedging.")
+    parser.add_argument("--queries", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per typical embeddings request")
+    parser.add_argument("--slow", type=float, default=1.0, help="seconds per slow embeddings request")
+    parser.add_argument("--slow-share", type=float, default=0.03, help="share of slow requests")
+    args = parser.parse_args(argv)
+
+    stub = StubEmbeddings(args.latency, args.slow, args.slow_share)
+    resources._openai_client = SimpleNamespace(embeddings=stub)
+    queries = [f"carte despre tema {i}" for i in range(args.queries)]
+
+    print(f"{'mode':<10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'extra':>10}")
+    _run("plain", stub, queries, hedge=False)
+    _run("hedged", stub, queries, hedge=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Overload behaviour of the per-upstream limiters, against the local fake OpenAI server.
+
+Starts the backend with a small image limit and floods /image with distinct titles:
+requests beyond the slots and the wait queue are answered 503 right away, while
+/health stays fast. Then sends identical /image and /recommend requests concurrently
+and reports how many upstream calls they cost (1 each when coalesced).
+
+    python -m benchmarks.bench_upstream_limits --image-concurrency 2 --queue-size 2 --flood 16
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from collections import Counter
+
+import httpx
+
+from benchmarks.fake_openai import FakeOpenAI
+from benchmarks.load import _free_port, _start_backend
+
+
+async def _scenario(base_url: str, fake: FakeOpenAI, args) -> None:
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0) as client:
+        async def health() -> float:
+            await asyncio.sleep(args.image_latency / 2)
+            t0 = time.perf_counter()
+            (await client.get("/health")).raise_for_status()
+            return (time.perf_counter() - t0) * 1000
+
+        t0 = time.perf_counter()
+        *flood, health_ms = await asyncio.gather(
+            *(client.post("/image", json={"title": f"Book {i}"}) for i in range(args.flood)), health())
+        elapsed = time.perf_counter() - t0
+        codes = Counter(r.status_code for r in flood)
+        retry_after = {r.headers.get("retry-after") for r in flood if r.status_code == 503}
+        print(f"flood: {args.flood} distinct /image in {elapsed:.2f}s -> "
+              + ", ".join(f"{code}: {n}" for code, n in sorted(codes.items()))
+              + (f" (Retry-After {', '.join(sorted(retry_after))})" if retry_after else ""))
+        print(f"/health during the flood: {health_ms:.1f} ms")
+
+        before = fake.calls["images"]
+        same = await asyncio.gather(*(client.post("/image", json={"title": "Same book"}) for _ in range(args.same)))
+        print(f"{args.same} identical /image: {[r.status_code for r in same].count(200)} ok, "
+              f"{fake.calls['images'] - before} upstream image call(s)")
+
+        before = fake.calls["chat"]
+        body = {"query": "o carte despre prietenie", "mode": "single"}
+        same = await asyncio.gather(*(client.post("/recommend", json=body) for _ in range(args.same)))
+        print(f"{args.same} identical /recommend: {[r.status_code for r in same].count(200)} ok, "
+              f"{fake.calls['chat'] - before} upstream chat call(s)")
+
+        print("limiters:", (await client.get("/cache/stats")).json()["upstreams"])
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Overload and coalescing behaviour of the upstream limiters.")
+    parser.add_argument("--image-concurrency", type=int, default=2)
+    parser.add_argument("--queue-size", type=int, default=2)
+    parser.add_argument("--queue-timeout", type=float, default=1.0)
+    parser.add_argument("--image-latency", type=float, default=1.0, help="seconds per fake image render")
+    parser.add_argument("--flood", type=int, default=16, help="concurrent /image requests with distinct titles")
+    parser.add_argument("--same", type=int, default=8, help="concurrent identical requests")
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            FakeOpenAI(latency={"images": args.image_latency, "chat": 0.2, "embeddings": 0.02},
+                       jitter=0.0, dim=64) as fake:
+        env = dict(os.environ)
+        env.update({
+            "OPENAI_API_KEY": "benchmark",
+            "OPENAI_BASE_URL": fake.base_url,
+            "VECTOR_BACKEND": "numpy",
+            "NUMPY_INDEX_DIR": os.path.join(tmp, "vector_index"),
+            "MEDIA_DIR": os.path.join(tmp, "generated"),
+            "RESPONSE_CACHE_SIZE": "0",
+            "IMAGE_CONCURRENCY": str(args.image_concurrency),
+            "UPSTREAM_QUEUE_SIZE": str(args.queue_size),
+            "UPSTREAM_QUEUE_TIMEOUT": str(args.queue_timeout),
+        })
+        env.pop("EMBED_CACHE_PATH", None)
+        port = _free_port()
+        backend = _start_backend(port, env, args.startup_timeout)
+        try:
+            asyncio.run(_scenario(f"http://127.0.0.1:{port}", fake, args))
+        finally:
+            backend.terminate()
+            backend.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Chroma vs the memory-mapped NumPy backend at several catalog sizes.
+
+For every (backend, size) a child process builds an index of random unit vectors,
+and a second, fresh child process opens it and measures what serving costs:
+open time, single-query latency (p50/p95), per-query latency of a 16-query batch,
+p50 of queries pre-filtered to a random `--filter-fraction` of the rows (the theme
+filters), and resident memory (RSS). Each run uses its own temporary directory.
+
+    python -m benchmarks.bench_vector_backends --sizes 10000 100000 1000000 --dim 1536
+    python -m benchmarks.bench_vector_backends --backends numpy-float16 --sizes 1000000 --dim 256
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+BUILD_BATCH = 5000
+
+
+def _rss_mb() -> float:
+    """Current resident set size (Linux /proc), falling back to the peak from getrusage"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+def _open(backend: str, path: str):
+    from backend.vector_store import ChromaBackend, NumpyBackend
+    if backend.startswith("numpy"):
+        return NumpyBackend(path, dtype=backend.partition("-")[2] or "float16")
+    return ChromaBackend.open(path, "bench", api_key="benchmark", embed_model="text-embedding-3-small")
+
+
+def _vectors(rng, n: int, dim: int):
+    import numpy as np
+    v = rng.standard_normal((n, dim)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def child_build(backend: str, path: str, size: int, dim: int) -> dict:
+    import numpy as np
+    rng = np.random.default_rng(0)
+    store = _open(backend, path)
+    t0 = time.perf_counter()
+    if backend.startswith("numpy"):
+        # One write: the numpy backend rewrites its files on every call
+        ids = [f"b{i}" for i in range(size)]
+        store.upsert(ids, [f"doc {i}" for i in ids], [{"title": i, "book_id": i} for i in ids], _vectors(rng, size, dim))
+    else:
+        for start in range(0, size, BUILD_BATCH):
+            n = min(BUILD_BATCH, size - start)
+            ids = [f"b{i}" for i in range(start, start + n)]
+            store.upsert(ids, [f"doc {i}" for i in ids], [{"title": i, "book_id": i} for i in ids], _vectors(rng, n, dim).tolist())
+    build = time.perf_counter() - t0
+    store.close()
+    return {"build_s": build}
+
+
+def child_query(backend: str, path: str, dim: int, queries: int, top_k: int, size: int, fraction: float) -> dict:
+    import numpy as np
+    rng = np.random.default_rng(1)
+    base_rss = _rss_mb()
+    t0 = time.perf_counter()
+    store = _open(backend, path)
+    store.warmup()
+    open_s = time.perf_counter() - t0
+    qs = _vectors(rng, queries, dim)
+    single = []
+    for q in qs:
+        t = time.perf_counter()
+        store.query([q.tolist()], top_k)
+        single.append(time.perf_counter() - t)
+    batch = qs[:16].tolist()
+    t = time.perf_counter()
+    store.query(batch, top_k)
+    batched = (time.perf_counter() - t) / len(batch)
+    # Theme-filter style pre-filtering: only `fraction` of the rows are candidates
+    allowed = {f"b{i}" for i in rng.choice(size, max(1, int(size * fraction)), replace=False)}
+    filtered = []
+    for q in qs:
+        t = time.perf_counter()
+        store.query([q.tolist()], top_k, ids=allowed)
+        filtered.append(time.perf_counter() - t)
+    single.sort()
+    return {
+        "open_s": open_s,
+        "p50_ms": statistics.median(single) * 1000,
+        "p95_ms": single[int(0.95 * (len(single) - 1))] * 1000,
+        "batch16_per_query_ms": batched * 1000,
+        "filtered_p50_ms": statistics.median(filtered) * 1000,
+        "rss_mb": _rss_mb() - base_rss,
+    }
+
+
+def _run_child(*args) -> dict:
+    out = subprocess.run([sys.executable, "-m", "benchmarks.bench_vector_backends", "--child", *map(str, args)],
+                         check=True, capture_output=True, text=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Compare the chroma and numpy vector backends.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--backends", nargs="+", default=["chroma", "numpy-float16", "numpy-float32"],
+                        choices=["chroma", "numpy-float16", "numpy-float32"])
+    parser.add_argument("--dim", type=int, default=1536, help="embedding size (text-embedding-3-small: 1536)")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--filter-fraction", type=float, default=0.05,
+                        help="share of rows allowed by the filtered queries (theme pre-filter)")
+    parser.add_argument("--child", nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        mode, backend, path, *rest = args.child
+        if mode == "build":
+            result = child_build(backend, path, int(rest[0]), int(rest[1]))
+        else:
+            result = child_query(backend, path, int(rest[0]), int(rest[1]), int(rest[2]), int(rest[3]), float(rest[4]))
+        print(json.dumps(result))
+        return
+
+    print(f"{'backend':<15}{'rows':>10}{'build s':>10}{'open s':>9}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'batch/q ms':>12}{'filt p50':>10}{'RSS MB':>9}")
+    for size in args.sizes:
+        for backend in args.backends:
+            with tempfile.TemporaryDirectory() as tmp:
+                built = _run_child("build", backend, tmp, size, args.dim)
+                q = _run_child("query", backend, tmp, args.dim, args.queries, args.top_k, size, args.filter_fraction)
+            print(f"{backend:<15}{size:>10}{built['build_s']:>10.1f}{q['open_s']:>9.2f}{q['p50_ms']:>9.2f}"
+                  f"{q['p95_ms']:>9.2f}{q['batch16_per_query_ms']:>12.2f}{q['filtered_p50_ms']:>10.2f}{q['rss_mb']:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""
+Local stand-in for the OpenAI HTTP API, for offline benchmarks.
+
+Serves the endpoints the backend uses, under /v1:
+  POST /embeddings            deterministic hashed bag-of-words vectors (similar
+                              texts get similar vectors, so retrieval and the
+                              semantic caches behave plausibly)
+  POST /chat/completions      scripted answers: tool calls for the first N eligible
+                              titles, the JSON finalize array built from the tool
+                              results, or structured output from the title enum;
+                              "stream": true is answered with SSE chunks
+  POST /images/generations    a tiny fake PNG (b64_json)
+  POST /audio/speech          fake mp3 bytes
+
+Each endpoint sleeps for its configured latency (± jitter) before answering, and can
+answer a share of its requests with 429 rate-limit errors (`error_rate`).
+Point the backend at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+    python -m benchmarks.fake_openai --port 8765 --latency chat=0.6 embeddings=0.05 --error-rate images=0.2
+"""
+import argparse
+import ast
+import base64
+import hashlib
+import json
+import random
+import re
+import struct
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+DEFAULT_LATENCY = {"embeddings": 0.05, "chat": 0.6, "images": 2.0, "speech": 1.0}
+
+_PNG = base64.b64encode(b"\x89PNG\r\n\x1a\n" + b"\x00" * 64).decode()
+_MP3 = b"ID3\x03\x00\x00\x00\x00\x00\x00" + b"\xff\xfb\x90\x00" * 256
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def parse_latency(items: List[str]) -> Dict[str, float]:
+    """["chat=0.5", "images=1"] -> latency table (defaults for the rest)"""
+    latency = dict(DEFAULT_LATENCY)
+    for item in items or ():
+        kind, _, seconds = item.partition("=")
+        if kind not in latency:
+            raise ValueError(f"unknown endpoint {kind!r} (expected one of {sorted(latency)})")
+        latency[kind] = float(seconds)
+    return latency
+
+
+def parse_error_rate(items: List[str]) -> Dict[str, float]:
+    """["images=0.2"] -> share of requests answered with 429, per endpoint"""
+    rates = {}
+    for item in items or ():
+        kind, _, rate = item.partition("=")
+        if kind not in DEFAULT_LATENCY:
+            raise ValueError(f"unknown endpoint {kind!r} (expected one of {sorted(DEFAULT_LATENCY)})")
+        rates[kind] = float(rate)
+    return rates
+
+
+def fake_embedding(text: str, dim: int) -> List[float]:
+    """Feature-hashed bag of words, unit-normalized"""
+    vec = [0.0] * dim
+    for word in _WORD.findall(text.casefold()) or [""]:
+        h = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+        vec[h % dim] += 1.0 if (h >> 32) & 1 else -1.0
+    norm = sum(v * v for v in vec) ** 0.5 or 1.0
+    return [v / norm for v in vec]
+
+
+def _tokens(obj: Any) -> int:
+    return max(1, len(json.dumps(obj, ensure_ascii=False)) // 4)
+
+
+def _user_text(messages: List[Dict[str, Any]]) -> str:
+    return next((m.get("content") or "" for m in messages if m.get("role") == "user"), "")
+
+
+def _count(user: str) -> int:
+    match = re.search(r"EXACT (\d+)", user)
+    return int(match.group(1)) if match else 1
+
+
+def scripted_chat(body: Dict[str, Any]) -> Dict[str, Any]:
+    """The assistant message the pipeline expects at this step of the conversation"""
+    messages = body.get("messages", [])
+    user = _user_text(messages)
+    n = _count(user)
+    rationale = "Se potrivește temelor cerute."
+
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        schema = response_format["json_schema"]["schema"]
+        titles = schema["properties"]["items"]["items"]["properties"]["title"].get("enum", [])
+        items = [{"title": t, "rationale": rationale} for t in titles[:n]]
+        return {"role": "assistant", "content": json.dumps({"items": items}, ensure_ascii=False)}
+
+    tool_results = {m.get("tool_call_id"): m.get("content", "") for m in messages if m.get("role") == "tool"}
+    if body.get("tools") and not tool_results:
+        match = re.search(r"Titluri eligibile: (\[.*?\])\n", user)
+        titles = ast.literal_eval(match.group(1)) if match else []
+        calls = [{
+            "id": f"call_{i}",
+            "type": "function",
+            "function": {"name": "get_summary_by_title", "arguments": json.dumps({"title": t}, ensure_ascii=False)},
+        } for i, t in enumerate(titles[:n])]
+        return {"role": "assistant", "content": None, "tool_calls": calls}
+
+    # JSON finalize: one item per executed tool call
+    items = []
+    for m in messages:
+        for call in m.get("tool_calls") or ():
+            summary = tool_results.get(call.get("id"), "")
+            if summary and not summary.startswith(("Skipped", "Ineligible", "Unsupported")):
+                title = json.loads(call["function"]["arguments"]).get("title", "")
+                items.append({"title": title, "rationale": rationale, "detailed_summary": summary})
+    return {"role": "assistant", "content": json.dumps(items[:n], ensure_ascii=False)}
+
+
+class FakeOpenAI:
+    """
+    Threaded HTTP server with the endpoints above; `calls` counts requests per endpoint
+    and `rate_limited` the requests answered with 429
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: Optional[Dict[str, float]] = None,
+                 jitter: float = 0.1, dim: int = 1536, seed: int = 0, error_rate: Optional[Dict[str, float]] = None,
+                 retry_after: float = 0.0):
+        self.latency = dict(DEFAULT_LATENCY, **(latency or {}))
+        self.jitter = jitter
+        self.error_rate = dict(error_rate or {})
+        self.retry_after = retry_after
+        self.rate_limited: Counter = Counter()
+        self.dim = dim
+        self.calls: Counter = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAI":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOpenAI":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def delay(self, kind: str) -> float:
+        """Count one call to `kind` and return its (jittered) latency"""
+        with self._lock:
+            self.calls[kind] += 1
+            factor = 1.0 + self._rng.uniform(-self.jitter, self.jitter)
+        return max(0.0, self.latency[kind] * factor)
+
+    def limited(self, kind: str) -> bool:
+        """Whether to answer this request to `kind` with a 429 (counted in `rate_limited`)"""
+        rate = self.error_rate.get(kind, 0.0)
+        with self._lock:
+            hit = rate > 0 and self._rng.random() < rate
+            if hit:
+                self.rate_limited[kind] += 1
+        return hit
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):  # keep benchmark output clean
+                pass
+
+            def _json(self, payload: Dict[str, Any], status: int = 200) -> None:
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                path = self.path.split("?")[0].rstrip("/")
+                route = {
+                    "/v1/embeddings": self._embeddings,
+                    "/v1/chat/completions": self._chat,
+                    "/v1/images/generations": self._images,
+                    "/v1/audio/speech": self._speech,
+                }.get(path)
+                if route is None:
+                    self._json({"error": {"message": f"unknown path {path}"}}, status=404)
+                    return
+                kind = {"/v1/chat/completions": "chat", "/v1/images/generations": "images",
+                        "/v1/audio/speech": "speech"}.get(path, "embeddings")
+                if fake.limited(kind):
+                    self._rate_limited()
+                    return
+                route(body)
+
+            def _rate_limited(self):
+                data = json.dumps({"error": {"message": "Rate limit reached", "type": "requests",
+                                             "code": "rate_limit_exceeded"}}).encode("utf-8")
+                self.send_response(429)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("Retry-After", f"{fake.retry_after:g}")
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _embeddings(self, body):
+                inputs = body.get("input", [])
+                inputs = [inputs] if isinstance(inputs, str) else inputs
+                time.sleep(fake.delay("embeddings"))
+                tokens = sum(_tokens(t) for t in inputs)
+                vectors = [fake_embedding(t, fake.dim) for t in inputs]
+                if body.get("encoding_format") == "base64":  # what the SDK asks for by default
+                    vectors = [base64.b64encode(struct.pack(f"<{len(v)}f", *v)).decode() for v in vectors]
+                self._json({
+                    "object": "list",
+                    "model": body.get("model"),
+                    "data": [{"object": "embedding", "index": i, "embedding": v} for i, v in enumerate(vectors)],
+                    "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+                })
+
+            def _chat(self, body):
+                message = scripted_chat(body)
+                usage = {
+                    "prompt_tokens": _tokens(body.get("messages", [])),
+                    "completion_tokens": _tokens(message.get("content") or message.get("tool_calls")),
+                }
+                usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+                finish = "tool_calls" if message.get("tool_calls") else "stop"
+                base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": body.get("model")}
+                delay = fake.delay("chat")
+                if not body.get("stream"):
+                    time.sleep(delay)
+                    self._json(dict(base, object="chat.completion", usage=usage, choices=[
+                        {"index": 0, "message": message, "finish_reason": finish}]))
+                    return
+                self._stream(body, base, message, finish, usage, delay)
+
+            def _stream(self, body, base, message, finish, usage, delay):
+                deltas: List[Dict[str, Any]] = [{"role": "assistant", "content": ""}]
+                for i, call in enumerate(message.get("tool_calls") or ()):
+                    deltas.append({"tool_calls": [dict(call, index=i)]})
+                content = message.get("content") or ""
+                deltas += [{"content": content[i:i + 16]} for i in range(0, len(content), 16)]
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                time.sleep(delay * 0.3)  # time to first token
+                step = delay * 0.7 / max(1, len(deltas))
+
+                def send(chunk):
+                    self.wfile.write(b"data: " + json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n\n")
+                    self.wfile.flush()
+
+                for delta in deltas:
+                    send(dict(base, object="chat.completion.chunk",
+                              choices=[{"index": 0, "delta": delta, "finish_reason": None}]))
+                    time.sleep(step)
+                send(dict(base, object="chat.completion.chunk",
+                          choices=[{"index": 0, "delta": {}, "finish_reason": finish}]))
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    send(dict(base, object="chat.completion.chunk", choices=[], usage=usage))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+            def _images(self, body):
+                time.sleep(fake.delay("images"))
+                self._json({"created": int(time.time()), "data": [{"b64_json": _PNG}]})
+
+            def _speech(self, body):
+                time.sleep(fake.delay("speech"))
+                self.send_response(200)
+                self.send_header("Content-Type", "audio/mpeg")
+                self.send_header("Content-Length", str(len(_MP3)))
+                self.end_headers()
+                self.wfile.write(_MP3)
+
+        return Handler
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Run a local fake OpenAI API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", nargs="*", default=[], metavar="ENDPOINT=SECONDS",
+                        help=f"per-endpoint latency (defaults: {DEFAULT_LATENCY})")
+    parser.add_argument("--jitter", type=float, default=0.1, help="relative latency jitter (0.1 = ±10%%)")
+    parser.add_argument("--dim", type=int, default=1536, help="embedding size")
+    parser.add_argument("--error-rate", nargs="*", default=[], metavar="ENDPOINT=SHARE",
+                        help="share of requests answered with 429 (e.g. images=0.2)")
+    parser.add_argument("--retry-after", type=float, default=0.0, help="Retry-After sent with the 429s")
+    args = parser.parse_args(argv)
+
+    server = FakeOpenAI(args.host, args.port, parse_latency(args.latency), args.jitter, args.dim,
+                        error_rate=parse_error_rate(args.error_rate), retry_after=args.retry_after)
+    print(f"fake OpenAI API on {server.base_url} (Ctrl+C to stop)")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
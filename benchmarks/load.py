@@ -0,0 +1,227 @@
+"""
+End-to-end load test of the API against the local fake OpenAI server.
+
+For each catalog (the repo's data/book_summaries.json, or synthetic catalogs of
+`--catalog-sizes` books) the driver:
+  1. starts benchmarks.fake_openai in-process,
+  2. starts the backend (uvicorn backend.app:app) in a subprocess pointed at it
+     through OPENAI_BASE_URL, with its index, media and data files in a temp dir,
+  3. fires `--requests` requests per scenario with `--concurrency` in flight,
+  4. reports p50/p95/p99 latency, throughput, errors and upstream calls.
+
+    python -m benchmarks.load --scenarios search recommend --requests 200 --concurrency 16
+    python -m benchmarks.load --catalog-sizes 1000 10000 --scenarios search recommend-single
+    python -m benchmarks.load --latency chat=1.2 images=4 --no-cache
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.fake_openai import DEFAULT_LATENCY, FakeOpenAI, parse_latency
+
+ROOT = Path(__file__).resolve().parents[1]
+
+QUERIES = [
+    "O carte cu prietenie si magie",
+    "Caut o distopie cu teme puternice",
+    "Vreau o carte despre libertate și control social.",
+    "povești de război și supraviețuire",
+    "aventură, călătorie și curaj",
+    "dragoste și prejudecăți în societate",
+    "o carte despre identitate și maturizare",
+    "vinovăție, moralitate și ispășire",
+]
+
+SCENARIOS = ["search", "recommend", "recommend-single", "recommend-stream", "tts", "image"]
+
+_WORDS = ("carte poveste erou drum familie oraș război pace iubire prietenie magie putere secret "
+          "memorie timp mare munte sat regat destin speranță frică curaj trădare adevăr libertate").split()
+
+
+def synthetic_catalog(n: int, seed: int = 0) -> List[Dict]:
+    """`n` books with unique titles, themes from the real catalog and word-salad summaries"""
+    rng = random.Random(seed)
+    real = json.loads((ROOT / "data" / "book_summaries.json").read_text(encoding="utf-8"))
+    themes = sorted({t for b in real for t in b.get("themes", [])})
+    books = []
+    for i in range(n):
+        picked = rng.sample(themes, k=min(len(themes), rng.randint(2, 4)))
+        words = [rng.choice(_WORDS) for _ in range(rng.randint(18, 40))]
+        books.append({
+            "id": f"syn{i:07d}",
+            "title": f"{rng.choice(_WORDS).capitalize()} {rng.choice(_WORDS)} nr. {i}",
+            "summary": " ".join(words + picked) + ".",
+            "themes": picked,
+        })
+    return books
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _request(scenario: str, i: int, titles: List[str], unique: bool):
+    """(method, path, kwargs) for request number `i` of a scenario"""
+    suffix = f" #{i}" if unique else ""
+    query = QUERIES[i % len(QUERIES)] + suffix
+    if scenario == "search":
+        return "GET", "/rag/search", {"params": {"query": query, "top_k": 6}}
+    if scenario.startswith("recommend"):
+        body = {"query": query, "top_k": 6, "num_recommendations": 2,
+                "mode": "single" if scenario == "recommend-single" else "tool"}
+        path = "/recommend/stream" if scenario == "recommend-stream" else "/recommend"
+        return "POST", path, {"json": body}
+    if scenario == "tts":
+        return "POST", "/tts", {"json": {"text": f"Recomandarea mea: {titles[i % len(titles)]}.{suffix}"}}
+    return "POST", "/image", {"json": {"title": titles[i % len(titles)] + suffix, "themes": "aventură"}}
+
+
+async def run_scenario(base_url: str, scenario: str, requests: int, concurrency: int,
+                       titles: List[str], unique: bool) -> Dict[str, float]:
+    latencies: List[float] = []
+    errors = 0
+    slots = asyncio.Semaphore(concurrency)
+    timeout = httpx.Timeout(300.0)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout,
+                                 limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def one(i: int) -> None:
+            nonlocal errors
+            method, path, kwargs = _request(scenario, i, titles, unique)
+            async with slots:
+                t0 = time.perf_counter()
+                try:
+                    resp = await client.request(method, path, **kwargs)
+                    await resp.aread()  # the stream scenario finishes with the last SSE event
+                    ok = resp.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - t0)
+                else:
+                    errors += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+
+    def pct(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else float("nan")
+
+    return {
+        "ok": len(latencies),
+        "errors": errors,
+        "p50": statistics.median(latencies) * 1000 if latencies else float("nan"),
+        "p95": pct(0.95),
+        "p99": pct(0.99),
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+    }
+
+
+def _start_backend(port: int, env: Dict[str, str], startup_timeout: float) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.app:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    deadline = time.time() + startup_timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"backend exited with code {proc.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1.0).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("backend did not become healthy in time")
+
+
+def run_catalog(args, size: Optional[int]) -> None:
+    with tempfile.TemporaryDirectory() as tmp, \
+            FakeOpenAI(latency=parse_latency(args.latency), jitter=args.jitter, dim=args.dim) as fake:
+        env = dict(os.environ)
+        env.update({
+            "OPENAI_API_KEY": "benchmark",
+            "OPENAI_BASE_URL": fake.base_url,
+            "VECTOR_BACKEND": args.vector_backend,
+            "NUMPY_INDEX_DIR": os.path.join(tmp, "vector_index"),
+            "CHROMA_DIR": os.path.join(tmp, "chroma_db"),
+            "MEDIA_DIR": os.path.join(tmp, "generated"),
+        })
+        env.pop("EMBED_CACHE_PATH", None)
+        if size is not None:
+            books = synthetic_catalog(size)
+            data_file = Path(tmp) / "books.json"
+            data_file.write_text(json.dumps(books, ensure_ascii=False), encoding="utf-8")
+            env["DATA_FILE"] = str(data_file)
+            env["FULL_SUMMARIES_FILE"] = str(Path(tmp) / "full_summaries.json")  # none
+        else:
+            books = json.loads((ROOT / "data" / "book_summaries.json").read_text(encoding="utf-8"))
+        if args.no_cache:
+            env.update({"EMBED_CACHE_SIZE": "0", "RESPONSE_CACHE_SIZE": "0"})
+
+        port = _free_port()
+        t0 = time.perf_counter()
+        backend = _start_backend(port, env, args.startup_timeout)
+        startup = time.perf_counter() - t0
+        label = f"{size} synthetic books" if size is not None else f"repo catalog ({len(books)} books)"
+        print(f"\n== {label}: backend ready in {startup:.1f} s "
+              f"({fake.calls['embeddings']} embedding calls for the initial sync)")
+        print(f"{'scenario':<18}{'ok':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}"
+              f"   upstream calls")
+        titles = [b["title"] for b in books[:200]]
+        try:
+            for scenario in args.scenarios:
+                before = dict(fake.calls)
+                r = asyncio.run(run_scenario(f"http://127.0.0.1:{port}", scenario, args.requests,
+                                             args.concurrency, titles, unique=args.no_cache))
+                upstream = ", ".join(f"{k}={v - before.get(k, 0)}" for k, v in sorted(fake.calls.items())
+                                     if v - before.get(k, 0))
+                print(f"{scenario:<18}{r['ok']:>6}{r['errors']:>5}{r['p50']:>10.1f}{r['p95']:>10.1f}"
+                      f"{r['p99']:>10.1f}{r['rps']:>9.1f}   {upstream or '-'}")
+        finally:
+            backend.terminate()
+            backend.wait(timeout=30)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Load-test the API against a local fake OpenAI server.")
+    parser.add_argument("--scenarios", nargs="+", default=["search", "recommend", "tts", "image"], choices=SCENARIOS)
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--catalog-sizes", type=int, nargs="*", default=[],
+                        help="synthetic catalog sizes to run (default: the repo catalog only)")
+    parser.add_argument("--latency", nargs="*", default=[], metavar="ENDPOINT=SECONDS",
+                        help=f"fake upstream latency per endpoint (defaults: {DEFAULT_LATENCY})")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--dim", type=int, default=1536, help="fake embedding size")
+    parser.add_argument("--vector-backend", default="numpy", choices=["numpy", "chroma"])
+    parser.add_argument("--no-cache", action="store_true",
+                        help="disable the embedding/response caches and make every request unique")
+    parser.add_argument("--startup-timeout", type=float, default=600.0)
+    args = parser.parse_args(argv)
+
+    for size in args.catalog_sizes or [None]:
+        run_catalog(args, size)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
+import json
 import os
+import time
 import requests
 import streamlit as st
 
@@ -25,36 +27,123 @@ with c4:
     gen_img = st.toggle("Imagine (cover)", value=False)
 
 
+def sse_events(resp):
+    """Yield (event, data) pairs from a Server-Sent Events response"""
+    event, data = "message", []
+    for line in resp.iter_lines(decode_unicode=True):
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def media_bytes(url):
+    """Fetch a generated cover/audio from the backend's /media endpoint (it may run on another host)"""
+    if url.startswith("/"):
+        url = BACKEND + url
+    r = requests.get(url, timeout=60)
+    r.raise_for_status()
+    return r.content
+
+
+def render_item(it, pending):
+    """Render one recommendation; media still being generated gets a placeholder in `pending`"""
+    st.subheader(it.get("title") or "Fără titlu")
+    if it.get("rationale"):
+        st.write(it["rationale"])
+    if it.get("detailed_summary"):
+        st.markdown("**Rezumat (tool):**")
+        st.write(it["detailed_summary"])
+    cimg, caud = st.columns(2)
+    with cimg:
+        if it.get("image_url"):
+            st.image(media_bytes(it["image_url"]), caption="Copertă generată")
+        elif it.get("image_job_id"):
+            slot = st.empty()
+            slot.caption("Se generează coperta...")
+            pending[it["image_job_id"]] = (slot, "image")
+    with caud:
+        if it.get("audio_url"):
+            st.audio(media_bytes(it["audio_url"]), format="audio/mpeg")
+        elif it.get("audio_job_id"):
+            slot = st.empty()
+            slot.caption("Se generează audio...")
+            pending[it["audio_job_id"]] = (slot, "audio")
+    st.markdown("---")
+
+
+def fill_media(pending):
+    """Fill in covers/audio as the background jobs finish"""
+    deadline = time.time() + 180
+    while pending and time.time() < deadline:
+        jr = requests.get(f"{BACKEND}/jobs", params={"ids": ",".join(pending)})
+        if not jr.ok:
+            break
+        for job in jr.json():
+            if job["status"] not in ("done", "failed"):
+                continue
+            slot, kind = pending.pop(job["id"])
+            try:
+                if job["status"] == "failed":
+                    slot.warning("Generarea a eșuat.")
+                elif kind == "image":
+                    slot.image(media_bytes(job["url"]), caption="Copertă generată")
+                else:
+                    slot.audio(media_bytes(job["url"]), format="audio/mpeg")
+            except requests.RequestException:
+                slot.warning("Fișierul generat nu a putut fi descărcat.")
+        if pending:
+            time.sleep(0.5)
+    for slot, _ in pending.values():
+        slot.warning("Generarea nu s-a terminat la timp.")
+
+
 if query:
-    with st.spinner("Generez recomandări..."):
-        r = requests.post(f"{BACKEND}/recommend", json={
-            "query": query,
-            "top_k": top_k,
-            "num_recommendations": num_recs,
-            "language_filter": True,
-            "generate_image": gen_img,
-            "tts": tts
-        })
-
-    if not r.ok:
+    payload = {
+        "query": query,
+        "top_k": top_k,
+        "num_recommendations": num_recs,
+        "language_filter": True,
+        "generate_image": gen_img,
+        "tts": tts,
+    }
+    pending = {}  # job id -> (placeholder, kind)
+    status = st.empty()
+    status.caption("Caut în bibliotecă...")
+    try:
+        # Stream the pipeline: items are shown as soon as the backend parses them
+        with requests.post(f"{BACKEND}/recommend/stream", json=payload, stream=True, timeout=120) as r:
+            if r.status_code == 503:
+                st.warning("Serviciul este ocupat momentan. Te rog reîncearcă în câteva secunde.")
+            elif not r.ok:
+                st.error("Backend error!!!")
+            else:
+                count = 0
+                selected = []
+                for event, data in sse_events(r):
+                    if event == "blocked":
+                        st.warning("Te rog folosește un limbaj adecvat și reîncearcă.")
+                    elif event == "hits":
+                        status.caption(f"Am găsit {len(data)} cărți relevante, aleg recomandările...")
+                    elif event == "selected":
+                        selected.append(data["title"])
+                        status.caption("Selectate: " + ", ".join(selected))
+                    elif event == "item":
+                        count += 1
+                        render_item(data, pending)
+                    elif event == "done" and not count:
+                        st.warning("Nu am găsit potriviri.")
+                    elif event == "done" and data.get("degraded"):
+                        st.caption("Serviciul AI răspunde greu acum: recomandările de mai sus se bazează doar pe căutarea în bibliotecă.")
+                    elif event == "error":
+                        st.warning("Serviciul este ocupat momentan. Te rog reîncearcă în câteva secunde.")
+        status.empty()
+    except requests.RequestException:
         st.error("Backend error!!!")
-    else:
-        data = r.json()
-        items = data.get("items", [])
-        if not items:
-            st.warning("Nu am găsit potriviri.")
-        for it in items:
-            st.subheader(it.get("title") or "Fără titlu")
-            if it.get("rationale"):
-                st.write(it["rationale"])
-            if it.get("detailed_summary"):
-                st.markdown("**Rezumat (tool):**")
-                st.write(it["detailed_summary"])
-            cimg, caud = st.columns(2)
-            with cimg:
-                if it.get("image_path"):
-                    st.image(it["image_path"], caption="Copertă generată")
-            with caud:
-                if it.get("audio_path"):
-                    st.audio(it["audio_path"])
-            st.markdown("---")
+
+    fill_media(pending)
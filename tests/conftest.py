@@ -0,0 +1,42 @@
+"""
+Shared test setup: the backend is configured (before it is imported) to talk to the
+offline fake OpenAI API from benchmarks/fake_openai.py and to keep its index, caches
+and media in a temporary directory.
+"""
+import os
+import tempfile
+
+import pytest
+
+from benchmarks.fake_openai import FakeOpenAI
+
+FAST = {"chat": 0.01, "embeddings": 0.01, "images": 0.01, "speech": 0.01}
+
+_fake = FakeOpenAI(latency=FAST, jitter=0.0, dim=64).start()
+_tmp = tempfile.mkdtemp(prefix="librarian-tests-")
+os.environ.update(
+    OPENAI_API_KEY="test",
+    OPENAI_BASE_URL=_fake.base_url,
+    VECTOR_BACKEND="numpy",
+    NUMPY_INDEX_DIR=os.path.join(_tmp, "vector_index"),
+    CHROMA_DIR=os.path.join(_tmp, "chroma_db"),
+    MEDIA_DIR=os.path.join(_tmp, "media"),
+    RESPONSE_CACHE_SIZE="0",
+    REQUEST_DEADLINE="0.5",  # short, so tests can tell it apart from the media deadline
+)
+
+
+@pytest.fixture
+def fake():
+    """The fake OpenAI API, with fast endpoints and no errors again after each test"""
+    yield _fake
+    _fake.latency.update(FAST)
+    _fake.error_rate.clear()
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from backend.app import app
+    with TestClient(app) as c:
+        yield c
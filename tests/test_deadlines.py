@@ -0,0 +1,22 @@
+def test_slow_image_within_image_timeout_succeeds(client, fake):
+    # Slower than REQUEST_DEADLINE (0.5s) but well within IMAGE_TIMEOUT
+    fake.latency["images"] = 1.0
+    r = client.post("/image", json={"title": "Coperta lentă"})
+    assert r.status_code == 200
+    assert r.json()["image_url"]
+
+
+def test_recommend_renders_slow_cover_in_request(client, fake):
+    fake.latency["images"] = 1.0
+    r = client.post("/recommend", json={"query": "o carte despre libertate", "num_recommendations": 1,
+                                        "mode": "single", "generate_image": True})
+    assert r.status_code == 200
+    assert r.json()["items"][0]["image_url"]
+
+
+def test_pipeline_keeps_request_deadline(client, fake):
+    fake.latency["chat"] = 2.0
+    r = client.post("/recommend", json={"query": "o carte despre prietenie", "num_recommendations": 1,
+                                        "mode": "single"})
+    # Degraded from retrieval alone (or 504), not left waiting for the media deadline
+    assert r.status_code == 504 or r.json()["degraded"]
@@ -0,0 +1,24 @@
+import asyncio
+import time
+
+from backend.jobs import JobQueue
+
+
+def test_completions_sees_jobs_that_finish_while_the_consumer_is_busy():
+    async def scenario():
+        queue = JobQueue(workers=2, max_pending=8)
+        await queue.start()
+        try:
+            fast = queue.submit("image", lambda: asyncio.sleep(0.01, result="fast"))
+            slow = queue.submit("image", lambda: asyncio.sleep(0.05, result="slow"))
+            seen = []
+            t0 = time.monotonic()
+            async for job in queue.completions([fast.id, slow.id], timeout=5):
+                seen.append(job.id)
+                await asyncio.sleep(0.1)  # a slow client write: `slow` finishes meanwhile
+            assert seen == [fast.id, slow.id]
+            assert time.monotonic() - t0 < 1
+        finally:
+            await queue.stop()
+
+    asyncio.run(scenario())
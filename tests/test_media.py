@@ -0,0 +1,18 @@
+from backend.config import TTS_VOICE
+from backend.media_store import store
+from backend.models import TTSRequest
+from backend.tools import recommendation_narration, tts_key
+
+
+def test_recommendation_audio_speaks_the_rationale(client, fake):
+    r = client.post("/recommend", json={"query": "o carte despre libertate", "num_recommendations": 1,
+                                        "mode": "single", "tts": True})
+    item = r.json()["items"][0]
+    spoken = tts_key(recommendation_narration(item["title"], item["rationale"], item["detailed_summary"]), TTS_VOICE)
+    assert item["audio_url"] == store.url_for(spoken)
+
+
+def test_tts_defaults_to_the_configured_voice(client, fake):
+    assert TTSRequest(text="x").voice == TTS_VOICE
+    r = client.post("/tts", json={"text": "Un text narat o singură dată"})
+    assert r.json()["audio_url"] == store.url_for(tts_key("Un text narat o singură dată", TTS_VOICE))
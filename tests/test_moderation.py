@@ -0,0 +1,41 @@
+import pytest
+
+from backend.moderation import compile_terms, moderate
+
+
+@pytest.mark.parametrize("query", [
+    "carte despre prostie",
+    "o poveste despre prostia omenească",
+    "Stupidity of war",
+    "cărți despre stupiditate",
+    "un roman despre cretinism",
+    "tâmpenie și imbecilitate în literatură",
+    "nesimțire",
+    "urâțenie și frumusețe",
+    "idiotism",
+    "Rățușca cea urâtă",
+    "povești cu rățuște urâte",
+])
+def test_ordinary_words_are_not_blocked(query):
+    assert not moderate(query).blocked
+
+
+@pytest.mark.parametrize("query", [
+    "ești prost",
+    "Ești PROȘTI!",
+    "prostule, dă-mi o carte",
+    "ce carte stupidă",
+    "stupid",
+    "cretinule",
+    "tâmpiților",
+    "ce idioată",
+    "taci, urâtule",
+])
+def test_insults_are_blocked(query):
+    assert moderate(query).blocked
+
+
+def test_prefix_terms_match_continuations_only_at_word_start():
+    automaton = compile_terms(["hateword*"])
+    assert automaton.find(" hatewords here ") == ["hateword*"]
+    assert automaton.find(" nohateword ") == []
@@ -0,0 +1,31 @@
+from backend import catalog, metrics
+from backend.response_cache import ResponseCache, cache
+
+PARAMS = (4, 3, "single", None, None)
+
+
+def test_hits_and_saved_time_are_exported():
+    rc = ResponseCache(max_entries=8, ttl=60, similarity=0)
+    exact = metrics.RESPONSE_CACHE_LOOKUPS.value(result="exact")
+    misses = metrics.RESPONSE_CACHE_LOOKUPS.value(result="miss")
+    saved = metrics.RESPONSE_CACHE_SAVED_SECONDS.value()
+
+    assert rc.get("Dune", PARAMS) is None
+    rc.put("Dune", PARAMS, [("Dune", "de ce", "rezumat")], compute_seconds=1.5)
+    assert rc.get("  dune ", PARAMS) == [("Dune", "de ce", "rezumat")]
+
+    assert metrics.RESPONSE_CACHE_LOOKUPS.value(result="exact") == exact + 1
+    assert metrics.RESPONSE_CACHE_LOOKUPS.value(result="miss") == misses + 1
+    assert metrics.RESPONSE_CACHE_SAVED_SECONDS.value() == saved + 1.5
+    assert metrics.RESPONSE_CACHE_HIT_RATIO.value() == 0.5
+    assert "librarian_response_cache_hit_ratio 0.5" in metrics.render()
+
+
+def test_catalog_reload_clears_the_cache():
+    assert cache.invalidate in catalog._listeners
+    before = cache.invalidations
+    for listener in catalog._listeners:
+        if listener == cache.invalidate:
+            listener(catalog.get_catalog())
+    assert cache.invalidations == before + 1
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,21 @@
+import chromadb
+
+from backend.catalog import get_catalog
+from backend.sync import book_document, book_metadata, document_hash, sync_catalog
+from backend.vector_store import ChromaBackend
+
+
+def test_metadata_only_sync_drops_removed_keys_from_chroma():
+    client = chromadb.EphemeralClient()
+    backend = ChromaBackend(client, client.get_or_create_collection("sync-test"))
+    books = get_catalog().as_dicts()[:3]
+    # Rows written by an older sync, with per-theme flags that are no longer stored
+    docs = [book_document(b) for b in books]
+    metas = [{**book_metadata(b, document_hash(d)), "theme:magie": True} for b, d in zip(books, docs)]
+    backend.upsert([b["id"] for b in books], docs, metas, [[1.0, 0.0]] * len(books))
+
+    report = sync_catalog(backend, books)
+    assert sorted(report.metadata_only) == sorted(b["id"] for b in books)
+    _, _, stored = backend.rows()
+    assert all("theme:magie" not in meta for meta in stored)
+    assert not sync_catalog(backend, books).changed
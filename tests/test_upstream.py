@@ -0,0 +1,48 @@
+import asyncio
+
+from backend.upstream import Singleflight
+
+
+def test_follower_outlives_a_cancelled_leader():
+    async def scenario():
+        flight = Singleflight()
+        runs = []
+
+        async def work():
+            runs.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        leader = asyncio.create_task(flight.ado("k", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.ado("k", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await follower == "result"
+        assert leader.cancelled()
+        assert runs == [1]
+
+    asyncio.run(scenario())
+
+
+def test_work_is_cancelled_when_every_caller_left():
+    async def scenario():
+        flight = Singleflight()
+        cancelled = asyncio.Event()
+
+        async def work():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        callers = [asyncio.create_task(flight.ado("k", work)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        # A later caller starts a fresh run instead of joining the cancelled one
+        assert await flight.ado("k", lambda: asyncio.sleep(0, result="again")) == "again"
+
+    asyncio.run(scenario())
@@ -0,0 +1,8 @@
+def test_search_rejects_a_non_positive_top_k(client):
+    assert client.get("/rag/search", params={"query": "libertate", "top_k": 0}).status_code == 422
+    assert client.get("/rag/search", params={"query": "libertate", "top_k": 1}).status_code == 200
+
+
+def test_recommend_rejects_a_non_positive_top_k(client):
+    r = client.post("/recommend", json={"query": "o carte despre libertate", "top_k": 0})
+    assert r.status_code == 422
@@ -0,0 +1,24 @@
+import pytest
+
+from backend.vector_store import NumpyBackend
+
+
+def test_upsert_after_replacing_with_no_rows(tmp_path):
+    store = NumpyBackend(str(tmp_path), dtype="float32")
+    store.upsert(["a"], ["doc a"], [{"title": "A"}], [[1.0, 0.0, 0.0]])
+    store.replace([], [], [], [])
+    assert store.count() == 0
+
+    store.upsert(["b"], ["doc b"], [{"title": "B"}], [[0.0, 1.0, 0.0]])
+    hits = store.query([[0.0, 1.0, 0.0]], 1)[0]
+    assert [h["id"] for h in hits] == ["b"]
+    assert hits[0]["score"] == pytest.approx(1.0)
+
+
+def test_empty_index_takes_the_dimension_of_the_first_upsert(tmp_path):
+    store = NumpyBackend(str(tmp_path), dtype="float32")
+    store.replace([], [], [], [])
+    store.upsert(["a", "b"], ["doc a", "doc b"], [{}, {}], [[1.0, 0.0], [0.0, 1.0]])
+    assert [h["id"] for h in store.query([[1.0, 0.1]], 2)[0]] == ["a", "b"]
+    with pytest.raises(ValueError):
+        store.upsert(["c"], ["doc c"], [{}], [[1.0, 0.0, 0.0]])